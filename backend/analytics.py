@@ -0,0 +1,190 @@
+"""
+HPB Price Analyzer - 分析集計モジュール
+検索履歴のサロンデータからヒストグラム・パーセンタイル・回帰・散布図用の点をNumPyで算出する
+"""
+
+import math
+import threading
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+
+
+# ヒストグラムのデフォルトのビン幅（円）: フロントエンドの価格帯ヒストグラムと同じ
+DEFAULT_BIN_WIDTH = 500
+
+# ビン幅の下限（円）
+MIN_BIN_WIDTH = 100
+
+# ヒストグラムのビン数の上限（ビン幅指定時に超える場合はビン幅を広げる）
+MAX_HISTOGRAM_BINS = 1000
+
+# 散布図で返す点の最大数
+DEFAULT_MAX_POINTS = 500
+
+# 算出するパーセンタイル
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# ヒストグラムの各ビンに含めるサロン名の数
+BIN_SAMPLE_NAMES = 4
+
+# メモ化するエントリ数（履歴は保存後に変わらないため、削除時以外は無効化不要）
+STATS_CACHE_SIZE = 128
+
+
+def compute_history_stats(
+    salons: list[dict],
+    bin_width: int = DEFAULT_BIN_WIDTH,
+    bins: Optional[int] = None,
+    max_points: int = DEFAULT_MAX_POINTS
+) -> dict:
+    """
+    サロンリストから分析用の集計値を算出
+    
+    Args:
+        salons: サロンリスト
+        bin_width: ヒストグラムのビン幅（円）
+        bins: ヒストグラムのビン数（指定時は bin_width より優先）
+        max_points: 散布図で返す点の最大数
+        
+    Returns:
+        summary / histogram / regression / scatter を含む辞書
+    """
+    priced = [s for s in salons if s.get("average_price") is not None]
+    prices = np.fromiter((s["average_price"] for s in priced), dtype=np.float64, count=len(priced))
+    reviews = np.fromiter((s.get("review_count") or 0 for s in priced), dtype=np.float64, count=len(priced))
+    
+    return {
+        "salon_count": len(salons),
+        "priced_count": len(priced),
+        "summary": _summary(prices),
+        "histogram": _histogram(prices, [s["name"] for s in priced], bin_width, bins),
+        "regression": _regression(reviews, prices),
+        "scatter": _scatter(priced, reviews, max_points),
+    }
+
+
+def _summary(prices: np.ndarray) -> Optional[dict]:
+    """平均・標準偏差・最小・最大とパーセンタイル"""
+    if prices.size == 0:
+        return None
+    
+    values = np.percentile(prices, PERCENTILES)
+    return {
+        "mean": round(float(prices.mean()), 1),
+        "std": round(float(prices.std()), 1),
+        "min": float(prices.min()),
+        "max": float(prices.max()),
+        "percentiles": {f"p{p}": round(float(v), 1) for p, v in zip(PERCENTILES, values)},
+    }
+
+
+def _histogram(prices: np.ndarray, names: list[str], bin_width: int, bins: Optional[int]) -> list[dict]:
+    """
+    価格帯ヒストグラム
+    
+    bin_width 指定時は 0 円から幅ごとに区切り、bins 指定時は最小〜最大を等分する。
+    各ビンは [min_price, max_price) で、最後のビンのみ最大値を含む。
+    ビン幅指定でビン数が MAX_HISTOGRAM_BINS を超える場合は、ビン幅をその倍数に広げる。
+    """
+    if prices.size == 0:
+        return []
+    
+    if bins:
+        edges = np.histogram_bin_edges(prices, bins=bins)
+    else:
+        needed = math.floor(float(prices.max()) / bin_width) + 1
+        if needed > MAX_HISTOGRAM_BINS:
+            bin_width *= math.ceil(needed / MAX_HISTOGRAM_BINS)
+        top = math.ceil(float(prices.max()) / bin_width) * bin_width
+        if top <= prices.max():
+            top += bin_width
+        edges = np.arange(0, top + bin_width, bin_width, dtype=np.float64)
+    
+    counts, edges = np.histogram(prices, bins=edges)
+    
+    # サロン名をビンごとにまとめる（np.histogram と同じ区間の割り当て）
+    index = np.clip(np.searchsorted(edges, prices, side="right") - 1, 0, len(counts) - 1)
+    order = np.argsort(index, kind="stable")
+    boundaries = np.searchsorted(index[order], np.arange(len(counts) + 1))
+    
+    histogram = []
+    for i, count in enumerate(counts):
+        members = order[boundaries[i]:boundaries[i + 1]][:BIN_SAMPLE_NAMES]
+        histogram.append({
+            "min_price": float(edges[i]),
+            "max_price": float(edges[i + 1]),
+            "count": int(count),
+            "salons": [names[j] for j in members],
+        })
+    return histogram
+
+
+def _regression(reviews: np.ndarray, prices: np.ndarray) -> Optional[dict]:
+    """口コミ数に対する平均価格の単回帰（最小二乗）"""
+    if prices.size < 2 or np.ptp(reviews) == 0:
+        return None
+    
+    slope, intercept = np.polyfit(reviews, prices, 1)
+    r = np.corrcoef(reviews, prices)[0, 1] if np.ptp(prices) > 0 else 0.0
+    return {
+        "slope": round(float(slope), 4),
+        "intercept": round(float(intercept), 1),
+        "r": round(float(r), 4),
+        "r_squared": round(float(r) ** 2, 4),
+        "n": int(prices.size),
+    }
+
+
+def _scatter(priced: list[dict], reviews: np.ndarray, max_points: int) -> list[dict]:
+    """
+    散布図用の点（口コミ数, 平均価格）
+    
+    点数が max_points を超える場合は口コミ数順に等間隔で間引く（両端は必ず含む）
+    """
+    if len(priced) > max_points > 0:
+        order = np.argsort(reviews, kind="stable")
+        selected = order[np.unique(np.linspace(0, len(order) - 1, max_points).round().astype(int))]
+        selected.sort()
+    else:
+        selected = range(len(priced))
+    
+    return [
+        {
+            "name": priced[i]["name"],
+            "url": priced[i].get("url", ""),
+            "review_count": priced[i].get("review_count") or 0,
+            "average_price": priced[i]["average_price"],
+        }
+        for i in selected
+    ]
+
+
+# (履歴ID, パラメータ) -> 集計結果
+_stats_cache: OrderedDict[tuple, dict] = OrderedDict()
+_stats_lock = threading.Lock()
+
+
+def get_cached_stats(key: tuple) -> Optional[dict]:
+    """メモ化された集計結果を取得"""
+    with _stats_lock:
+        stats = _stats_cache.get(key)
+        if stats is not None:
+            _stats_cache.move_to_end(key)
+        return stats
+
+
+def cache_stats(key: tuple, stats: dict) -> None:
+    """集計結果をメモ化（古いものから削除）"""
+    with _stats_lock:
+        _stats_cache[key] = stats
+        _stats_cache.move_to_end(key)
+        while len(_stats_cache) > STATS_CACHE_SIZE:
+            _stats_cache.popitem(last=False)
+
+
+def invalidate_history_stats(history_id: str) -> None:
+    """履歴の削除時にメモ化した集計結果を破棄"""
+    with _stats_lock:
+        for key in [k for k in _stats_cache if k[0] == history_id]:
+            del _stats_cache[key]
@@ -0,0 +1,358 @@
+"""
+HPB Price Analyzer - ページアーカイブモジュール
+取得したHTMLを内容のハッシュで圧縮保存し、履歴ごとのページ構成（マニフェスト）を記録する。
+マークアップ変更やパーサー改善の際に、ネットワークにアクセスせず当時のページを再パースできる。
+
+再パースの実行方法:
+    cd backend
+    python -m archive <history_id>
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from typing import Optional
+
+from page_cache import _atomic_write
+from scraper import parse_hpb_page, dedupe_salons, SalonData
+
+try:
+    import zstandard
+except ImportError:  # zstandard がない環境では gzip で保存する
+    zstandard = None
+
+
+# アーカイブ設定
+ARCHIVE_ENABLED = os.getenv("HPB_ARCHIVE_ENABLED", "0") == "1"
+ARCHIVE_DIR = os.getenv("HPB_ARCHIVE_DIR", ".cache/hpb_archive")
+ARCHIVE_ZSTD_LEVEL = int(os.getenv("HPB_ARCHIVE_ZSTD_LEVEL", "10"))
+# マニフェストを保持する日数（0 は無期限、期限を過ぎた履歴は再パースできなくなる）
+ARCHIVE_RETENTION_DAYS = float(os.getenv("HPB_ARCHIVE_RETENTION_DAYS", "0"))
+# どのマニフェストからも参照されない本文を削除する間隔（秒）
+ARCHIVE_GC_INTERVAL = float(os.getenv("HPB_ARCHIVE_GC_INTERVAL", str(6 * 60 * 60)))
+# 保存・参照されてからこの秒数以内の本文は削除しない（マニフェスト保存前の記録中の本文を残すため）
+ARCHIVE_GC_GRACE = float(os.getenv("HPB_ARCHIVE_GC_GRACE", str(24 * 60 * 60)))
+
+
+class PageArchive:
+    """
+    内容アドレス方式のHTMLアーカイブ
+    
+    本文は UTF-8 の SHA-256 をキーに blobs/ab/<sha256>.html.zst（zstandard がない
+    場合は .html.gz）として1度だけ保存し、履歴ごとのマニフェストは
+    manifests/<history_id>.json にページ番号・URL・ハッシュを記録する。
+    本文は複数の履歴で共有するため、履歴の削除では消さず collect_garbage で
+    どのマニフェストからも参照されないものを削除する（マーク・アンド・スイープ）。
+    
+    Args:
+        directory: 保存先ディレクトリ
+        level: zstd の圧縮レベル
+    """
+    
+    def __init__(self, directory: str, level: int = ARCHIVE_ZSTD_LEVEL):
+        self.directory = directory
+        self.level = level
+        self.stats = {"blobs_written": 0, "blobs_deduped": 0, "manifests": 0, "blobs_collected": 0, "manifests_expired": 0}
+        self._lock = threading.Lock()
+    
+    def put_page(self, html: str) -> str:
+        """HTMLを保存し、そのハッシュを返す（同じ内容は再保存しない）"""
+        body = html.encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()
+        
+        existing = self._find_blob(digest)
+        if existing:
+            # 参照された時刻を更新し、マニフェストの保存前に collect_garbage で消されないようにする
+            try:
+                os.utime(existing)
+            except OSError:
+                pass
+            with self._lock:
+                self.stats["blobs_deduped"] += 1
+            return digest
+        
+        if zstandard is not None:
+            path = self._blob_path(digest, ".zst")
+            data = zstandard.ZstdCompressor(level=self.level).compress(body)
+        else:
+            path = self._blob_path(digest, ".gz")
+            data = gzip.compress(body, compresslevel=9)
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _atomic_write(path, data)
+        with self._lock:
+            self.stats["blobs_written"] += 1
+        return digest
+    
+    def get_page(self, digest: str) -> str:
+        """ハッシュに対応するHTMLを取得"""
+        path = self._find_blob(digest)
+        if path is None:
+            raise FileNotFoundError(f"アーカイブにページがありません: {digest}")
+        
+        with open(path, "rb") as f:
+            data = f.read()
+        if path.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError("zstd 形式のアーカイブを読むには zstandard が必要です")
+            body = zstandard.ZstdDecompressor().decompress(data)
+        else:
+            body = gzip.decompress(data)
+        return body.decode("utf-8")
+    
+    def save_manifest(self, history_id: str, manifest: dict) -> None:
+        path = self._manifest_path(history_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _atomic_write(path, json.dumps(manifest, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            self.stats["manifests"] += 1
+    
+    def load_manifest(self, history_id: str) -> Optional[dict]:
+        """履歴のマニフェストを取得、存在しない場合はNone"""
+        try:
+            with open(self._manifest_path(history_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def delete_manifest(self, history_id: str) -> None:
+        """履歴のマニフェストを削除（本文は他の履歴と共有しうるため collect_garbage で削除する）"""
+        try:
+            os.remove(self._manifest_path(history_id))
+        except FileNotFoundError:
+            pass
+    
+    def collect_garbage(
+        self,
+        grace: float = ARCHIVE_GC_GRACE,
+        retention_days: float = ARCHIVE_RETENTION_DAYS
+    ) -> dict:
+        """
+        保持期間を過ぎたマニフェストと、どのマニフェストからも参照されない本文を削除
+        
+        Args:
+            grace: 保存・参照されてからこの秒数以内の本文は削除しない
+            retention_days: マニフェストを保持する日数（0 は無期限）
+        
+        Returns:
+            削除したマニフェスト数・本文数・本文の合計バイト数
+        """
+        now = time.time()
+        result = {"manifests_expired": 0, "blobs_collected": 0, "bytes_freed": 0}
+        
+        # マーク: 残すマニフェストが参照する本文
+        referenced = set()
+        manifests_dir = os.path.join(self.directory, "manifests")
+        for name in _list_dir(manifests_dir):
+            path = os.path.join(manifests_dir, name)
+            try:
+                if retention_days > 0 and now - os.path.getmtime(path) > retention_days * 86400:
+                    os.remove(path)
+                    result["manifests_expired"] += 1
+                    continue
+                with open(path, encoding="utf-8") as f:
+                    manifest = json.load(f)
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError) as e:
+                # 読めないマニフェストがある間は参照を判定できないため削除しない
+                print(f"Archive GC skipped ({name}): {e}")
+                return result
+            referenced.update(entry["sha256"] for entry in manifest.get("pages", []))
+        
+        # スイープ: 参照されず、猶予期間を過ぎた本文
+        blobs_dir = os.path.join(self.directory, "blobs")
+        for prefix in _list_dir(blobs_dir):
+            for name in _list_dir(os.path.join(blobs_dir, prefix)):
+                digest = name.split(".", 1)[0]
+                path = os.path.join(blobs_dir, prefix, name)
+                if digest in referenced or name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = os.stat(path)
+                    if now - stat.st_mtime < grace:
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                result["blobs_collected"] += 1
+                result["bytes_freed"] += stat.st_size
+        
+        with self._lock:
+            self.stats["blobs_collected"] += result["blobs_collected"]
+            self.stats["manifests_expired"] += result["manifests_expired"]
+        return result
+    
+    def _blob_path(self, digest: str, suffix: str) -> str:
+        return os.path.join(self.directory, "blobs", digest[:2], f"{digest}.html{suffix}")
+    
+    def _find_blob(self, digest: str) -> Optional[str]:
+        for suffix in (".zst", ".gz"):
+            path = self._blob_path(digest, suffix)
+            if os.path.exists(path):
+                return path
+        return None
+    
+    def _manifest_path(self, history_id: str) -> str:
+        # 履歴IDはURLパスから渡されるため、ディレクトリを辿れないようにする
+        safe_id = os.path.basename(history_id)
+        return os.path.join(self.directory, "manifests", f"{safe_id}.json")
+
+
+def _list_dir(path: str) -> list[str]:
+    try:
+        return os.listdir(path)
+    except FileNotFoundError:
+        return []
+
+
+class ScrapeRecording:
+    """
+    1回のスクレイピングで取得したページの記録
+    
+    取得したページを都度アーカイブに保存し、履歴の保存後に finish で
+    マニフェストを書き出す。
+    複数のジョブで共有する記録は、スクレイピングを実行したジョブが close で1回だけ締め、
+    各ジョブは attach で自分の履歴のマニフェストを書き出す。
+    """
+    
+    def __init__(self, archive: PageArchive, base_url: str, max_pages: int):
+        self.archive = archive
+        self.base_url = base_url
+        self.max_pages = max_pages
+        self.started_at = time.time()
+        self.pages: dict[int, dict] = {}
+        self._entries: Optional[list[dict]] = None
+    
+    def add_page(self, page: int, url: str, html: str) -> None:
+        if self._entries is not None:
+            return
+        self.pages[page] = {"page": page, "url": url, "sha256": self.archive.put_page(html)}
+    
+    def close(self) -> None:
+        """記録を締める（以降のページは記録しない、2回目以降は何もしない）"""
+        if self._entries is None:
+            self._entries = [self.pages[page] for page in sorted(self.pages)]
+    
+    def attach(self, history_id: str) -> None:
+        """締めた記録を履歴のマニフェストとして保存（アーカイブは補助データのため失敗しても例外にしない）"""
+        self.close()
+        try:
+            self.archive.save_manifest(history_id, {
+                "history_id": history_id,
+                "base_url": self.base_url,
+                "max_pages": self.max_pages,
+                "fetched_at": self.started_at,
+                "pages": self._entries,
+            })
+        except OSError as e:
+            print(f"Archive manifest save error: {e}")
+    
+    def finish(self, history_id: str) -> None:
+        """記録を締めて履歴のマニフェストを保存（記録を共有しない場合）"""
+        self.close()
+        self.attach(history_id)
+
+
+def replay_manifest(archive: PageArchive, manifest: dict, engine: Optional[str] = None) -> tuple[list[SalonData], str]:
+    """
+    アーカイブ済みのページを再パースし、スクレイピングと同じ規則でサロンを集める
+    
+    1ページ目から連続するページを順に処理し、欠けている・サロンのない・
+    次ページのないページで終了する。ネットワークやレート制限は通さない。
+    
+    Args:
+        archive: アーカイブ
+        manifest: 履歴のマニフェスト
+        engine: パースエンジン（省略時は HPB_PARSER の設定）
+        
+    Returns:
+        (重複排除済みサロンリスト, 1ページ目のタイトル)
+    """
+    pages = {entry["page"]: entry for entry in manifest.get("pages", [])}
+    all_salons = []
+    seen_names = set()
+    title = ""
+    
+    page = 1
+    while page in pages:
+        result = parse_hpb_page(archive.get_page(pages[page]["sha256"]), engine=engine)
+        if not result.salons:
+            break
+        if page == 1:
+            title = result.title
+        all_salons.extend(dedupe_salons(result.salons, seen_names))
+        if not result.has_next:
+            break
+        page += 1
+    
+    return all_salons, title
+
+
+# ページアーカイブのシングルトン
+_page_archive: Optional[PageArchive] = None
+
+
+def get_page_archive() -> Optional[PageArchive]:
+    """ページアーカイブを取得（無効化されている場合はNone）"""
+    global _page_archive
+    
+    if not ARCHIVE_ENABLED:
+        return None
+    if _page_archive is None:
+        _page_archive = PageArchive(ARCHIVE_DIR)
+    
+    return _page_archive
+
+
+def start_recording(base_url: str, max_pages: int) -> Optional[ScrapeRecording]:
+    """スクレイピングの記録を開始（アーカイブが無効の場合はNone）"""
+    archive = get_page_archive()
+    return ScrapeRecording(archive, base_url, max_pages) if archive else None
+
+
+async def run_garbage_collector(archive: PageArchive, interval: float = ARCHIVE_GC_INTERVAL) -> None:
+    """ARCHIVE_GC_INTERVAL ごとに collect_garbage を実行（キャンセルされるまで続ける）"""
+    while True:
+        try:
+            result = await asyncio.to_thread(archive.collect_garbage)
+            if result["blobs_collected"] or result["manifests_expired"]:
+                print(f"Archive GC: {result}")
+        except Exception as e:
+            print(f"Archive GC failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def start_archive_gc() -> Optional[asyncio.Task]:
+    """
+    アーカイブのガベージコレクションをバックグラウンドタスクとして開始
+    
+    Returns:
+        ガベージコレクションのタスク（アーカイブが無効化されている場合はNone）
+    """
+    archive = get_page_archive()
+    if archive is None:
+        return None
+    return asyncio.create_task(run_garbage_collector(archive))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("使い方: python -m archive <history_id>")
+        sys.exit(1)
+    
+    archive = PageArchive(ARCHIVE_DIR)
+    manifest = archive.load_manifest(sys.argv[1])
+    if manifest is None:
+        print(f"マニフェストが見つかりません: {sys.argv[1]}")
+        sys.exit(1)
+    
+    started = time.perf_counter()
+    salons, title = replay_manifest(archive, manifest)
+    elapsed = time.perf_counter() - started
+    print(f"{title}: {len(manifest['pages'])}ページ, {len(salons)}サロン ({elapsed:.2f}s)")
@@ -0,0 +1,59 @@
+"""
+HPB Price Analyzer - ページ並列取得のベンチマーク
+スタブサーバーに対して逐次取得と並列取得の所要時間をページ数ごとに比較する
+
+実行方法:
+    cd backend
+    python -m benchmarks.bench_fetch --latency 0.1 --pages 1 5 10 20 50
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+import rate_limiter
+from scraper import scrape_multiple_pages_async
+from benchmarks.stub_server import StubServer
+
+
+def measure(base_url: str, pages: int, concurrency: int) -> tuple[float, int]:
+    """1回分のスクレイピング所要時間とサロン数を計測"""
+    start = time.perf_counter()
+    # スクレイパーの進捗ログは計測結果の表示を妨げるため抑制
+    with contextlib.redirect_stdout(io.StringIO()):
+        salons, _ = asyncio.run(scrape_multiple_pages_async(
+            base_url, pages, concurrency=concurrency, cache_mode="bypass"
+        ))
+    return time.perf_counter() - start, len(salons)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ページ並列取得のベンチマーク")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 5, 10, 20, 50])
+    parser.add_argument("--latency", type=float, default=0.1, help="スタブの応答遅延（秒）")
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--rate", type=float, default=1000.0, help="レート制限（リクエスト/秒）")
+    args = parser.parse_args()
+    
+    # エンジン自体の並列度を測るため、ホスト単位のレート制限は十分に緩める
+    rate_limiter.RATE_LIMIT_PER_SECOND = args.rate
+    rate_limiter.RATE_LIMIT_BURST = args.rate
+    rate_limiter.INITIAL_CONCURRENCY = args.concurrency
+    rate_limiter.MAX_CONCURRENCY = max(rate_limiter.MAX_CONCURRENCY, args.concurrency)
+    
+    print(f"latency={args.latency}s concurrency={args.concurrency}")
+    print(f"{'pages':>6} {'sequential[s]':>14} {'concurrent[s]':>14} {'speedup':>8} {'salons':>7}")
+    
+    for pages in args.pages:
+        with StubServer(pages=pages, latency=args.latency) as stub:
+            seq_time, seq_count = measure(stub.base_url, pages, concurrency=1)
+            con_time, con_count = measure(stub.base_url, pages, concurrency=args.concurrency)
+        
+        assert seq_count == con_count, "逐次取得と並列取得で結果件数が一致しません"
+        print(f"{pages:>6} {seq_time:>14.3f} {con_time:>14.3f} {seq_time / con_time:>7.1f}x {con_count:>7}")
+
+
+if __name__ == "__main__":
+    main()
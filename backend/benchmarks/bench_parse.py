@@ -0,0 +1,63 @@
+"""
+HPB Price Analyzer - HTMLパースエンジンのベンチマーク
+保存済みページ（tests/fixtures）とスタブページで、BeautifulSoup版と
+lxml版のカード処理速度（cards/sec）を比較する
+
+実行方法:
+    cd backend
+    python -m benchmarks.bench_parse --repeat 20
+"""
+
+import argparse
+import contextlib
+import io
+import pathlib
+import time
+
+from scraper import parse_hpb_page_bs4, parse_hpb_page_lxml
+from benchmarks.stub_server import render_page
+
+
+FIXTURE_DIR = pathlib.Path(__file__).resolve().parent.parent / "tests" / "fixtures"
+
+
+def load_corpus() -> list[str]:
+    """ベンチマーク対象のHTMLを読み込む"""
+    pages = [path.read_text(encoding="utf-8") for path in sorted(FIXTURE_DIR.glob("*.html"))]
+    pages.extend(render_page(page, 5, 20) for page in range(1, 6))
+    return pages
+
+
+def measure(parse, pages: list[str], repeat: int) -> tuple[float, int]:
+    """全ページをrepeat回パースした所要時間とカード数を計測"""
+    cards = 0
+    # パーサーの進捗ログは計測結果の表示を妨げるため抑制
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for html in pages:
+                cards += len(parse(html).salons)
+        elapsed = time.perf_counter() - start
+    return elapsed, cards
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HTMLパースエンジンのベンチマーク")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    
+    pages = load_corpus()
+    print(f"corpus: {len(pages)} pages x {args.repeat}")
+    print(f"{'engine':>8} {'time[s]':>9} {'cards':>7} {'cards/sec':>11}")
+    
+    results = {}
+    for name, parse in (("bs4", parse_hpb_page_bs4), ("lxml", parse_hpb_page_lxml)):
+        elapsed, cards = measure(parse, pages, args.repeat)
+        results[name] = cards / elapsed
+        print(f"{name:>8} {elapsed:>9.3f} {cards:>7} {cards / elapsed:>11.0f}")
+    
+    print(f"speedup: {results['lxml'] / results['bs4']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
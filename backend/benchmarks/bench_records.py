@@ -0,0 +1,62 @@
+"""
+HPB Price Analyzer - サロンレコードのメモリベンチマーク
+大規模スクレイピング相当のスタブページをパースし、SalonData（slots）のまま
+保持する場合と、カードごとに辞書へ変換して保持する場合（従来方式）の
+保持メモリ・ピークメモリ・1サロンあたりのサイズを比較する
+
+実行方法:
+    cd backend
+    python -m benchmarks.bench_records --pages 100
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import tracemalloc
+
+from scraper import parse_hpb_page, dedupe_salons
+from benchmarks.stub_server import render_page
+
+
+def collect(pages: list[str], as_dicts: bool) -> tuple[list, int, int]:
+    """全ページをパースしてサロンを保持し、(サロン, 保持バイト数, ピークバイト数) を返す"""
+    gc.collect()
+    tracemalloc.start()
+    all_salons = []
+    seen_names = set()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for html in pages:
+            salons = dedupe_salons(parse_hpb_page(html).salons, seen_names)
+            if as_dicts:
+                all_salons.extend(salon.to_dict() for salon in salons)
+            else:
+                all_salons.extend(salons)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return all_salons, current, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="サロンレコードのメモリベンチマーク")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--salons-per-page", type=int, default=20)
+    args = parser.parse_args()
+    
+    pages = [render_page(page, args.pages, args.salons_per_page) for page in range(1, args.pages + 1)]
+    print(f"corpus: {args.pages} pages x {args.salons_per_page} salons")
+    print(f"{'record':>8} {'salons':>7} {'retained[KiB]':>14} {'peak[KiB]':>10} {'bytes/salon':>12}")
+    
+    results = {}
+    for name, as_dicts in (("dict", True), ("slots", False)):
+        salons, current, peak = collect(pages, as_dicts)
+        results[name] = current
+        print(f"{name:>8} {len(salons):>7} {current / 1024:>14.1f} {peak / 1024:>10.1f} {current / len(salons):>12.0f}")
+        del salons
+    
+    print(f"retained reduction: {1 - results['slots'] / results['dict']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
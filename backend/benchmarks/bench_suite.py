@@ -0,0 +1,454 @@
+"""
+HPB Price Analyzer - スクレイパー・APIのベンチマークスイート
+保存済みの検索結果ページ（tests/fixtures）とスタブサーバーを使い、主要な処理の
+所要時間を計測してJSONに保存する。保存した結果同士を比較して性能の後退を検出できる。
+
+計測対象:
+    extract_number       価格・件数テキストの数値抽出
+    parse_salon_card     サロンカード1件のパース（BeautifulSoup / lxml）
+    parse_hpb_page       ページ全体のパース（BeautifulSoup / lxml）
+    parse_pool           ページ全体のパースをワーカープロセス数を変えて並列実行（コア数に対するスケーリング）
+    scrape_hpb_url       スタブサーバーからの1ページ取得＋パース
+    scrape_multiple      スタブサーバーからの複数ページ並列取得
+    api_analyze          /api/analyze の登録から完了まで（DBは偽物に差し替え）
+    serialize_history    1k/5k/10k件のサロンを含む履歴詳細のレスポンス生成（従来の経路 / orjson / キャッシュ済み）と
+                         ピークメモリ
+
+実行方法:
+    cd backend
+    python -m benchmarks.bench_suite                       # benchmarks/results/<commit>.json に保存
+    python -m benchmarks.bench_suite --quick --only extract_number parse_hpb_page
+    python -m benchmarks.bench_suite --compare benchmarks/results/abc1234.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import pathlib
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Optional
+from unittest.mock import patch
+
+import httpx
+from bs4 import BeautifulSoup
+from lxml import etree
+
+import fast_json
+import parse_pool
+import rate_limiter
+from history_cache import HistoryCache
+from scraper import (
+    extract_number,
+    parse_salon_card,
+    parse_salon_element,
+    parse_hpb_page,
+    parse_hpb_page_async,
+    scrape_hpb_url,
+    scrape_multiple_pages_async,
+    _XP_CARDS,
+)
+from benchmarks.stub_server import StubServer, render_page
+
+
+BENCH_DIR = pathlib.Path(__file__).resolve().parent
+FIXTURE_DIR = BENCH_DIR.parent / "tests" / "fixtures"
+RESULTS_DIR = BENCH_DIR / "results"
+
+# 比較時に後退とみなす悪化率のデフォルト
+DEFAULT_THRESHOLD = 0.20
+
+
+def load_corpus() -> list[str]:
+    """保存済みの検索結果ページを読み込む"""
+    return [path.read_text(encoding="utf-8") for path in sorted(FIXTURE_DIR.glob("*.html"))]
+
+
+def time_op(fn: Callable[[], object], number: int, repeat: int) -> dict:
+    """
+    fn を number 回実行する計測を repeat 回行い、1回あたりの所要時間を集計
+    
+    Returns:
+        median_us / min_us（1回あたりのマイクロ秒）と ops_per_sec（中央値から算出）
+    """
+    samples = []
+    # 処理中の進捗ログは計測結果の表示を妨げるため抑制
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()  # ウォームアップ
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - start) / number)
+    
+    median = statistics.median(samples)
+    return {
+        "median_us": round(median * 1e6, 3),
+        "min_us": round(min(samples) * 1e6, 3),
+        "ops_per_sec": round(1 / median, 1) if median else None,
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def loosen_rate_limit() -> None:
+    """取得処理そのものを測るため、ホスト単位のレート制限とリトライ待ちを緩める"""
+    rate_limiter.RATE_LIMIT_PER_SECOND = 100000.0
+    rate_limiter.RATE_LIMIT_BURST = 100000.0
+    rate_limiter.INITIAL_CONCURRENCY = 20
+    rate_limiter.MAX_CONCURRENCY = max(rate_limiter.MAX_CONCURRENCY, 20)
+    rate_limiter.RETRY_BASE_DELAY = 0.0
+
+
+# ===========================================
+# 計測対象
+# ===========================================
+
+def bench_extract_number(scale: float) -> dict:
+    texts = ["¥5,500", "￥12,000円", "3,300円～", "口コミ 1,234件", "ブログ 56件", "", "価格未定"]
+    
+    def run():
+        for text in texts:
+            extract_number(text)
+    
+    return {"extract_number": time_op(run, number=int(2000 * scale) or 1, repeat=5)}
+
+
+def bench_parse_salon_card(scale: float) -> dict:
+    corpus = load_corpus()
+    bs4_cards = [card for html in corpus for card in BeautifulSoup(html, "lxml").select("li.searchListCassette")]
+    lxml_cards = [card for html in corpus for card in _XP_CARDS(etree.HTML(html.encode("utf-8")))]
+    
+    def run_bs4():
+        for card in bs4_cards:
+            parse_salon_card(card)
+    
+    def run_lxml():
+        for card in lxml_cards:
+            parse_salon_element(card)
+    
+    number = int(20 * scale) or 1
+    results = {
+        "parse_salon_card[bs4]": time_op(run_bs4, number=number, repeat=5),
+        "parse_salon_card[lxml]": time_op(run_lxml, number=number, repeat=5),
+    }
+    # 1回の実行で全カードを処理するため、カード1件あたりに換算
+    for result in results.values():
+        result["cards"] = len(bs4_cards)
+        result["per_card_us"] = round(result["median_us"] / len(bs4_cards), 3)
+    return results
+
+
+def bench_parse_hpb_page(scale: float) -> dict:
+    corpus = load_corpus() + [render_page(page, 5, 20) for page in range(1, 6)]
+    results = {}
+    for engine in ("bs4", "lxml"):
+        def run(engine=engine):
+            for html in corpus:
+                parse_hpb_page(html, engine=engine)
+        results[f"parse_hpb_page[{engine}]"] = time_op(run, number=int(5 * scale) or 1, repeat=5)
+        results[f"parse_hpb_page[{engine}]"]["pages"] = len(corpus)
+    return results
+
+
+def bench_parse_pool(scale: float) -> dict:
+    """
+    保存済みページ＋スタブページ（計40ページ）を一度に並列パース
+    
+    プロセス内（スレッド、GILにより実質1コア）と、ワーカー数 1, 2, 4, ... (コア数まで) の
+    プロセスプールを比較する。speedup はプロセス内に対する倍率。
+    """
+    corpus = load_corpus() + [render_page(page, 40, 20) for page in range(1, 41)]
+    corpus = corpus[:40]
+    cpus = os.cpu_count() or 1
+    worker_counts = sorted({n for n in (1, 2, 4, 8, 16) if n <= cpus} | {cpus})
+    
+    async def parse_all():
+        await asyncio.gather(*[parse_hpb_page_async(html) for html in corpus])
+    
+    results = {}
+    original = parse_pool.PARSE_WORKERS
+    try:
+        for workers in [0] + worker_counts:
+            parse_pool.shutdown_parse_pool()
+            parse_pool.PARSE_WORKERS = workers
+            name = "parse_pool[inprocess]" if workers == 0 else f"parse_pool[workers={workers}]"
+            # ワーカーの起動はウォームアップで済ませる
+            result = time_op(lambda: asyncio.run(parse_all()), number=1, repeat=max(1, int(5 * scale)))
+            result.update(pages=len(corpus), workers=workers, cpus=cpus)
+            results[name] = result
+    finally:
+        parse_pool.shutdown_parse_pool()
+        parse_pool.PARSE_WORKERS = original
+    
+    baseline = results["parse_pool[inprocess]"]["median_us"]
+    for result in results.values():
+        result["speedup"] = round(baseline / result["median_us"], 2) if result["median_us"] else None
+    return results
+
+
+def bench_scrape_hpb_url(scale: float) -> dict:
+    with StubServer(pages=1) as stub:
+        return {
+            "scrape_hpb_url": time_op(
+                lambda: scrape_hpb_url(stub.base_url, cache_mode="bypass"),
+                number=int(20 * scale) or 1,
+                repeat=5
+            )
+        }
+
+
+def bench_scrape_multiple(scale: float) -> dict:
+    loosen_rate_limit()
+    pages = 20
+    with StubServer(pages=pages, latency=0.01) as stub:
+        result = time_op(
+            lambda: asyncio.run(scrape_multiple_pages_async(stub.base_url, pages, cache_mode="bypass")),
+            number=1,
+            repeat=max(1, int(5 * scale))
+        )
+    result["pages"] = pages
+    return {"scrape_multiple_pages": result}
+
+
+def bench_api_analyze(scale: float) -> dict:
+    """
+    /api/analyze を TestClient で登録し、完了したジョブを取得するまで
+    
+    HPBへの通信はスタブページを返すモックトランスポートに、Supabaseへの保存は
+    メモリ上の偽物に差し替える。
+    """
+    from fastapi.testclient import TestClient
+    from main import app
+    
+    loosen_rate_limit()
+    pages = 5
+    saved = []
+    
+    async def handler(request: httpx.Request) -> httpx.Response:
+        match = re.search(r'/PN(\d+)/', request.url.path)
+        page = int(match.group(1)) if match else 1
+        return httpx.Response(200, text=render_page(page, pages, 20))
+    
+    def fake_save(user_id, target_url, raw_data, title=""):
+        saved.append(raw_data)
+        return {"id": f"bench-{len(saved)}"}
+    
+    transport_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client = TestClient(app)
+    headers = {"X-User-Id": "bench-user"}
+    
+    def run():
+        response = client.post(
+            "/api/analyze",
+            json={"url": "https://beauty.hotpepper.jp/genre/kgkw094/", "max_pages": pages, "cache_mode": "bypass"},
+            headers=headers
+        )
+        job = client.get(f"/api/jobs/{response.json()['job_id']}", headers=headers).json()
+        assert job["status"] == "completed", job
+    
+    with patch("scraper.get_http_client", return_value=transport_client), \
+            patch("jobs.save_search_history", side_effect=fake_save):
+        result = time_op(run, number=int(5 * scale) or 1, repeat=5)
+    
+    result["pages"] = pages
+    return {"api_analyze": result}
+
+
+def make_history(salon_count: int) -> dict:
+    """Supabaseから取得した形の検索履歴（raw_data にサロンの辞書）"""
+    raw_data = [
+        {
+            "name": f"ベンチマークサロン{i}",
+            "url": f"https://beauty.hotpepper.jp/slnH{i:09d}/",
+            "blog_count": i % 40,
+            "review_count": i % 500,
+            "coupon_prices": [3000 + i % 7 * 500, 5000 + i % 5 * 1000, 8800],
+            "min_price": 3000 + i % 7 * 500,
+            "max_price": 8800,
+            "average_price": round((8000 + i % 7 * 500 + i % 5 * 1000 + 8800) / 3, 2),
+        }
+        for i in range(salon_count)
+    ]
+    return {
+        "id": "00000000-0000-0000-0000-000000000000",
+        "created_at": "2026-01-01T00:00:00.000000+00:00",
+        "user_id": "bench-user",
+        "target_url": "https://beauty.hotpepper.jp/genre/kgkw094/",
+        "title": "ベンチマーク",
+        "raw_data": raw_data,
+        "salon_count": salon_count,
+        "min_price": 3000,
+        "median_price": 6000,
+        "max_price": 8800,
+        "total_reviews": 0,
+    }
+
+
+def peak_memory(fn: Callable[[], object]) -> int:
+    """fn の実行中に増えたメモリのピーク（バイト、tracemalloc で計測）"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_serialize_history(scale: float) -> dict:
+    """
+    履歴詳細（/api/history/{id}）のレスポンス本文の生成
+    
+    fastapi: 辞書を返した場合の従来の経路（jsonable_encoder + JSONResponse の json.dumps）
+    orjson:  fast_json.FastJSONResponse で直接シリアライズ（orjson がない環境では標準の json）
+    cached:  履歴キャッシュのシリアライズ済みJSONを返す（2回目以降の取得）
+    """
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    
+    results = {}
+    for salon_count in (1000, 5000, 10000):
+        history = make_history(salon_count)
+        cache = HistoryCache(max_bytes=1 << 30)
+        cache.put(history["id"], history)
+        paths = {
+            "fastapi": lambda: JSONResponse(jsonable_encoder(history)).body,
+            "orjson": lambda: fast_json.FastJSONResponse(history).body,
+            "cached": lambda: fast_json.FastJSONResponse(cache.get_bytes(history["id"])).body,
+        }
+        number = max(1, int(20 * scale * 1000 / salon_count))
+        for path, fn in paths.items():
+            result = time_op(fn, number=number, repeat=5)
+            result.update(
+                salons=salon_count,
+                body_bytes=len(fn()),
+                peak_kb=round(peak_memory(fn) / 1024, 1),
+                orjson=fast_json.orjson is not None,
+            )
+            results[f"serialize_history[{path},n={salon_count}]"] = result
+        
+        baseline = results[f"serialize_history[fastapi,n={salon_count}]"]["median_us"]
+        for path in paths:
+            result = results[f"serialize_history[{path},n={salon_count}]"]
+            result["speedup"] = round(baseline / result["median_us"], 2) if result["median_us"] else None
+    
+    return results
+
+
+BENCHMARKS: dict[str, Callable[[float], dict]] = {
+    "extract_number": bench_extract_number,
+    "parse_salon_card": bench_parse_salon_card,
+    "parse_hpb_page": bench_parse_hpb_page,
+    "parse_pool": bench_parse_pool,
+    "scrape_hpb_url": bench_scrape_hpb_url,
+    "scrape_multiple": bench_scrape_multiple,
+    "api_analyze": bench_api_analyze,
+    "serialize_history": bench_serialize_history,
+}
+
+
+# ===========================================
+# 結果の保存・比較
+# ===========================================
+
+def git_commit() -> Optional[str]:
+    """現在のコミットの短縮ハッシュ（gitがない場合はNone）"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(names: list[str], scale: float) -> dict:
+    """指定したベンチマークを実行し、環境情報とあわせて返す"""
+    results = {}
+    for name in names:
+        print(f"running {name} ...", file=sys.stderr)
+        results.update(BENCHMARKS[name](scale))
+    
+    return {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "results": results,
+    }
+
+
+def compare_results(base: dict, current: dict, threshold: float = DEFAULT_THRESHOLD) -> list[dict]:
+    """
+    2つの結果を中央値で比較
+    
+    Returns:
+        共通する計測ごとの比較（ratio は current / base、regression は threshold を超える悪化）
+    """
+    rows = []
+    for name, result in current["results"].items():
+        if name not in base["results"]:
+            continue
+        before = base["results"][name]["median_us"]
+        after = result["median_us"]
+        ratio = after / before if before else float("inf")
+        rows.append({
+            "name": name,
+            "base_us": before,
+            "current_us": after,
+            "ratio": round(ratio, 3),
+            "regression": ratio > 1 + threshold,
+        })
+    return rows
+
+
+def print_results(report: dict) -> None:
+    print(f"{'benchmark':<26} {'median[us]':>12} {'min[us]':>12} {'ops/sec':>10}")
+    for name, result in report["results"].items():
+        print(f"{name:<26} {result['median_us']:>12.1f} {result['min_us']:>12.1f} {result['ops_per_sec']:>10.1f}")
+
+
+def print_comparison(rows: list[dict], base: dict) -> None:
+    print(f"\ncompared with {base.get('commit') or 'base'}:")
+    print(f"{'benchmark':<26} {'base[us]':>12} {'now[us]':>12} {'ratio':>7}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['name']:<26} {row['base_us']:>12.1f} {row['current_us']:>12.1f} {row['ratio']:>6.2f}x{flag}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="スクレイパー・APIのベンチマークスイート")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="実行するベンチマーク")
+    parser.add_argument("--quick", action="store_true", help="反復回数を減らして短時間で実行")
+    parser.add_argument("--output", type=pathlib.Path, help="結果JSONの保存先（省略時は results/<commit>.json）")
+    parser.add_argument("--compare", type=pathlib.Path, help="比較する過去の結果JSON")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="後退とみなす悪化率")
+    args = parser.parse_args()
+    
+    report = run_suite(args.only or list(BENCHMARKS), scale=0.2 if args.quick else 1.0)
+    print_results(report)
+    
+    output = args.output or RESULTS_DIR / f"{report['commit'] or time.strftime('%Y%m%d%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\nsaved: {output}")
+    
+    if args.compare:
+        base = json.loads(args.compare.read_text(encoding="utf-8"))
+        rows = compare_results(base, report, args.threshold)
+        print_comparison(rows, base)
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
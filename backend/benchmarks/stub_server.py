@@ -0,0 +1,272 @@
+"""
+HPB Price Analyzer - HPB検索結果のスタブサーバー
+ベンチマーク・負荷試験用に合成した検索結果ページを返すローカルHTTPサーバー。
+ページ数・サロン数・応答遅延・エラー（429/503/タイムアウト）・サロンの重複を設定できる。
+
+単体で起動してバックエンドの取得先にする場合:
+    cd backend
+    python -m benchmarks.stub_server --port 8765 --pages 50 --latency 0.2 --error-rate 0.05
+    HPB_UPSTREAM_URL=http://127.0.0.1:8765 python main.py
+"""
+
+import re
+import sys
+import time
+import random
+import argparse
+import threading
+from typing import Optional, Union
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# 注入できるエラー（HTTPステータス、または "timeout"）
+Fault = Union[int, str]
+
+
+def render_page(page: int, pages: int, salons_per_page: int, duplicates: int = 0) -> str:
+    """
+    検索結果ページのHTMLを生成
+    
+    Args:
+        page: ページ番号
+        pages: 総ページ数
+        salons_per_page: 1ページあたりのサロン数
+        duplicates: 2ページ目以降の先頭に前ページ末尾のサロンを重ねて載せる件数
+                    （掲載順の入れ替わりで同じサロンが連続するページに現れる状況の再現）
+    """
+    first_id = (page - 1) * salons_per_page + 1
+    salon_ids = list(range(first_id, first_id + salons_per_page))
+    if page > 1 and duplicates:
+        overlap = min(duplicates, salons_per_page)
+        salon_ids = list(range(first_id - overlap, first_id)) + salon_ids[:salons_per_page - overlap]
+    
+    cards = []
+    for salon_id in salon_ids:
+        prices = "".join(
+            f'<p class="slcCouponPrice">¥{3000 + (salon_id * 37 + k * 1100) % 9000:,}</p>'
+            for k in range(4)
+        )
+        cards.append(f"""
+<li class="searchListCassette">
+  <div class="slcHeadWrap"><h3 class="slcHead cFix"><a href="/slnH{salon_id:09d}/">スタブサロン{salon_id}</a></h3></div>
+  <dl class="slcDetail">
+    <dt class="slcDetailBlogIcon">ブログ</dt><dd><a href="/slnH{salon_id:09d}/blog/">{salon_id % 50}件</a></dd>
+    <dt class="slcDetailMessageIcon">口コミ</dt><dd><a href="/slnH{salon_id:09d}/review/">{salon_id * 3 % 500}件</a></dd>
+  </dl>
+  {prices}
+</li>""")
+    
+    next_link = f'<a class="iS arrowPagingR" href="PN{page + 1}/">次へ</a>' if page < pages else ""
+    
+    return f"""<!DOCTYPE html>
+<html lang="ja"><head><meta charset="utf-8">
+<title>スタブエリアの美容院・美容室・ヘアサロン｜ホットペッパービューティー</title></head>
+<body>
+<div class="preListHead"><span class="numberOfResult">{pages * salons_per_page}</span>件
+<p class="pa bottom0 mT5">{page}/{pages}ページ</p></div>
+<ul class="slnCassetteList">{"".join(cards)}
+</ul>
+<div class="paging">{next_link}</div>
+</body></html>"""
+
+
+class StubServer:
+    """
+    スタブサーバー
+    
+    どのパスでも検索結果ページとして応答し、/PN{n}/ からページ番号を読む。
+    
+    Args:
+        pages: 検索結果の総ページ数
+        salons_per_page: 1ページあたりのサロン数
+        latency: 1リクエストあたりの応答遅延（秒）
+        page_latency: ページ番号ごとの応答遅延（秒、latency より優先）
+        error_rate: ランダムにエラーを返す確率（0〜1）
+        error_faults: ランダムに返すエラーの種類（HTTPステータス、または "timeout"）
+        faults: ページ番号ごとに、最初のリクエストから順に返すエラーの列
+                （例: {3: [429, "timeout"]} なら3ページ目の1・2回目がエラーで3回目に成功）
+        retry_after: 429/503 に付ける Retry-After（秒、Noneなら付けない）
+        hang_seconds: "timeout" のときに応答せず待つ秒数（その後接続を切る）
+        duplicates: 2ページ目以降の先頭に重ねて載せる前ページのサロン数
+        seed: ランダムなエラー注入の乱数シード
+        host: 待ち受けるアドレス
+        port: 待ち受けるポート（0なら空いているポート）
+    """
+    
+    def __init__(
+        self,
+        pages: int = 10,
+        salons_per_page: int = 20,
+        latency: float = 0.0,
+        page_latency: Optional[dict[int, float]] = None,
+        error_rate: float = 0.0,
+        error_faults: tuple[Fault, ...] = (429, 503, "timeout"),
+        faults: Optional[dict[int, list[Fault]]] = None,
+        retry_after: Optional[float] = None,
+        hang_seconds: float = 30.0,
+        duplicates: int = 0,
+        seed: Optional[int] = None,
+        host: str = "127.0.0.1",
+        port: int = 0
+    ):
+        self.pages = pages
+        self.salons_per_page = salons_per_page
+        self.latency = latency
+        self.page_latency = page_latency or {}
+        self.error_rate = error_rate
+        self.error_faults = error_faults
+        self.faults = {page: list(seq) for page, seq in (faults or {}).items()}
+        self.retry_after = retry_after
+        self.hang_seconds = hang_seconds
+        self.duplicates = duplicates
+        self.request_count = 0
+        # ステータス（タイムアウトは "timeout"）ごとの応答数
+        self.responses: dict[Fault, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._page_requests: dict[int, int] = {}
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+    
+    @property
+    def origin(self) -> str:
+        """HPB_UPSTREAM_URL に設定するオリジン"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    @property
+    def base_url(self) -> str:
+        return f"{self.origin}/genre/kgkw094/"
+    
+    def _next_fault(self, page: int) -> Optional[Fault]:
+        """このリクエストで返すエラー（なければNone）"""
+        with self._lock:
+            self.request_count += 1
+            attempt = self._page_requests.get(page, 0)
+            self._page_requests[page] = attempt + 1
+            
+            sequence = self.faults.get(page, [])
+            if attempt < len(sequence):
+                return sequence[attempt]
+            if self.error_rate and self._random.random() < self.error_rate:
+                return self._random.choice(self.error_faults)
+            return None
+    
+    def _count(self, status: Fault) -> None:
+        with self._lock:
+            self.responses[status] = self.responses.get(status, 0) + 1
+    
+    def _make_handler(self):
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive を有効にする（Nagleによる応答遅延は無効化）
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+            
+            def do_GET(self):
+                match = re.search(r'/PN(\d+)/', self.path)
+                page = int(match.group(1)) if match else 1
+                fault = stub._next_fault(page)
+                
+                delay = stub.page_latency.get(page, stub.latency)
+                if delay:
+                    time.sleep(delay)
+                
+                if fault == "timeout":
+                    # 応答せずに待ってから接続を切る（クライアント側のタイムアウトを誘発）
+                    stub._count("timeout")
+                    time.sleep(stub.hang_seconds)
+                    self.close_connection = True
+                    return
+                
+                if fault is not None:
+                    stub._count(fault)
+                    self.send_response(int(fault))
+                    if stub.retry_after is not None and int(fault) in (429, 503):
+                        self.send_header("Retry-After", f"{stub.retry_after:g}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                
+                if page > stub.pages:
+                    stub._count(404)
+                    self.send_error(404)
+                    return
+                
+                body = render_page(page, stub.pages, stub.salons_per_page, stub.duplicates).encode("utf-8")
+                stub._count(200)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    def start(self) -> "StubServer":
+        # 停止時の待ち時間を短くするため、停止要求の確認間隔を短くする
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def __enter__(self) -> "StubServer":
+        return self.start()
+    
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def parse_fault(value: str) -> Fault:
+    return value if value == "timeout" else int(value)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HPB検索結果のスタブサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--salons", type=int, default=20, help="1ページあたりのサロン数")
+    parser.add_argument("--latency", type=float, default=0.0, help="応答遅延（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="ランダムにエラーを返す確率")
+    parser.add_argument("--errors", default="429,503,timeout", help="ランダムに返すエラー（カンマ区切り）")
+    parser.add_argument("--retry-after", type=float, help="429/503 に付ける Retry-After（秒）")
+    parser.add_argument("--hang", type=float, default=30.0, help="timeout のときに待つ秒数")
+    parser.add_argument("--duplicates", type=int, default=0, help="前ページから重ねて載せるサロン数")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    
+    stub = StubServer(
+        pages=args.pages,
+        salons_per_page=args.salons,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_faults=tuple(parse_fault(v) for v in args.errors.split(",") if v),
+        retry_after=args.retry_after,
+        hang_seconds=args.hang,
+        duplicates=args.duplicates,
+        seed=args.seed,
+        host=args.host,
+        port=args.port
+    )
+    print(f"stub server: {stub.base_url}")
+    print(f"backend: HPB_UPSTREAM_URL={stub.origin}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub._server.server_close()
+        print(f"requests: {stub.request_count} {stub.responses}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
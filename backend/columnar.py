@@ -0,0 +1,89 @@
+"""
+HPB Price Analyzer - 履歴詳細の列形式（format=columnar）
+サロンごとに同じキーと同じURLの先頭部分を繰り返す raw_data を、項目ごとの配列と
+URLの先頭部分の辞書に変換してレスポンスを小さくする。
+
+    {
+        ...履歴の raw_data 以外の項目,
+        "format": "columnar",
+        "salons": {
+            "count": 2,
+            "url_prefixes": ["https://beauty.hotpepper.jp/"],
+            "columns": {
+                "name": ["サロンA", "サロンB"],
+                "url_prefix": [0, 0],           # url_prefixes の添字
+                "url": ["slnH000000001/", "slnH000000002/"],  # 先頭部分を除いたURL
+                "blog_count": [...], ...
+            }
+        }
+    }
+"""
+
+# サロンの項目（SalonData.to_dict のキー）
+SALON_FIELDS = (
+    "name", "url", "blog_count", "review_count", "coupon_prices", "min_price", "max_price", "average_price",
+)
+
+
+def split_url(url: str) -> tuple[str, str]:
+    """
+    URLを先頭部分（最後のパス要素の直前まで）と残りに分割
+    
+    "https://beauty.hotpepper.jp/slnH000000001/" -> ("https://beauty.hotpepper.jp/", "slnH000000001/")
+    """
+    end = url.find("?")
+    path = url if end < 0 else url[:end]
+    cut = path.rstrip("/").rfind("/") + 1
+    if cut <= path.find("://") + 3:
+        return "", url
+    return url[:cut], url[cut:]
+
+
+def to_columnar(history: dict) -> dict:
+    """
+    履歴を列形式に変換
+    
+    Args:
+        history: 検索履歴（raw_data にサロンの辞書のリスト）
+    
+    Returns:
+        raw_data を salons（項目ごとの配列とURLの先頭部分の辞書）に置き換えた履歴
+    """
+    salons = history.get("raw_data") or []
+    prefixes: dict[str, int] = {}
+    columns: dict[str, list] = {field: [] for field in SALON_FIELDS}
+    columns["url_prefix"] = []
+    
+    for salon in salons:
+        prefix, rest = split_url(salon.get("url") or "")
+        columns["url_prefix"].append(prefixes.setdefault(prefix, len(prefixes)))
+        columns["url"].append(rest)
+        for field in SALON_FIELDS:
+            if field != "url":
+                columns[field].append(salon.get(field))
+    
+    columnar = {key: value for key, value in history.items() if key != "raw_data"}
+    columnar["format"] = "columnar"
+    columnar["salons"] = {
+        "count": len(salons),
+        "url_prefixes": list(prefixes),
+        "columns": columns,
+    }
+    return columnar
+
+
+def from_columnar(columnar: dict) -> dict:
+    """to_columnar の逆変換（raw_data を復元した履歴）"""
+    salons = columnar["salons"]
+    columns = salons["columns"]
+    prefixes = salons["url_prefixes"]
+    
+    raw_data = []
+    for i in range(salons["count"]):
+        salon = {field: columns[field][i] for field in SALON_FIELDS}
+        salon["url"] = prefixes[columns["url_prefix"][i]] + columns["url"][i]
+        raw_data.append(salon)
+    
+    history = {key: value for key, value in columnar.items() if key not in ("format", "salons")}
+    history["raw_data"] = raw_data
+    return history
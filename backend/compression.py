@@ -0,0 +1,160 @@
+"""
+HPB Price Analyzer - レスポンス圧縮ミドルウェア
+Accept-Encoding に応じて brotli（導入時）または gzip でレスポンスを圧縮する。
+ストリーミング（NDJSON）のレスポンスはチャンクごとにフラッシュし、進捗の送信を遅らせない。
+"""
+
+import os
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli がない環境では gzip のみ
+    brotli = None
+
+
+# 圧縮設定
+COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "1") == "1"
+# これより小さいレスポンスは圧縮しない（バイト）
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+# brotli の品質（0-11、動的なレスポンス向けに速度寄りの値）
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Accept-Encoding から使う圧縮形式を選ぶ（br を優先、q=0 は除外）
+    
+    Returns:
+        "br" / "gzip"、どちらも使えない場合はNone
+    """
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip())
+    
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    """圧縮形式ごとの差を吸収（process で圧縮、flush でそこまでを出力、finish で終端）"""
+    
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+            self._zlib = None
+        else:
+            self._brotli = None
+            # wbits=31 で gzip 形式
+            self._zlib = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)
+    
+    def process(self, data: bytes) -> bytes:
+        return self._brotli.process(data) if self._brotli else self._zlib.compress(data)
+    
+    def flush(self) -> bytes:
+        return self._brotli.flush() if self._brotli else self._zlib.flush(zlib.Z_SYNC_FLUSH)
+    
+    def finish(self) -> bytes:
+        return self._brotli.finish() if self._brotli else self._zlib.flush()
+
+
+class CompressionMiddleware:
+    """
+    レスポンスを brotli / gzip で圧縮するASGIミドルウェア
+    
+    1回で送られるレスポンスは COMPRESS_MIN_BYTES 以上の場合のみ圧縮する。
+    すでに Content-Encoding が設定されているレスポンスはそのまま返す。
+    
+    Args:
+        app: ASGIアプリケーション
+        minimum_size: 圧縮する最小サイズ（バイト）
+    """
+    
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and COMPRESS_ENABLED:
+            encoding = choose_encoding(Headers(scope=scope).get("Accept-Encoding", ""))
+            if encoding is not None:
+                await _CompressionResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class _CompressionResponder:
+    """1つのレスポンスの圧縮（starlette の GZipResponder と同じ流れ）"""
+    
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send: Optional[Send] = None
+        self.initial_message: Message = {}
+        self.started = False
+        self.passthrough = False
+        self.compressor: Optional[_Compressor] = None
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+    
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # ヘッダーは本文の大きさ・ストリーミングかどうかを見てから送る
+            self.initial_message = message
+            self.passthrough = "content-encoding" in Headers(raw=message["headers"])
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+        
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        
+        if not self.started:
+            self.started = True
+            if self.passthrough or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+            
+            self.compressor = _Compressor(self.encoding)
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                body = self.compressor.process(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(body))
+                await self.send(self.initial_message)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            await self.send(self.initial_message)
+        elif self.passthrough:
+            await self.send(message)
+            return
+        
+        # ストリーミング: チャンクごとにフラッシュして送る
+        data = self.compressor.process(body)
+        data += self.compressor.flush() if more_body else self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
@@ -3,13 +3,30 @@ HPB Price Analyzer - Supabaseデータベース連携モジュール
 """
 
 import os
+import re
+import uuid
+import base64
+import statistics
+from collections import Counter
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from history_cache import get_history_cache, SERIALIZERS
+from metrics import span
 
 # 環境変数を読み込み
 load_dotenv()
 
+# 履歴一覧で取得する列（raw_data は含めない）
+HISTORY_LIST_COLUMNS = "id, created_at, target_url, title, salon_count, min_price, median_price, max_price, total_reviews"
+
+# 履歴一覧の1ページあたりの最大件数
+HISTORY_PAGE_MAX = 100
+
+# 対象URLの利用回数を数えるときに読む履歴の最大件数
+TARGET_URL_SCAN_MAX = 5000
+
 # Supabaseクライアントのシングルトン
 _supabase_client: Optional[Client] = None
 
@@ -54,33 +71,213 @@ def save_search_history(
         "user_id": user_id,
         "target_url": target_url,
         "raw_data": raw_data,
-        "title": title
+        "title": title,
+        **summarize_salons(raw_data)
     }
     
-    result = client.table("search_history").insert(data).execute()
-    print(f"DEBUG: Insert result: {result.data}")
+    with span("db_insert"):
+        result = client.table("search_history").insert(data).execute()
+    
+    if not result.data:
+        raise ValueError("データの保存に失敗しました")
+    
+    saved = result.data[0]
+    
+    # 正規化テーブルは raw_data から再生成できるため、失敗しても履歴の保存は成功とする
+    try:
+        save_price_observations(saved["id"], raw_data, saved.get("created_at"))
+    except Exception as e:
+        print(f"Price observation save error: {e}")
     
-    if result.data:
-        return result.data[0]
-    raise ValueError("データの保存に失敗しました")
+    return saved
 
 
-def get_all_search_history(limit: int = 20) -> list[dict]:
+def append_history_chunks(stream_id: str, chunks: list[tuple[int, list[dict]]]) -> None:
     """
-    全ての検索履歴を取得（共有表示用）
+    ストリーミング保存中の履歴にサロンをページ単位で追記
+    
+    同じページ番号は上書きするため、再開時に同じページを送り直しても重複しない。
+    created_at も書き込み時刻に更新し、再開中の追記分を期限切れとして削除しないようにする
+    （delete_stale_history_chunks）。
+    
+    Args:
+        stream_id: 保存処理のID
+        chunks: (ページ番号, サロンリスト) のリスト
+    """
+    if not chunks:
+        return
+    
+    client = get_supabase_client()
+    written_at = datetime.now(timezone.utc).isoformat()
+    rows = [
+        {"stream_id": stream_id, "seq": seq, "salons": salons, "created_at": written_at}
+        for seq, salons in chunks
+    ]
+    
+    with span("db_append"):
+        client.table("search_history_chunks").upsert(rows, on_conflict="stream_id,seq").execute()
+
+
+def finalize_history_stream(stream_id: str, user_id: str, target_url: str, title: str = "") -> dict:
+    """
+    追記したサロンをページ順に連結して検索履歴を保存
+    
+    連結・集計値の算出・正規化テーブルへの保存はデータベース側で行い、
+    raw_data 全体はバックエンドに読み込まない。
     
     Args:
+        stream_id: 保存処理のID
+        user_id: ユーザーID（Supabase Auth）
+        target_url: スクレイピング対象URL
+        title: ページタイトル
+    
+    Returns:
+        保存された履歴（id, created_at, salon_count）
+    """
+    client = get_supabase_client()
+    
+    with span("db_insert"):
+        result = client.rpc("finalize_search_history_stream", {
+            "p_stream_id": stream_id,
+            "p_user_id": user_id,
+            "p_target_url": target_url,
+            "p_title": title,
+        }).execute()
+    
+    if not result.data:
+        raise ValueError("データの保存に失敗しました")
+    
+    return result.data[0]
+
+
+def discard_history_stream(stream_id: str) -> None:
+    """確定しなかったストリーミング保存の追記分を削除"""
+    client = get_supabase_client()
+    client.table("search_history_chunks").delete().eq("stream_id", stream_id).execute()
+
+
+def delete_stale_history_chunks(max_age_seconds: float) -> int:
+    """
+    確定も削除もされなかったストリーミング保存の追記分を削除
+    
+    切断・プロセスの停止で discard_history_stream が呼ばれなかった追記分を回収する。
+    
+    Args:
+        max_age_seconds: 最後に書き込まれてからこの秒数を過ぎた追記分を削除
+        
+    Returns:
+        削除した行数
+    """
+    client = get_supabase_client()
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds)
+    result = client.table("search_history_chunks").delete().lt("created_at", cutoff.isoformat()).execute()
+    return len(result.data or [])
+
+
+def extract_salon_id(url: str) -> str:
+    """サロンURLからHPBのサロンID（slnH000123456）を抽出、できない場合はURL自体"""
+    match = re.search(r'/(sln[A-Z]\d+)', url or "")
+    return match.group(1) if match else url
+
+
+def build_observation_rows(
+    history_id: str,
+    salons: list[dict],
+    observed_at: Optional[str] = None
+) -> tuple[list[dict], list[dict]]:
+    """
+    サロンリストから salons / price_observations の行を生成
+    
+    同じサロンが複数回含まれる場合は最初の出現のみを使う
+    （一括upsertは同一キーを2回更新できないため）。
+    
+    Returns:
+        (salons の行, price_observations の行)
+    """
+    salon_rows = []
+    observation_rows = []
+    seen_ids = set()
+    
+    for position, salon in enumerate(salons, start=1):
+        salon_id = extract_salon_id(salon.get("url", ""))
+        if not salon_id or salon_id in seen_ids:
+            continue
+        seen_ids.add(salon_id)
+        
+        salon_row = {
+            "salon_id": salon_id,
+            "url": salon.get("url", ""),
+            "name": salon["name"],
+        }
+        observation_row = {
+            "history_id": history_id,
+            "salon_id": salon_id,
+            "position": position,
+            "blog_count": salon.get("blog_count"),
+            "review_count": salon.get("review_count"),
+            "coupon_prices": salon.get("coupon_prices") or [],
+            "min_price": salon.get("min_price"),
+            "max_price": salon.get("max_price"),
+            "average_price": salon.get("average_price"),
+        }
+        if observed_at:
+            salon_row["last_seen_at"] = observed_at
+            observation_row["observed_at"] = observed_at
+        
+        salon_rows.append(salon_row)
+        observation_rows.append(observation_row)
+    
+    return salon_rows, observation_rows
+
+
+def save_price_observations(
+    history_id: str,
+    salons: list[dict],
+    observed_at: Optional[str] = None
+) -> int:
+    """
+    サロンと価格観測値を正規化テーブルに一括保存
+    
+    salons は1回の一括upsert、price_observations は1回の一括insertで書き込む。
+    
+    Args:
+        history_id: 検索履歴ID
+        salons: スクレイピング結果（サロンリスト）
+        observed_at: 観測日時（検索履歴の created_at）
+        
+    Returns:
+        保存した観測値の件数
+    """
+    salon_rows, observation_rows = build_observation_rows(history_id, salons, observed_at)
+    if not observation_rows:
+        return 0
+    
+    client = get_supabase_client()
+    with span("db_observations"):
+        client.table("salons").upsert(salon_rows, on_conflict="salon_id").execute()
+        client.table("price_observations").insert(observation_rows).execute()
+    
+    return len(observation_rows)
+
+
+def get_salon_price_history(salon_id: str, limit: int = 30) -> list[dict]:
+    """
+    サロンの価格推移を取得（新しい順）
+    
+    Args:
+        salon_id: HPBのサロンID
         limit: 取得件数上限
         
     Returns:
-        検索履歴のリスト（新しい順）
+        価格観測値のリスト
     """
     client = get_supabase_client()
     
     result = (
-        client.table("search_history")
-        .select("id, created_at, target_url, raw_data, title")
-        .order("created_at", desc=True)
+        client.table("price_observations")
+        .select("history_id, observed_at, position, review_count, blog_count, coupon_prices, min_price, max_price, average_price")
+        .eq("salon_id", salon_id)
+        .order("observed_at", desc=True)
         .limit(limit)
         .execute()
     )
@@ -88,16 +285,172 @@ def get_all_search_history(limit: int = 20) -> list[dict]:
     return result.data or []
 
 
+def summarize_salons(salons: list[dict]) -> dict:
+    """
+    履歴一覧用の集計値を算出（保存時に一度だけ計算して列に保存）
+    
+    Args:
+        salons: サロンリスト
+        
+    Returns:
+        サロン数・最低/中央値/最高価格・口コミ総数
+    """
+    min_prices = [s["min_price"] for s in salons if s.get("min_price") is not None]
+    max_prices = [s["max_price"] for s in salons if s.get("max_price") is not None]
+    average_prices = [s["average_price"] for s in salons if s.get("average_price") is not None]
+    
+    return {
+        "salon_count": len(salons),
+        "min_price": min(min_prices) if min_prices else None,
+        "median_price": statistics.median(average_prices) if average_prices else None,
+        "max_price": max(max_prices) if max_prices else None,
+        "total_reviews": sum(s.get("review_count") or 0 for s in salons),
+    }
+
+
+def encode_history_cursor(row: dict) -> str:
+    """履歴の (created_at, id) からページ送り用カーソルを生成"""
+    raw = f"{row['created_at']}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_history_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """
+    カーソルを (created_at, id) に変換
+    
+    クライアントから受け取った値をフィルターに埋め込むため、日時とUUIDとして解釈できるものだけを受け付ける
+    
+    Raises:
+        ValueError: 不正なカーソルの場合
+    """
+    try:
+        created_at, history_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(history_id)
+    except Exception:
+        raise ValueError("不正なカーソルです")
+
+
+def get_all_search_history(limit: int = 20, cursor: Optional[str] = None) -> tuple[list[dict], Optional[str]]:
+    """
+    全ての検索履歴を取得（共有表示用）
+    
+    raw_data は取得せず、保存時に算出した集計列のみを返す。
+    (created_at, id) のキーセットページングで、cursor より古い履歴を取得する。
+    
+    Args:
+        limit: 取得件数上限
+        cursor: 前ページの next_cursor（省略時は最新から）
+        
+    Returns:
+        (検索履歴のリスト（新しい順）, 次ページのカーソル（最後のページはNone）)
+    """
+    # 不正なカーソルは接続前に弾く
+    after = decode_history_cursor(cursor) if cursor else None
+    client = get_supabase_client()
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
+    
+    query = client.table("search_history").select(HISTORY_LIST_COLUMNS)
+    
+    # postgrest-py には or_ / 複数列の order がないため、パラメータを直接指定する
+    query.params = query.params.add("order", "created_at.desc,id.desc")
+    if after:
+        # 解釈した値から組み立て直す（カーソルの文字列をそのまま埋め込まない）
+        created_at, history_id = after[0].isoformat(), str(after[1])
+        query.params = query.params.add(
+            "or",
+            f'(created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{history_id}))'
+        )
+    
+    # 次ページの有無を判定するため1件多く取得
+    result = query.limit(limit + 1).execute()
+    rows = result.data or []
+    
+    next_cursor = encode_history_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def get_target_url_counts(since: str) -> list[tuple[str, int]]:
+    """
+    期間内に分析された対象URLごとの回数（プリウォームの対象選び用）
+    
+    新しい順に最大 TARGET_URL_SCAN_MAX 件の履歴を数える。
+    
+    Args:
+        since: 期間の開始日時（ISO 8601）
+        
+    Returns:
+        (対象URL, 回数) のリスト（回数の多い順）
+    """
+    client = get_supabase_client()
+    
+    result = (
+        client.table("search_history")
+        .select("target_url")
+        .gte("created_at", since)
+        .order("created_at", desc=True)
+        .limit(TARGET_URL_SCAN_MAX)
+        .execute()
+    )
+    counts = Counter(row["target_url"] for row in result.data or [])
+    return counts.most_common()
+
+
 def get_search_history_by_id(history_id: str) -> Optional[dict]:
     """
     特定の検索履歴を取得（全ユーザー共有）
     
+    保存済みの履歴は変更されないため、メモリ上の履歴キャッシュを優先して返す
+    
     Args:
         history_id: 検索履歴ID
         
     Returns:
         検索履歴データ、見つからない場合はNone
     """
+    cache = get_history_cache()
+    if cache:
+        cached = cache.get(history_id)
+        if cached is not None:
+            return cached
+    
+    history = _fetch_search_history(history_id)
+    
+    if cache and history:
+        cache.put(history_id, history)
+    
+    return history
+
+
+def get_search_history_json(history_id: str, format: str = "json") -> Optional[bytes]:
+    """
+    特定の検索履歴をシリアライズ済みのJSONで取得（レスポンス用）
+    
+    履歴キャッシュにあればシリアライズ済みのJSONをそのまま返し、
+    なければ取得してシリアライズしたものをキャッシュする。
+    
+    Args:
+        history_id: 検索履歴ID
+        format: レスポンス形式（json / columnar）
+        
+    Returns:
+        検索履歴のJSON、見つからない場合はNone
+    """
+    cache = get_history_cache()
+    if cache:
+        with span("serialize"):
+            cached = cache.get_bytes(history_id, format)
+        if cached is not None:
+            return cached
+    
+    history = _fetch_search_history(history_id)
+    if not history:
+        return None
+    
+    with span("serialize"):
+        return cache.put(history_id, history, format) if cache else SERIALIZERS[format](history)
+
+
+def _fetch_search_history(history_id: str) -> Optional[dict]:
     client = get_supabase_client()
     
     result = (
@@ -111,6 +464,54 @@ def get_search_history_by_id(history_id: str) -> Optional[dict]:
     return result.data
 
 
+def replace_history_salons(
+    history_id: str,
+    user_id: str,
+    raw_data: list[dict],
+    title: str = ""
+) -> Optional[dict]:
+    """
+    検索履歴のサロンデータを置き換え（アーカイブからの再パース用）
+    
+    集計列と正規化テーブルも作り直す。正規化テーブルは raw_data から
+    再生成できるため、失敗しても履歴の更新は成功とする。
+    
+    Args:
+        history_id: 検索履歴ID
+        user_id: ユーザーID（権限チェック用）
+        raw_data: 再パースしたサロンリスト
+        title: 再パースしたページタイトル
+        
+    Returns:
+        更新されたレコード、見つからないか権限がない場合はNone
+    """
+    client = get_supabase_client()
+    
+    result = (
+        client.table("search_history")
+        .update({"raw_data": raw_data, "title": title, **summarize_salons(raw_data)})
+        .eq("id", history_id)
+        .eq("user_id", user_id)
+        .execute()
+    )
+    if not result.data:
+        return None
+    
+    updated = result.data[0]
+    
+    cache = get_history_cache()
+    if cache:
+        cache.invalidate(history_id)
+    
+    try:
+        client.table("price_observations").delete().eq("history_id", history_id).execute()
+        save_price_observations(history_id, raw_data, updated.get("created_at"))
+    except Exception as e:
+        print(f"Price observation save error: {e}")
+    
+    return updated
+
+
 def delete_search_history(history_id: str, user_id: str) -> bool:
     """
     検索履歴を削除
@@ -132,4 +533,10 @@ def delete_search_history(history_id: str, user_id: str) -> bool:
         .execute()
     )
     
-    return len(result.data) > 0
+    deleted = len(result.data) > 0
+    if deleted:
+        cache = get_history_cache()
+        if cache:
+            cache.invalidate(history_id)
+    
+    return deleted
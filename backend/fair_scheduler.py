@@ -0,0 +1,195 @@
+"""
+HPB Price Analyzer - ユーザー間の公平なスクレイピングスケジューラー
+ページ取得をユーザー（X-User-Id）ごとのキューに積み、重み付き公平キューイングで
+順番に取得枠を割り当てる。大きな分析が取得枠を占有して、小さな分析が待たされないようにする。
+"""
+
+import os
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+
+# スケジューラー設定
+FAIR_SCHEDULER_ENABLED = os.getenv("FAIR_SCHEDULER_ENABLED", "1") == "1"
+# 全ユーザー合計で同時に取得するページ数（ホスト単位のレート制限の手前で割り当てる）
+FAIR_CAPACITY = int(os.getenv("FAIR_CAPACITY", "6"))
+# 1ユーザーが同時に取得するページ数の上限
+FAIR_PER_USER_INFLIGHT = int(os.getenv("FAIR_PER_USER_INFLIGHT", "4"))
+# 取得待ちのページ数の上限（超えている間は新しい分析を受け付けない）
+FAIR_MAX_QUEUED = int(os.getenv("FAIR_MAX_QUEUED", "200"))
+# ユーザーごとの重み（"user-a:2,user-b:0.5"、未指定は1）
+FAIR_USER_WEIGHTS = os.getenv("FAIR_USER_WEIGHTS", "")
+
+
+def parse_weights(value: str) -> dict[str, float]:
+    """"user-a:2,user-b:0.5" 形式の重みを辞書に変換"""
+    weights = {}
+    for item in value.split(","):
+        if ":" in item:
+            user_id, weight = item.rsplit(":", 1)
+            weights[user_id.strip()] = max(float(weight), 0.01)
+    return weights
+
+
+class FairScheduler:
+    """
+    重み付き公平キューイングによる取得枠の割り当て
+    
+    ユーザーごとに仮想時刻を持ち、取得枠を割り当てるたびに 1/重み だけ進める。
+    空いた枠は、同時取得数が上限未満のユーザーのうち仮想時刻が最も小さい
+    ユーザーのキューの先頭に割り当てる（重みがすべて1ならラウンドロビン）。
+    待ちのなかったユーザーが戻ってきた場合は、仮想時刻を全体の時刻まで進め、
+    待っていなかった間の分を使えないようにする。
+    
+    Args:
+        capacity: 全ユーザー合計で同時に取得するページ数
+        per_user_inflight: 1ユーザーが同時に取得するページ数の上限
+        max_queued: 取得待ちのページ数の上限（is_saturated の判定に使う）
+        weights: ユーザーごとの重み
+    """
+    
+    def __init__(
+        self,
+        capacity: int = FAIR_CAPACITY,
+        per_user_inflight: int = FAIR_PER_USER_INFLIGHT,
+        max_queued: int = FAIR_MAX_QUEUED,
+        weights: Optional[dict[str, float]] = None
+    ):
+        self.capacity = max(1, capacity)
+        self.per_user_inflight = max(1, per_user_inflight)
+        self.max_queued = max_queued
+        self.weights = weights if weights is not None else parse_weights(FAIR_USER_WEIGHTS)
+        self.stats = {"granted": 0, "waited": 0}
+        self._queues: dict[str, deque[asyncio.Future]] = {}
+        self._inflight: dict[str, int] = {}
+        self._vtime: dict[str, float] = {}
+        self._clock = 0.0
+        self._active = 0
+    
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+    
+    def is_saturated(self) -> bool:
+        """取得待ちのページ数が上限に達しているか"""
+        return self.queued >= self.max_queued
+    
+    def _eligible(self, user_id: str) -> bool:
+        return self._inflight.get(user_id, 0) < self.per_user_inflight
+    
+    def _grant(self, user_id: str) -> None:
+        self._active += 1
+        self._inflight[user_id] = self._inflight.get(user_id, 0) + 1
+        self._clock = max(self._clock, self._vtime.get(user_id, 0.0))
+        self._vtime[user_id] = self._vtime.get(user_id, self._clock) + 1 / self.weights.get(user_id, 1.0)
+        self.stats["granted"] += 1
+    
+    def _dispatch(self) -> None:
+        """空いている枠を待っているユーザーに割り当てる"""
+        while self._active < self.capacity:
+            candidates = [
+                user_id for user_id, queue in self._queues.items()
+                if queue and self._eligible(user_id)
+            ]
+            if not candidates:
+                return
+            user_id = min(candidates, key=lambda u: self._vtime.get(u, self._clock))
+            waiter = self._queues[user_id].popleft()
+            if not self._queues[user_id]:
+                del self._queues[user_id]
+            if waiter.done():
+                continue
+            self._grant(user_id)
+            waiter.set_result(None)
+    
+    async def acquire(self, user_id: str) -> None:
+        """取得枠を確保（必要なら自分の順番まで待機）"""
+        if user_id not in self._queues and user_id not in self._inflight:
+            # 待っていなかった間の分は使えない
+            self._vtime[user_id] = max(self._vtime.get(user_id, 0.0), self._clock)
+        
+        if self._active < self.capacity and self._eligible(user_id) and not self._queues:
+            self._grant(user_id)
+            return
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user_id, deque()).append(waiter)
+        self.stats["waited"] += 1
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 割り当て直後にキャンセルされた場合は枠を返す
+                self.release(user_id)
+            else:
+                queue = self._queues.get(user_id)
+                if queue is not None and waiter in queue:
+                    queue.remove(waiter)
+                    if not queue:
+                        del self._queues[user_id]
+            raise
+    
+    def release(self, user_id: str) -> None:
+        """取得枠を返し、次の待ちに割り当てる"""
+        self._active -= 1
+        self._inflight[user_id] -= 1
+        if not self._inflight[user_id]:
+            del self._inflight[user_id]
+        self._dispatch()
+    
+    @asynccontextmanager
+    async def slot(self, user_id: str) -> AsyncIterator[None]:
+        """取得枠を確保して処理を実行"""
+        await self.acquire(user_id)
+        try:
+            yield
+        finally:
+            self.release(user_id)
+    
+    def snapshot(self) -> dict:
+        """現在の割り当て状況と統計"""
+        return {
+            **self.stats,
+            "capacity": self.capacity,
+            "active": self._active,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "users": {
+                user_id: {
+                    "in_flight": self._inflight.get(user_id, 0),
+                    "queued": len(self._queues.get(user_id, ())),
+                }
+                for user_id in sorted(set(self._inflight) | set(self._queues))
+            },
+        }
+
+
+# スケジューラー（イベントループごとに保持）
+_scheduler: Optional[FairScheduler] = None
+_scheduler_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_fair_scheduler() -> Optional[FairScheduler]:
+    """スケジューラーを取得（無効化されている場合はNone）"""
+    global _scheduler, _scheduler_loop
+    
+    if not FAIR_SCHEDULER_ENABLED:
+        return None
+    loop = asyncio.get_running_loop()
+    if _scheduler is None or _scheduler_loop is not loop:
+        _scheduler = FairScheduler(FAIR_CAPACITY, FAIR_PER_USER_INFLIGHT, FAIR_MAX_QUEUED)
+        _scheduler_loop = loop
+    return _scheduler
+
+
+def is_scheduler_saturated() -> bool:
+    """取得待ちのページ数が上限に達しているか（新しい分析の受付判定用）"""
+    return _scheduler is not None and _scheduler.is_saturated()
+
+
+def get_scheduler_stats() -> Optional[dict]:
+    """スケジューラーの状況"""
+    return _scheduler.snapshot() if _scheduler is not None else None
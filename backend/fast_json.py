@@ -0,0 +1,52 @@
+"""
+HPB Price Analyzer - JSONシリアライズモジュール
+数千件のサロンを含む履歴・ストリーミングのレスポンスを orjson で直接バイト列にする。
+FastAPI の既定の経路（jsonable_encoder で辞書を作り直してから json.dumps）を通さない。
+orjson がない環境では標準の json で同じ形式（UTF-8・区切りの空白なし）を出力する。
+"""
+
+import json
+from typing import Any, Callable, Optional
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson がない環境では標準の json を使う
+    orjson = None
+
+
+def dumps(data: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """
+    JSONのバイト列に変換
+    
+    Args:
+        data: 変換するデータ
+        default: 変換できない型を変換する関数（json.dumps の default と同じ）
+    
+    Returns:
+        UTF-8のJSON
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=default)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=default).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    """dumps の出力（JSONのバイト列）を読み込む"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    dumps でシリアライズするレスポンス
+    
+    シリアライズ済みのバイト列（履歴キャッシュの値など）はそのまま返す。
+    """
+    
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
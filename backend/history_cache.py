@@ -0,0 +1,201 @@
+"""
+HPB Price Analyzer - 履歴キャッシュモジュール
+保存済みの検索履歴（保存後は変わらない）をメモリ上にLRUキャッシュし、Supabaseへの往復を減らす。
+履歴はレスポンス用にシリアライズ済みのJSON（形式 json / columnar ごと）だけで保持し、
+取得のたびにシリアライズし直さない。サイズの上限は保持しているバイト列の合計に対して適用する。
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from fast_json import dumps, loads
+from columnar import to_columnar, from_columnar
+
+
+# キャッシュ設定（HISTORY_CACHE_MAX_BYTES は保持するJSONの合計バイト数、HISTORY_CACHE_TTL は秒）
+HISTORY_CACHE_ENABLED = os.getenv("HISTORY_CACHE_ENABLED", "1") == "1"
+HISTORY_CACHE_MAX_BYTES = int(os.getenv("HISTORY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+HISTORY_CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", "3600"))
+
+
+def serialize(data: dict) -> bytes:
+    """履歴データをレスポンス用のJSONに変換"""
+    return dumps(data, default=str)
+
+
+def serialize_columnar(data: dict) -> bytes:
+    """履歴データを列形式（format=columnar）のJSONに変換"""
+    return dumps(to_columnar(data), default=str)
+
+
+# レスポンス形式 -> 履歴データをJSONに変換する関数
+SERIALIZERS = {
+    "json": serialize,
+    "columnar": serialize_columnar,
+}
+
+# レスポンス形式 -> JSONを履歴データに戻す関数
+DESERIALIZERS = {
+    "json": loads,
+    "columnar": lambda body: from_columnar(loads(body)),
+}
+
+
+def estimate_size(data: dict) -> int:
+    """履歴データのサイズ（UTF-8のJSON換算バイト数）"""
+    return len(serialize(data))
+
+
+class HistoryCache:
+    """
+    サイズ上限付きのLRUメモリキャッシュ
+    
+    保存された履歴は削除以外で変更されないため、TTLは他プロセスからの削除を
+    拾うための保険として扱う。
+    辞書は保持せず、登録時にシリアライズしたJSONのみを保持する（辞書はJSONの数倍のメモリを使うため）。
+    get_bytes はそのバイト列を返し、get は取得のたびにJSONから辞書を作る。
+    他の形式は初めて要求されたときにシリアライズして追加し、サイズに加える。
+    
+    Args:
+        max_bytes: キャッシュ全体のサイズ上限（保持するJSONの合計バイト数）
+        ttl: エントリの有効秒数
+    """
+    
+    def __init__(self, max_bytes: int = HISTORY_CACHE_MAX_BYTES, ttl: float = HISTORY_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+        self._lock = threading.Lock()
+        # history_id -> (形式 -> シリアライズ済みJSON, 保存時刻)
+        self._entries: OrderedDict[str, tuple[dict[str, bytes], float]] = OrderedDict()
+        self._total_bytes = 0
+    
+    def get(self, history_id: str) -> Optional[dict]:
+        """キャッシュ済みの履歴を取得（期限切れ・未登録はNone）"""
+        entry = self._lookup(history_id)
+        return _decode(entry[0]) if entry is not None else None
+    
+    def get_bytes(self, history_id: str, format: str = "json") -> Optional[bytes]:
+        """
+        キャッシュ済みの履歴をシリアライズ済みのJSONで取得（期限切れ・未登録はNone）
+        
+        Args:
+            history_id: 検索履歴ID
+            format: レスポンス形式（SERIALIZERS のキー）
+        """
+        entry = self._lookup(history_id)
+        if entry is None:
+            return None
+        
+        bodies, _ = entry
+        body = bodies.get(format)
+        if body is None:
+            body = SERIALIZERS[format](_decode(bodies))
+            with self._lock:
+                if self._entries.get(history_id) is entry and format not in bodies:
+                    bodies[format] = body
+                    self._total_bytes += len(body)
+                    self._evict()
+        return body
+    
+    def put(self, history_id: str, data: dict, format: str = "json") -> bytes:
+        """
+        履歴を登録（上限を超える場合は古いものから削除）
+        
+        Args:
+            history_id: 検索履歴ID
+            data: 検索履歴
+            format: あわせてシリアライズするレスポンス形式
+        
+        Returns:
+            format 形式のJSON（上限を超えて登録しなかった場合も返す）
+        """
+        body = SERIALIZERS[format](data)
+        size = len(body)
+        if size > self.max_bytes:
+            return body
+        
+        with self._lock:
+            self._remove(history_id)
+            self._entries[history_id] = ({format: body}, time.monotonic())
+            self._total_bytes += size
+            self.stats["stores"] += 1
+            self._evict()
+        
+        return body
+    
+    def invalidate(self, history_id: str) -> None:
+        """履歴をキャッシュから削除"""
+        with self._lock:
+            if self._remove(history_id):
+                self.stats["invalidations"] += 1
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+    
+    def snapshot(self) -> dict:
+        """ヒット率・件数・サイズ"""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+                "entries": len(self._entries),
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+    
+    def _evict(self) -> None:
+        """上限を超えている間、古いものから削除（ロックを取得して呼ぶ）"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+    
+    def _lookup(self, history_id: str) -> Optional[tuple[dict[str, bytes], float]]:
+        with self._lock:
+            entry = self._entries.get(history_id)
+            if entry is not None and time.monotonic() - entry[1] >= self.ttl:
+                self._remove(history_id)
+                entry = None
+            
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            
+            self._entries.move_to_end(history_id)
+            self.stats["hits"] += 1
+            return entry
+    
+    def _remove(self, history_id: str) -> bool:
+        entry = self._entries.pop(history_id, None)
+        if entry is None:
+            return False
+        self._total_bytes -= sum(len(body) for body in entry[0].values())
+        return True
+
+
+def _decode(bodies: dict[str, bytes]) -> dict:
+    """保持しているいずれかの形式のJSONから履歴データを作る"""
+    format, body = next(iter(bodies.items()))
+    return DESERIALIZERS[format](body)
+
+
+_history_cache: Optional[HistoryCache] = None
+
+
+def get_history_cache() -> Optional[HistoryCache]:
+    """履歴キャッシュを取得（無効化されている場合はNone）"""
+    global _history_cache
+    
+    if not HISTORY_CACHE_ENABLED:
+        return None
+    if _history_cache is None:
+        _history_cache = HistoryCache()
+    
+    return _history_cache
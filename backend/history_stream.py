@@ -0,0 +1,189 @@
+"""
+HPB Price Analyzer - 検索履歴のストリーミング保存モジュール
+ページ数の多い分析で、スクレイピングしたサロンを取得済みのページから順に
+Supabaseへ追記し、最後に1件の検索履歴として確定する。
+全サロンをメモリに溜めてから1回で保存しないため、メモリ使用量と1リクエストの大きさが
+ページ数に比例して増えない。
+"""
+
+import os
+import uuid
+import asyncio
+from typing import Callable, Optional
+
+from scraper import iter_pages_async, dedupe_salons, salons_to_dicts, PageResult, SalonData, SALONS_PER_PAGE
+from database import append_history_chunks, finalize_history_stream, discard_history_stream, delete_stale_history_chunks
+from archive import ScrapeRecording
+
+
+# ストリーミング保存の設定（保存先に search_history_chunks テーブルと
+# finalize_search_history_stream 関数が必要: supabase/schema.sql）
+STREAM_SAVE_ENABLED = os.getenv("STREAM_SAVE_ENABLED", "0") == "1"
+# ストリーミング保存に切り替える取得ページ数（max_pages がこれ以上の分析）
+STREAM_SAVE_MIN_PAGES = int(os.getenv("STREAM_SAVE_MIN_PAGES", "20"))
+# メモリに保持するサロン数の上限（追記待ちのサロンと先読みしたページの合計）
+STREAM_SAVE_WINDOW = int(os.getenv("STREAM_SAVE_WINDOW", "200"))
+# 確定も削除もされなかった追記分を削除するまでの秒数（最も長い分析・永続ジョブの再開より長くする）と、確認間隔（秒）
+STREAM_CHUNK_TTL = float(os.getenv("STREAM_CHUNK_TTL", str(24 * 60 * 60)))
+STREAM_CHUNK_SWEEP_INTERVAL = float(os.getenv("STREAM_CHUNK_SWEEP_INTERVAL", str(60 * 60)))
+
+
+def should_stream(max_pages: int) -> bool:
+    """この取得ページ数の分析をストリーミング保存にするか"""
+    return STREAM_SAVE_ENABLED and max_pages >= STREAM_SAVE_MIN_PAGES
+
+
+def read_ahead_pages(window: int) -> int:
+    """保持するサロン数の上限のうち、先読みに使うページ数（半分を目安、最低1ページ）"""
+    return max(1, window // (2 * SALONS_PER_PAGE))
+
+
+class HistoryStreamWriter:
+    """
+    検索履歴にサロンをページ単位で追記し、最後に確定する
+    
+    追記待ちのサロンが上限に達するたびに、溜まったページをまとめて1回で追記する。
+    ページ番号ごとに上書きするため、中断した保存を同じ stream_id で再開できる。
+    
+    Args:
+        stream_id: 保存処理のID（省略時は新しく生成）
+        window: メモリに保持するサロン数の上限（先読みの分を除いた残りを追記待ちに使う）
+    """
+    
+    def __init__(self, stream_id: Optional[str] = None, window: int = STREAM_SAVE_WINDOW):
+        self.stream_id = stream_id or str(uuid.uuid4())
+        self.read_ahead = read_ahead_pages(window)
+        self.buffer_limit = max(SALONS_PER_PAGE, window - self.read_ahead * SALONS_PER_PAGE)
+        self.salon_count = 0
+        self.peak_buffered = 0
+        self.flushes = 0
+        self._buffer: list[tuple[int, list[dict]]] = []
+        self._buffered = 0
+        self._finishing = False
+    
+    async def add_page(self, page: int, salons: list[SalonData]) -> None:
+        """ページのサロン（重複排除済み）を追記待ちに加え、上限を超える前に追記"""
+        if not salons:
+            return
+        if self._buffered + len(salons) > self.buffer_limit:
+            await self.flush()
+        
+        self._buffer.append((page, salons_to_dicts(salons)))
+        self._buffered += len(salons)
+        self.salon_count += len(salons)
+        self.peak_buffered = max(self.peak_buffered, self._buffered)
+        
+        if self._buffered >= self.buffer_limit:
+            await self.flush()
+    
+    async def flush(self) -> None:
+        """追記待ちのページを保存先に追記"""
+        if not self._buffer:
+            return
+        chunks, self._buffer, self._buffered = self._buffer, [], 0
+        await asyncio.to_thread(append_history_chunks, self.stream_id, chunks)
+        self.flushes += 1
+    
+    async def finish(self, user_id: str, target_url: str, title: str = "") -> dict:
+        """
+        残りを追記して検索履歴を確定
+        
+        Returns:
+            保存された履歴（id, created_at, salon_count）
+        """
+        await self.flush()
+        self._finishing = True
+        try:
+            return await asyncio.to_thread(finalize_history_stream, self.stream_id, user_id, target_url, title)
+        except Exception:
+            self._finishing = False
+            raise
+    
+    async def discard(self) -> None:
+        """
+        確定せずに追記分を削除（削除に失敗しても例外は出さない）
+        
+        確定の途中でキャンセルされた場合は削除しない（待つのをやめても確定の処理はスレッドで続くため）。
+        確定に失敗した追記分は sweep_stale_chunks で削除される。
+        """
+        self._buffer, self._buffered = [], 0
+        if self._finishing:
+            return
+        try:
+            await asyncio.to_thread(discard_history_stream, self.stream_id)
+        except Exception as e:
+            print(f"History stream discard error: {e}")
+
+
+async def sweep_stale_chunks(interval: float = STREAM_CHUNK_SWEEP_INTERVAL, max_age: float = STREAM_CHUNK_TTL) -> None:
+    """interval ごとに max_age を過ぎた追記分を削除（キャンセルされるまで続ける）"""
+    while True:
+        try:
+            deleted = await asyncio.to_thread(delete_stale_history_chunks, max_age)
+            if deleted:
+                print(f"History stream sweep: deleted {deleted} stale chunks")
+        except Exception as e:
+            print(f"History stream sweep failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def start_chunk_sweeper() -> Optional[asyncio.Task]:
+    """
+    期限切れの追記分の削除をバックグラウンドタスクとして開始
+    
+    Returns:
+        削除のタスク（ストリーミング保存が無効化されている場合はNone）
+    """
+    if not STREAM_SAVE_ENABLED:
+        return None
+    return asyncio.create_task(sweep_stale_chunks())
+
+
+async def stream_scrape(
+    writer: HistoryStreamWriter,
+    user_id: str,
+    target_url: str,
+    max_pages: int,
+    on_page: Optional[Callable[[int, Optional[PageResult]], None]] = None,
+    cache_mode: str = "use",
+    recording: Optional[ScrapeRecording] = None,
+    done_pages: Optional[dict[int, PageResult]] = None
+) -> str:
+    """
+    スクレイピングしながら重複排除したサロンを writer に追記
+    
+    先読みするページ数を writer の上限に合わせて制限するため、保存先への追記が
+    遅くても取得済みのページがメモリに溜まらない（重複排除用のサロン名のみ全件保持する）。
+    確定（writer.finish）と、失敗した場合の追記分の削除は呼び出し側で行う。
+    
+    Args:
+        writer: 追記先
+        user_id: ユーザーID（ページ取得の公平な割り当て用）
+        target_url: スクレイピング対象URL
+        max_pages: 取得ページ数の上限
+        on_page: ページ取得ごとのコールバック（iter_pages_async と同じ）
+        cache_mode: ページキャッシュの利用方法（use / refresh / bypass）
+        recording: 取得したHTMLを保存するアーカイブの記録
+        done_pages: 取得済みのページ（中断したスクレイピングの再開用）
+    
+    Returns:
+        1ページ目のタイトル
+    """
+    seen_names = set()
+    title = ""
+    
+    async for page, result in iter_pages_async(
+        target_url,
+        max_pages,
+        on_page=on_page,
+        cache_mode=cache_mode,
+        recording=recording,
+        done_pages=done_pages,
+        user_id=user_id,
+        max_ahead=writer.read_ahead
+    ):
+        if page == 1:
+            title = result.title
+        await writer.add_page(page, dedupe_salons(result.salons, seen_names))
+    
+    return title
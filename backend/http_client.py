@@ -0,0 +1,224 @@
+"""
+HPB Price Analyzer - HTTPクライアントモジュール
+HPBへのリクエストで共有する接続プール付きHTTPクライアントと通信時間の計測
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Optional
+from dataclasses import dataclass, asdict
+import httpx
+
+
+# HPBへのリクエストヘッダー
+# Accept-Encoding は httpx が対応する圧縮形式（gzip, deflate, brotli導入時は br）を自動で付与
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'ja,en-US;q=0.7,en;q=0.3',
+}
+
+# 接続プール設定
+HTTP_MAX_CONNECTIONS = int(os.getenv("HPB_HTTP_MAX_CONNECTIONS", "10"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HPB_HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HPB_HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HPB_HTTP_TIMEOUT", "30"))
+HTTP2_ENABLED = os.getenv("HPB_HTTP2", "0") == "1"
+
+# 保持する通信時間の件数
+TIMING_HISTORY_SIZE = 200
+
+
+@dataclass
+class RequestTiming:
+    """1リクエスト分の通信時間（ミリ秒）"""
+    url: str
+    status_code: Optional[int]
+    http_version: str
+    connection_reused: bool
+    connect_ms: float
+    tls_ms: float
+    ttfb_ms: float
+    download_ms: float
+    total_ms: float
+    
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+# 共有クライアント（非同期クライアントはイベントループごとに保持）
+_async_client: Optional[httpx.AsyncClient] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_client: Optional[httpx.Client] = None
+
+_timings: deque[RequestTiming] = deque(maxlen=TIMING_HISTORY_SIZE)
+
+
+def _http2_available() -> bool:
+    """HTTP/2 を有効にするか（h2 パッケージが必要）"""
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("HPB_HTTP2=1 ですが h2 がインストールされていないため HTTP/1.1 を使用します")
+        return False
+
+
+def _client_options() -> dict:
+    """共有クライアントの生成オプション"""
+    return {
+        "headers": DEFAULT_HEADERS,
+        "timeout": HTTP_TIMEOUT,
+        "follow_redirects": True,
+        "http2": _http2_available(),
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+    }
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    共有の非同期HTTPクライアントを取得（シングルトン）
+    
+    接続はイベントループに紐づくため、実行中のループが変わった場合は作り直す。
+    """
+    global _async_client, _async_client_loop
+    
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client.is_closed or _async_client_loop is not loop:
+        _async_client = httpx.AsyncClient(**_client_options())
+        _async_client_loop = loop
+    
+    return _async_client
+
+
+def get_sync_http_client() -> httpx.Client:
+    """共有の同期HTTPクライアントを取得（シングルトン）"""
+    global _sync_client
+    
+    if _sync_client is None or _sync_client.is_closed:
+        _sync_client = httpx.Client(**_client_options())
+    
+    return _sync_client
+
+
+async def close_http_clients() -> None:
+    """共有クライアントを閉じる（アプリケーション終了時）"""
+    global _async_client, _async_client_loop, _sync_client
+    
+    if _async_client is not None and _async_client_loop is asyncio.get_running_loop():
+        await _async_client.aclose()
+    if _sync_client is not None:
+        _sync_client.close()
+    
+    _async_client = None
+    _async_client_loop = None
+    _sync_client = None
+
+
+class _TraceRecorder:
+    """httpcore の trace イベントから各段階の時刻を記録"""
+    
+    def __init__(self):
+        self.events: dict[str, float] = {}
+    
+    def record(self, name: str) -> None:
+        # "http11.receive_response_headers.started" -> "receive_response_headers.started"
+        stage = name.split(".", 1)[1] if name.startswith("http") else name
+        self.events.setdefault(stage, time.perf_counter())
+    
+    async def async_trace(self, name: str, info: dict) -> None:
+        self.record(name)
+    
+    def sync_trace(self, name: str, info: dict) -> None:
+        self.record(name)
+    
+    def span_ms(self, start: str, end: str) -> float:
+        if start in self.events and end in self.events:
+            return round((self.events[end] - self.events[start]) * 1000, 2)
+        return 0.0
+    
+    def to_timing(self, url: str, response: Optional[httpx.Response], started: float) -> RequestTiming:
+        return RequestTiming(
+            url=url,
+            status_code=response.status_code if response is not None else None,
+            http_version=response.http_version if response is not None else "",
+            connection_reused="connection.connect_tcp.started" not in self.events,
+            connect_ms=self.span_ms("connection.connect_tcp.started", "connection.connect_tcp.complete"),
+            tls_ms=self.span_ms("connection.start_tls.started", "connection.start_tls.complete"),
+            ttfb_ms=self.span_ms("send_request_headers.started", "receive_response_headers.complete"),
+            download_ms=self.span_ms("receive_response_body.started", "receive_response_body.complete"),
+            total_ms=round((time.perf_counter() - started) * 1000, 2)
+        )
+
+
+async def timed_get(client: httpx.AsyncClient, url: str, headers: Optional[dict] = None) -> httpx.Response:
+    """
+    GETリクエストを送信し、接続・TLS・TTFB・ダウンロード時間を記録
+    
+    Args:
+        client: HTTPクライアント
+        url: 取得するURL
+        headers: 追加のリクエストヘッダー
+    
+    Raises:
+        httpx.HTTPError: 通信に失敗した場合
+    """
+    recorder = _TraceRecorder()
+    started = time.perf_counter()
+    response = None
+    try:
+        response = await client.get(url, headers=headers, extensions={"trace": recorder.async_trace})
+        return response
+    finally:
+        _timings.append(recorder.to_timing(url, response, started))
+
+
+def timed_get_sync(client: httpx.Client, url: str, headers: Optional[dict] = None) -> httpx.Response:
+    """timed_get の同期版"""
+    recorder = _TraceRecorder()
+    started = time.perf_counter()
+    response = None
+    try:
+        response = client.get(url, headers=headers, extensions={"trace": recorder.sync_trace})
+        return response
+    finally:
+        _timings.append(recorder.to_timing(url, response, started))
+
+
+def get_recent_timings(limit: int = 20) -> list[dict]:
+    """直近のリクエストの通信時間を取得（新しい順）"""
+    return [timing.to_dict() for timing in list(_timings)[::-1][:limit]]
+
+
+def get_timing_summary() -> dict:
+    """保持している通信時間の平均と接続再利用率を集計"""
+    timings = list(_timings)
+    if not timings:
+        return {"requests": 0}
+    
+    def average(attr: str) -> float:
+        return round(sum(getattr(t, attr) for t in timings) / len(timings), 2)
+    
+    return {
+        "requests": len(timings),
+        "connection_reuse_rate": round(sum(t.connection_reused for t in timings) / len(timings), 3),
+        "avg_connect_ms": average("connect_ms"),
+        "avg_tls_ms": average("tls_ms"),
+        "avg_ttfb_ms": average("ttfb_ms"),
+        "avg_download_ms": average("download_ms"),
+        "avg_total_ms": average("total_ms"),
+        "pool": {
+            "max_connections": HTTP_MAX_CONNECTIONS,
+            "max_keepalive_connections": HTTP_MAX_KEEPALIVE,
+            "keepalive_expiry": HTTP_KEEPALIVE_EXPIRY,
+            "http2": HTTP2_ENABLED,
+        },
+    }
@@ -0,0 +1,295 @@
+"""
+HPB Price Analyzer - 永続ジョブキューモジュール
+分析ジョブとページごとのチェックポイント（パース済みサロン）をSQLiteに保存し、
+プロセスの再起動後も最後に完了したページの続きから再開できるようにする
+"""
+
+import os
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from scraper import PageResult, SalonData
+
+
+# 永続ジョブキューの設定
+DURABLE_JOBS_ENABLED = os.getenv("DURABLE_JOBS_ENABLED", "0") == "1"
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", ".cache/jobs.sqlite3")
+# ワーカーがジョブを占有する秒数（この間に更新がなければ他のワーカーが引き継ぐ）
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+# ジョブを実行する回数の上限（毎回ワーカーが落ちるジョブを打ち切る）
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# jobs テーブルの列（jobs.ScrapeJob のフィールド）
+JOB_COLUMNS = (
+    "id", "user_id", "target_url", "max_pages", "cache_mode", "status", "pages_done",
+    "total_pages", "salon_count", "history_id", "error", "created_at", "finished_at",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    target_url TEXT NOT NULL,
+    max_pages INTEGER NOT NULL,
+    cache_mode TEXT NOT NULL,
+    status TEXT NOT NULL,
+    pages_done INTEGER NOT NULL DEFAULT 0,
+    total_pages INTEGER,
+    salon_count INTEGER NOT NULL DEFAULT 0,
+    history_id TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    worker_id TEXT,
+    lease_expires_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_pages (
+    job_id TEXT NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+    page INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (job_id, page)
+);
+"""
+
+
+def encode_page(result: PageResult) -> str:
+    """チェックポイント用にページのパース結果をJSONに変換（サロンはフィールドの配列）"""
+    return json.dumps({
+        "title": result.title,
+        "has_next": result.has_next,
+        "total_count": result.total_count,
+        "total_pages": result.total_pages,
+        "salons": [
+            [s.name, s.url, s.blog_count, s.review_count, s.coupon_prices, s.min_price, s.max_price, s.average_price]
+            for s in result.salons
+        ],
+    }, ensure_ascii=False)
+
+
+def decode_page(text: str) -> PageResult:
+    """encode_page の逆変換"""
+    data = json.loads(text)
+    salons = []
+    for name, url, blog_count, review_count, coupon_prices, min_price, max_price, average_price in data["salons"]:
+        salons.append(SalonData(
+            name, url, blog_count, review_count, tuple(coupon_prices), min_price, max_price, average_price
+        ))
+    return PageResult(
+        salons=salons,
+        title=data["title"],
+        has_next=data["has_next"],
+        total_count=data["total_count"],
+        total_pages=data["total_pages"]
+    )
+
+
+class JobStore:
+    """
+    SQLiteに保存するジョブキュー
+    
+    ジョブはワーカーが期限付きで占有（claim）し、占有中はページごとに
+    チェックポイントを書く。ワーカーが落ちて期限が切れたジョブは別のワーカーが
+    引き継ぎ、チェックポイント済みのページは取得し直さない。
+    複数プロセスから同じファイルを使うため、操作ごとに接続を開く。
+    
+    Args:
+        path: SQLiteファイルのパス
+        lease_seconds: ジョブを占有する秒数
+        max_attempts: ジョブを実行する回数の上限
+    """
+    
+    def __init__(
+        self,
+        path: str = JOB_STORE_PATH,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+        max_attempts: int = JOB_MAX_ATTEMPTS
+    ):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+    
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys=ON")
+        try:
+            yield conn
+        finally:
+            conn.close()
+    
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """書き込みロックを先に取るトランザクション（占有の競合を防ぐ）"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+    
+    def enqueue(self, job: dict) -> None:
+        """ジョブを登録（job は ScrapeJob.to_dict() の形式）"""
+        columns = ", ".join(JOB_COLUMNS)
+        placeholders = ", ".join(f":{name}" for name in JOB_COLUMNS)
+        with self._connect() as conn:
+            conn.execute(f"INSERT INTO jobs ({columns}) VALUES ({placeholders})", job)
+    
+    def get(self, job_id: str) -> Optional[dict]:
+        """ジョブを取得（ScrapeJob のフィールドの辞書）、見つからない場合はNone"""
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+    
+    def claim(self, worker_id: str) -> Optional[dict]:
+        """
+        実行するジョブを占有
+        
+        未実行のジョブと、占有期限の切れた実行中のジョブを古い順に選ぶ。
+        実行回数が上限に達したジョブは失敗にする。
+        
+        Returns:
+            占有したジョブ（ScrapeJob のフィールドの辞書）、なければNone
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, worker_id = NULL "
+                "WHERE status = 'running' AND lease_expires_at < ? AND attempts >= ?",
+                ("ワーカーの異常終了が続いたため中止しました", now, now, self.max_attempts)
+            )
+            row = conn.execute(
+                "SELECT id FROM jobs "
+                "WHERE status = 'pending' OR (status = 'running' AND lease_expires_at < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker_id = ?, lease_expires_at = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (worker_id, now + self.lease_seconds, row["id"])
+            )
+        return self.get(row["id"])
+    
+    def renew(self, job_id: str, worker_id: str) -> bool:
+        """占有期限を延長（他のワーカーに引き継がれていた場合はFalse）"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, job_id, worker_id)
+            )
+        return cursor.rowcount == 1
+    
+    def checkpoint(
+        self,
+        job_id: str,
+        worker_id: str,
+        pages_done: int,
+        total_pages: Optional[int],
+        page: Optional[int] = None,
+        result: Optional[PageResult] = None
+    ) -> bool:
+        """
+        進捗とページのパース結果を保存し、占有期限を延長
+        
+        Args:
+            job_id: ジョブID
+            worker_id: 占有しているワーカーのID
+            pages_done: 取得済みページ数
+            total_pages: 総ページ数
+            page: 保存するページ番号（進捗のみの更新ならNone）
+            result: ページのパース結果
+        
+        Returns:
+            保存できたか（他のワーカーに引き継がれていた場合はFalse）
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET pages_done = ?, total_pages = ?, lease_expires_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (pages_done, total_pages, time.time() + self.lease_seconds, job_id, worker_id)
+            )
+            if cursor.rowcount != 1:
+                return False
+            if page is not None and result is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO job_pages (job_id, page, result) VALUES (?, ?, ?)",
+                    (job_id, page, encode_page(result))
+                )
+        return True
+    
+    def load_pages(self, job_id: str) -> dict[int, PageResult]:
+        """チェックポイント済みのページ（ページ番号 -> パース結果）"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT page, result FROM job_pages WHERE job_id = ?", (job_id,)).fetchall()
+        return {row["page"]: decode_page(row["result"]) for row in rows}
+    
+    def finish(self, job: dict, worker_id: str) -> bool:
+        """
+        ジョブの結果を保存し、チェックポイントを削除
+        
+        Args:
+            job: 終了したジョブ（ScrapeJob.to_dict() の形式）
+            worker_id: 占有しているワーカーのID
+        
+        Returns:
+            保存できたか（他のワーカーに引き継がれていた場合はFalse）
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = :status, pages_done = :pages_done, total_pages = :total_pages, "
+                "salon_count = :salon_count, history_id = :history_id, error = :error, "
+                "finished_at = :finished_at, worker_id = NULL, lease_expires_at = NULL "
+                "WHERE id = :id AND worker_id = :worker_id",
+                {**job, "worker_id": worker_id}
+            )
+            if cursor.rowcount != 1:
+                return False
+            conn.execute("DELETE FROM job_pages WHERE job_id = ?", (job["id"],))
+        return True
+    
+    def cleanup(self, retention_seconds: float) -> int:
+        """保持期間を過ぎた終了済みジョブを削除し、削除件数を返す"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (time.time() - retention_seconds,)
+            )
+        return cursor.rowcount
+    
+    def counts(self) -> dict[str, int]:
+        """状態ごとのジョブ数"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+# ジョブキュー（シングルトン）
+_job_store: Optional[JobStore] = None
+
+
+def get_job_store() -> Optional[JobStore]:
+    """ジョブキューを取得（無効化されている場合はNone）"""
+    global _job_store
+    
+    if not DURABLE_JOBS_ENABLED:
+        return None
+    if _job_store is None:
+        _job_store = JobStore()
+    
+    return _job_store
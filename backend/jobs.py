@@ -0,0 +1,398 @@
+"""
+HPB Price Analyzer - スクレイピングジョブ管理モジュール
+分析リクエストをバックグラウンドジョブとして実行し、進捗を保持する
+"""
+
+import os
+import time
+import uuid
+import asyncio
+from typing import Optional
+from urllib.parse import urlsplit
+from dataclasses import dataclass, field, asdict
+
+from scraper import scrape_multiple_pages_async, dedupe_salons, salons_to_dicts, PageResult, SalonData
+from database import save_search_history
+from page_cache import normalize_url
+from singleflight import get_flight_group
+from archive import start_recording, ScrapeRecording
+from prewarm import get_prewarm_store
+from history_stream import HistoryStreamWriter, should_stream, stream_scrape
+from job_store import get_job_store
+from metrics import ANALYSES, SALONS_SCRAPED
+
+
+# 終了したジョブを保持する秒数
+JOB_RETENTION_SECONDS = 60 * 60
+
+# 一括分析で同時にスクレイピングするURL数（ページ単位の並列度はホスト単位のレート制限で共有）
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "3"))
+
+
+@dataclass
+class ScrapeJob:
+    """スクレイピングジョブの状態"""
+    id: str
+    user_id: str
+    target_url: str
+    max_pages: int
+    cache_mode: str = "use"
+    status: str = "pending"  # pending / running / completed / failed
+    pages_done: int = 0
+    total_pages: Optional[int] = None
+    salon_count: int = 0
+    history_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class BatchJob:
+    """一括分析ジョブの状態（URLごとの進捗は各ジョブが保持）"""
+    id: str
+    user_id: str
+    job_ids: list[str]
+    status: str = "pending"  # pending / running / completed / failed
+    salon_count: int = 0  # 全URLで重複排除したサロン数
+    rollup_history_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+# ジョブID -> ジョブ（プロセス内で保持）
+_jobs: dict[str, ScrapeJob] = {}
+
+# 一括分析ID -> 一括分析ジョブ
+_batches: dict[str, BatchJob] = {}
+
+# 集約キー -> 同じスクレイピング結果を待っているジョブ
+_scrape_subscribers: dict[tuple, list[ScrapeJob]] = {}
+
+
+def create_job(
+    user_id: str,
+    target_url: str,
+    max_pages: int,
+    cache_mode: str = "use",
+    durable: bool = False
+) -> ScrapeJob:
+    """
+    ジョブを登録
+    
+    Args:
+        user_id: ユーザーID
+        target_url: スクレイピング対象URL
+        max_pages: 取得ページ数の上限
+        cache_mode: ページキャッシュの利用方法（use / refresh / bypass）
+        durable: 永続ジョブキューに登録するか（ワーカーが実行する。run_job では実行しない）
+        
+    Returns:
+        登録されたジョブ
+    """
+    _cleanup_finished_jobs()
+    
+    job = ScrapeJob(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        target_url=target_url,
+        max_pages=max_pages,
+        cache_mode=cache_mode
+    )
+    if durable:
+        get_job_store().enqueue(job.to_dict())
+    else:
+        _jobs[job.id] = job
+    return job
+
+
+def get_job(job_id: str) -> Optional[ScrapeJob]:
+    """ジョブを取得（プロセス内になければ永続ジョブキューから）、見つからない場合はNone"""
+    job = _jobs.get(job_id)
+    store = get_job_store()
+    if job is None and store is not None:
+        row = store.get(job_id)
+        job = ScrapeJob(**row) if row else None
+    return job
+
+
+async def run_job(job_id: str, collect: bool = False) -> list[SalonData]:
+    """
+    ジョブを実行（スクレイピング → 保存）
+    
+    スクレイピングは非同期で、Supabaseへの保存はスレッドで実行するため、
+    実行中もイベントループをブロックしない。
+    同じURL・ページ数のスクレイピングが実行中なら結果を共有し、
+    履歴はジョブごとに保存する。
+    ページ数の多いジョブはストリーミング保存にする（should_stream）。
+    
+    Args:
+        job_id: ジョブID
+        collect: サロンリストを返す必要があるか（一括分析のまとめ用、ストリーミング保存にしない）
+    
+    Returns:
+        保存したサロンリスト（失敗した場合、ストリーミング保存した場合は空）
+    """
+    job = _jobs[job_id]
+    job.status = "running"
+    salons: list[SalonData] = []
+    
+    record_prewarm_lookup(job)
+    if not collect and should_stream(job.max_pages):
+        await _run_streaming_job(job)
+        return salons
+    
+    try:
+        salons, title, recording = await _scrape_shared(job)
+        
+        if not salons:
+            raise ValueError("サロンデータを取得できませんでした。URLを確認してください")
+        
+        saved = await asyncio.to_thread(
+            save_search_history,
+            user_id=job.user_id,
+            target_url=job.target_url,
+            raw_data=salons_to_dicts(salons),
+            title=title
+        )
+        
+        if recording is not None:
+            # 記録はスクレイピングを実行したジョブが締めてあり、ここでは履歴のマニフェストのみ保存する
+            await asyncio.to_thread(recording.attach, saved["id"])
+        
+        job.salon_count = len(salons)
+        job.history_id = saved["id"]
+        job.status = "completed"
+        SALONS_SCRAPED.inc(len(salons))
+    except Exception as e:
+        print(f"Job {job.id} failed: {e}")
+        job.error = str(e)
+        job.status = "failed"
+        salons = []
+    finally:
+        job.finished_at = time.time()
+        ANALYSES.inc(mode="job", status=job.status)
+    
+    return salons
+
+
+async def _run_streaming_job(job: ScrapeJob) -> None:
+    """
+    ジョブをストリーミング保存で実行
+    
+    サロンをメモリに溜めないため、同じスクレイピングの結果は共有しない。
+    """
+    writer = HistoryStreamWriter()
+    
+    def on_page(page: int, result: Optional[PageResult]) -> None:
+        job.pages_done += 1
+        if page == 1 and result is not None:
+            job.total_pages = result.total_pages
+    
+    recording = start_recording(job.target_url, job.max_pages)
+    try:
+        title = await stream_scrape(
+            writer,
+            job.user_id,
+            job.target_url,
+            job.max_pages,
+            on_page=on_page,
+            cache_mode=job.cache_mode,
+            recording=recording
+        )
+        if not writer.salon_count:
+            raise ValueError("サロンデータを取得できませんでした。URLを確認してください")
+        
+        saved = await writer.finish(job.user_id, job.target_url, title)
+        
+        if recording is not None:
+            await asyncio.to_thread(recording.finish, saved["id"])
+        
+        job.salon_count = writer.salon_count
+        job.history_id = saved["id"]
+        job.status = "completed"
+        SALONS_SCRAPED.inc(job.salon_count)
+    except Exception as e:
+        print(f"Job {job.id} failed: {e}")
+        await writer.discard()
+        job.error = str(e)
+        job.status = "failed"
+    except asyncio.CancelledError:
+        await asyncio.shield(writer.discard())
+        raise
+    finally:
+        job.finished_at = time.time()
+        ANALYSES.inc(mode="job", status=job.status)
+
+
+def create_batch(user_id: str, target_urls: list[str], max_pages: int, cache_mode: str = "use") -> BatchJob:
+    """
+    一括分析ジョブを登録（URLごとにジョブを登録する）
+    
+    Args:
+        user_id: ユーザーID
+        target_urls: スクレイピング対象URLのリスト
+        max_pages: URLごとの取得ページ数の上限
+        cache_mode: ページキャッシュの利用方法（use / refresh / bypass）
+        
+    Returns:
+        登録された一括分析ジョブ
+    """
+    jobs = [create_job(user_id, url, max_pages, cache_mode) for url in target_urls]
+    batch = BatchJob(id=str(uuid.uuid4()), user_id=user_id, job_ids=[job.id for job in jobs])
+    _batches[batch.id] = batch
+    return batch
+
+
+def get_batch(batch_id: str) -> Optional[BatchJob]:
+    """一括分析ジョブを取得、見つからない場合はNone"""
+    return _batches.get(batch_id)
+
+
+async def run_batch(batch_id: str) -> None:
+    """
+    一括分析ジョブを実行
+    
+    URLごとのジョブを BATCH_CONCURRENCY 件ずつ並行に実行し（各ジョブのページ取得は
+    ホスト単位のレート制限を共有する）、URLごとに履歴を保存する。
+    最後に複数エリアに掲載されたサロンを重複排除したまとめの履歴を保存する。
+    """
+    batch = _batches[batch_id]
+    batch.status = "running"
+    semaphore = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+    
+    async def run_bounded(job_id: str) -> list[SalonData]:
+        async with semaphore:
+            return await run_job(job_id, collect=True)
+    
+    try:
+        results = await asyncio.gather(*(run_bounded(job_id) for job_id in batch.job_ids))
+        
+        # URLの順に重複排除（先に出現したエリアのデータを残す）
+        seen_names = set()
+        combined = [
+            salon
+            for salons in results
+            for salon in dedupe_salons(salons, seen_names)
+        ]
+        if not combined:
+            raise ValueError("いずれのURLからもサロンデータを取得できませんでした")
+        
+        jobs = [_jobs[job_id] for job_id in batch.job_ids]
+        saved = await asyncio.to_thread(
+            save_search_history,
+            user_id=batch.user_id,
+            target_url=common_url_prefix([job.target_url for job in jobs]),
+            raw_data=salons_to_dicts(combined),
+            title=f"一括分析（{len(jobs)}件のURL）"
+        )
+        
+        batch.salon_count = len(combined)
+        batch.rollup_history_id = saved["id"]
+        batch.status = "completed"
+    except Exception as e:
+        print(f"Batch {batch.id} failed: {e}")
+        batch.error = str(e)
+        batch.status = "failed"
+    finally:
+        batch.finished_at = time.time()
+        ANALYSES.inc(mode="batch", status=batch.status)
+
+
+def common_url_prefix(urls: list[str]) -> str:
+    """URLに共通するディレクトリまでのURL（まとめの履歴の対象URLとして使う）"""
+    parts = [urlsplit(url) for url in urls]
+    origin = f"{parts[0].scheme}://{parts[0].netloc}"
+    if any(f"{p.scheme}://{p.netloc}" != origin for p in parts):
+        return urls[0]
+    
+    segments = [p.path.split("/")[:-1] for p in parts]
+    common = []
+    for column in zip(*segments):
+        if any(segment != column[0] for segment in column):
+            break
+        common.append(column[0])
+    return origin + "/".join(common) + "/"
+
+
+async def _scrape_shared(job: ScrapeJob) -> tuple[list[SalonData], str, Optional[ScrapeRecording]]:
+    """
+    スクレイピングを実行、または実行中の同じスクレイピングの結果を待つ
+    
+    正規化URL・max_pages・cache_mode が同じジョブで1回のスクレイピングを共有し、
+    進捗は待っているすべてのジョブに反映する（refresh / bypass のジョブが
+    use のスクレイピングの結果を受け取らないよう cache_mode もキーに含める）。
+    アーカイブが有効な場合は取得したページの記録も共有し、スクレイピングを実行したジョブが1回だけ締める。
+    ページ取得の公平な割り当て（fair_scheduler）は、スクレイピングを実行したジョブのユーザーに計上する。
+    合流したジョブはページを取得しないため、そのユーザーの取得枠は消費しない。
+    """
+    key = (normalize_url(job.target_url), job.max_pages, job.cache_mode)
+    subscribers = _scrape_subscribers.setdefault(key, [])
+    if subscribers:
+        # 途中から合流したジョブは実行中のジョブの進捗を引き継ぐ
+        job.pages_done = subscribers[0].pages_done
+        job.total_pages = subscribers[0].total_pages
+    subscribers.append(job)
+    
+    def on_page(page: int, result: Optional[PageResult]) -> None:
+        for subscriber in _scrape_subscribers.get(key, ()):
+            subscriber.pages_done += 1
+            if page == 1 and result is not None:
+                subscriber.total_pages = result.total_pages
+    
+    async def scrape() -> tuple[list[SalonData], str, Optional[ScrapeRecording]]:
+        recording = start_recording(job.target_url, job.max_pages)
+        salons, title = await scrape_multiple_pages_async(
+            job.target_url,
+            job.max_pages,
+            on_page=on_page,
+            cache_mode=job.cache_mode,
+            recording=recording,
+            user_id=job.user_id
+        )
+        if recording is not None:
+            recording.close()
+        return salons, title, recording
+    
+    try:
+        return await get_flight_group("scrapes").do(key, scrape)
+    finally:
+        subscribers.remove(job)
+        if not subscribers and _scrape_subscribers.get(key) is subscribers:
+            del _scrape_subscribers[key]
+
+
+def record_prewarm_lookup(job: ScrapeJob) -> None:
+    """
+    プリウォームの効果を記録（ページはページキャッシュから取得されるため、ここでは数えるのみ）
+    
+    cache_mode が use のジョブのみ、分析のページがすべて事前に取得済みかを数える
+    """
+    prewarm = get_prewarm_store()
+    if prewarm is not None and job.cache_mode == "use":
+        prewarm.get(job.target_url, job.max_pages)
+
+
+def _cleanup_finished_jobs() -> None:
+    """保持期間を過ぎた終了済みジョブを削除"""
+    threshold = time.time() - JOB_RETENTION_SECONDS
+    expired = [
+        job_id for job_id, job in _jobs.items()
+        if job.finished_at is not None and job.finished_at < threshold
+    ]
+    for job_id in expired:
+        del _jobs[job_id]
+    
+    expired = [
+        batch_id for batch_id, batch in _batches.items()
+        if batch.finished_at is not None and batch.finished_at < threshold
+    ]
+    for batch_id in expired:
+        del _batches[batch_id]
@@ -3,25 +3,64 @@ HPB Price Analyzer - FastAPI メインエントリポイント
 """
 
 import os
+import time
+import asyncio
+import secrets
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from typing import Optional
+from fastapi import FastAPI, Request, Header, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
 
 from routers.analysis import router as analysis_router
+from http_client import close_http_clients, get_recent_timings, get_timing_summary
+from page_cache import get_page_cache
+from history_cache import get_history_cache
+from rate_limiter import get_limiter_stats
+from singleflight import get_flight_stats
+from parse_pool import get_parse_pool_stats, shutdown_parse_pool
+from prewarm import get_prewarm_store, start_prewarm_scheduler
+from archive import start_archive_gc
+from history_stream import start_chunk_sweeper
+from job_store import get_job_store
+from worker import start_embedded_worker
+from fair_scheduler import get_scheduler_stats
+from metrics import render_metrics, REQUEST_SECONDS
+from compression import CompressionMiddleware
 
 # 環境変数を読み込み
 load_dotenv()
 
+# 管理用エンドポイント（内部状況の参照）のトークン（未設定の場合は管理用エンドポイントを無効化）
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None, alias="X-Admin-Token")) -> None:
+    """管理用エンドポイントの認可（X-Admin-Token が ADMIN_TOKEN と一致する場合のみ許可）"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="管理用トークンが必要です")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """アプリケーションのライフサイクル管理"""
     # 起動時の処理
     print("🚀 HPB Price Analyzer API を起動しています...")
+    background = [
+        task for task in (start_prewarm_scheduler(), start_embedded_worker(), start_archive_gc(), start_chunk_sweeper())
+        if task is not None
+    ]
     yield
     # シャットダウン時の処理
     print("👋 HPB Price Analyzer API をシャットダウンしています...")
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    await close_http_clients()
+    shutdown_parse_pool()
 
 
 # FastAPIアプリケーションを作成
@@ -52,6 +91,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# レスポンス圧縮（brotli / gzip、Accept-Encoding に応じて選択）
+app.add_middleware(CompressionMiddleware)
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """APIリクエストの所要時間をルート（パスのテンプレート）ごとに記録"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status
+        )
+
+
 # ルーターを登録
 app.include_router(analysis_router)
 
@@ -72,6 +134,33 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """処理段階ごとの所要時間・カウンタ（Prometheus テキスト形式）"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health/http", dependencies=[Depends(require_admin)])
+async def http_timings(limit: int = 20):
+    """HPBへの通信時間と内部の状況（管理用、X-Admin-Token が必要）"""
+    cache = get_page_cache()
+    history_cache = get_history_cache()
+    prewarm = get_prewarm_store()
+    job_store = get_job_store()
+    return {
+        "summary": get_timing_summary(),
+        "recent": get_recent_timings(limit),
+        "rate_limit": get_limiter_stats(),
+        "cache": {**cache.stats, "size_bytes": cache.size_bytes()} if cache else None,
+        "history_cache": history_cache.snapshot() if history_cache else None,
+        "coalescing": get_flight_stats(),
+        "parse_pool": get_parse_pool_stats(),
+        "prewarm": prewarm.snapshot() if prewarm else None,
+        "job_queue": await asyncio.to_thread(job_store.counts) if job_store else None,
+        "scheduler": get_scheduler_stats()
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -0,0 +1,193 @@
+"""
+HPB Price Analyzer - メトリクスモジュール
+処理段階ごとの所要時間（スパン）とカウンタを集計し、Prometheus のテキスト形式で出力する
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+# 所要時間ヒストグラムのバケット（秒）: カード1件のパース〜複数ページの分析まで
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Counter:
+    """単調増加するカウンタ（ラベルごと）"""
+    
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+    
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """観測値の分布（ラベルごとの累積バケット・合計・件数）"""
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # ラベル -> (バケットごとの件数, 合計, 件数)
+        self._values: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+    
+    def snapshot(self, **labels: str) -> Optional[dict]:
+        """件数・合計（ラベル指定）、観測がない場合はNone"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            return {"count": entry[2], "sum": entry[1]} if entry else None
+    
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                inf = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, inf)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+# 段階ごとの所要時間
+# stage: fetch（キャッシュ参照・リトライ込みのページ取得）/ parse_page / parse_card /
+#        parse_pool（スレッド・パース用プロセスとの受け渡し込みのパース）/ dedupe /
+#        db_insert / db_append / db_observations / serialize
+STAGE_SECONDS = Histogram(
+    "hpb_stage_duration_seconds",
+    "Time spent in each analysis stage",
+    ("stage",)
+)
+STAGE_ERRORS = Counter(
+    "hpb_stage_errors_total",
+    "Exceptions raised inside each analysis stage",
+    ("stage",)
+)
+
+# HPBへのリクエスト（リトライの各試行ごと、通信エラーは status="error"）
+UPSTREAM_RESPONSES = Counter(
+    "hpb_upstream_responses_total",
+    "Responses received from HPB by status code",
+    ("status",)
+)
+
+# 分析ジョブ・ストリームの結果
+ANALYSES = Counter(
+    "hpb_analyses_total",
+    "Finished analyses by outcome",
+    ("mode", "status")
+)
+SALONS_SCRAPED = Counter(
+    "hpb_salons_scraped_total",
+    "Salons saved by analyses after dedupe"
+)
+
+# APIリクエスト（route はパスのテンプレート）
+REQUEST_SECONDS = Histogram(
+    "hpb_http_request_duration_seconds",
+    "API request latency",
+    ("method", "route", "status")
+)
+
+METRICS = (STAGE_SECONDS, STAGE_ERRORS, UPSTREAM_RESPONSES, ANALYSES, SALONS_SCRAPED, REQUEST_SECONDS)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    処理段階の所要時間を計測するスパン
+    
+    例外が発生した場合もその時点までの時間を記録し、エラー数を加算する
+    （キャンセルはエラーとして数えない）
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+def render_metrics() -> str:
+    """全メトリクスを Prometheus のテキスト形式で出力"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics() -> None:
+    """全メトリクスを初期化（テスト用）"""
+    for metric in METRICS:
+        metric.clear()
@@ -0,0 +1,239 @@
+"""
+HPB Price Analyzer - ページキャッシュモジュール
+HPB検索結果ページのレスポンスをディスクにキャッシュし、ETag / Last-Modified で再検証する
+"""
+
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+from dataclasses import dataclass
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+
+# キャッシュ設定
+CACHE_ENABLED = os.getenv("HPB_CACHE_ENABLED", "1") == "1"
+CACHE_DIR = os.getenv("HPB_CACHE_DIR", ".cache/hpb_pages")
+CACHE_TTL_SECONDS = float(os.getenv("HPB_CACHE_TTL", "3600"))
+CACHE_MAX_BYTES = int(os.getenv("HPB_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+# リクエストごとのキャッシュ利用方法
+CACHE_MODES = ("use", "refresh", "bypass")
+
+
+@dataclass
+class CacheEntry:
+    """キャッシュされたレスポンス"""
+    url: str
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+    fresh_until: Optional[float] = None  # プリウォームしたページは ttl に関係なくこの時刻まで再検証しない
+    
+    def is_fresh(self, ttl: float) -> bool:
+        now = time.time()
+        return now - self.stored_at < ttl or (self.fresh_until is not None and now < self.fresh_until)
+
+
+def normalize_url(url: str) -> str:
+    """
+    キャッシュキー用にURLを正規化
+    
+    スキーム・ホストの小文字化、デフォルトポート・フラグメントの除去、
+    クエリパラメータの並べ替え、ディレクトリ形式パスの末尾スラッシュ付与を行う。
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    
+    path = parts.path or "/"
+    if not path.endswith("/") and "." not in path.rsplit("/", 1)[-1]:
+        path += "/"
+    
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+class PageCache:
+    """
+    サイズ上限付きのLRUディスクキャッシュ
+    
+    本文は gzip 圧縮した .html.gz、メタデータは .json として
+    正規化URLのSHA-256をファイル名に保存する。
+    
+    Args:
+        directory: 保存先ディレクトリ
+        ttl: 再検証なしで利用する秒数
+        max_bytes: キャッシュ全体のサイズ上限（圧縮後）
+    """
+    
+    def __init__(self, directory: str, ttl: float = CACHE_TTL_SECONDS, max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "stores": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        # キー -> 圧縮後サイズ（最近使ったものが末尾）
+        self._index: Optional[OrderedDict[str, int]] = None
+    
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+    
+    def _paths(self, key: str) -> tuple[str, str]:
+        base = os.path.join(self.directory, key)
+        return f"{base}.html.gz", f"{base}.json"
+    
+    def _load_index(self) -> OrderedDict[str, int]:
+        """ディスク上のエントリからLRUインデックスを構築（最終アクセス順）"""
+        if self._index is None:
+            os.makedirs(self.directory, exist_ok=True)
+            entries = []
+            for name in os.listdir(self.directory):
+                if name.endswith(".html.gz"):
+                    stat = os.stat(os.path.join(self.directory, name))
+                    entries.append((stat.st_mtime, name[:-len(".html.gz")], stat.st_size))
+            self._index = OrderedDict((key, size) for _, key, size in sorted(entries))
+        return self._index
+    
+    def get(self, url: str) -> Optional[CacheEntry]:
+        """キャッシュを取得、存在しない場合はNone"""
+        key = self._key(url)
+        body_path, meta_path = self._paths(key)
+        
+        with self._lock:
+            index = self._load_index()
+            if key not in index:
+                return None
+            try:
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+                with gzip.open(body_path, "rb") as f:
+                    body = f.read()
+            except (OSError, ValueError):
+                self._remove(key)
+                return None
+            
+            index.move_to_end(key)
+            os.utime(body_path)
+        
+        return CacheEntry(
+            url=meta["url"],
+            body=body,
+            etag=meta.get("etag"),
+            last_modified=meta.get("last_modified"),
+            stored_at=meta["stored_at"],
+            fresh_until=meta.get("fresh_until")
+        )
+    
+    def put(self, url: str, body: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """レスポンスを保存し、上限を超えた分を古い順に削除"""
+        key = self._key(url)
+        body_path, meta_path = self._paths(key)
+        meta = {
+            "url": normalize_url(url),
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": time.time(),
+        }
+        compressed = gzip.compress(body, compresslevel=6)
+        
+        with self._lock:
+            index = self._load_index()
+            _atomic_write(body_path, compressed)
+            _atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+            index[key] = len(compressed)
+            index.move_to_end(key)
+            self.stats["stores"] += 1
+            self._evict()
+    
+    def touch(self, url: str) -> None:
+        """304 Not Modified を受けたエントリの保存時刻を更新"""
+        key = self._key(url)
+        _, meta_path = self._paths(key)
+        
+        with self._lock:
+            try:
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+                meta["stored_at"] = time.time()
+                _atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+            except (OSError, ValueError):
+                pass
+    
+    def pin(self, url: str, until: float) -> bool:
+        """
+        エントリを until（time.time() の時刻）まで再検証せずに使えるようにする
+        
+        Returns:
+            エントリがあり更新できたか
+        """
+        key = self._key(url)
+        _, meta_path = self._paths(key)
+        
+        with self._lock:
+            try:
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+                meta["fresh_until"] = until
+                _atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+                return True
+            except (OSError, ValueError):
+                return False
+    
+    def clear(self) -> None:
+        """全エントリを削除"""
+        with self._lock:
+            for key in list(self._load_index()):
+                self._remove(key)
+    
+    def size_bytes(self) -> int:
+        with self._lock:
+            return sum(self._load_index().values())
+    
+    def _evict(self) -> None:
+        index = self._load_index()
+        total = sum(index.values())
+        while total > self.max_bytes and len(index) > 1:
+            key, size = next(iter(index.items()))
+            self._remove(key)
+            total -= size
+            self.stats["evictions"] += 1
+    
+    def _remove(self, key: str) -> None:
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._load_index().pop(key, None)
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    """一時ファイル経由で書き込み、途中状態のファイルを残さない"""
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+# ページキャッシュのシングルトン
+_page_cache: Optional[PageCache] = None
+
+
+def get_page_cache() -> Optional[PageCache]:
+    """ページキャッシュを取得（無効化されている場合はNone）"""
+    global _page_cache
+    
+    if not CACHE_ENABLED:
+        return None
+    if _page_cache is None:
+        _page_cache = PageCache(CACHE_DIR)
+    
+    return _page_cache
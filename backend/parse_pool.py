@@ -0,0 +1,115 @@
+"""
+HPB Price Analyzer - パース用プロセスプール
+HTMLのパース（CPU処理でGILを保持する）をワーカープロセスに分散し、
+ページの取得とパースを切り離して複数コアでパースする
+"""
+
+import os
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, TypeVar
+
+
+# ワーカープロセス数（0ならプロセスプールを使わずプロセス内のスレッドでパース）
+PARSE_WORKERS = int(os.getenv("HPB_PARSE_WORKERS", "0"))
+# プロセスプールが使えない・異常終了した場合にプロセス内でのパースに切り替えるか
+PARSE_FALLBACK = os.getenv("HPB_PARSE_FALLBACK", "1") == "1"
+# ワーカーの起動方式（スレッド・イベントループを持つプロセスの fork を避けるため既定は spawn）
+PARSE_START_METHOD = os.getenv("HPB_PARSE_START_METHOD", "spawn")
+
+T = TypeVar("T")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_stats = {"pool_tasks": 0, "inprocess_tasks": 0, "fallbacks": 0, "pool_failures": 0}
+
+
+def get_parse_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    共有のプロセスプールを取得
+    
+    Returns:
+        プロセスプール（HPB_PARSE_WORKERS が0の場合はNone）
+    """
+    global _pool
+    
+    if PARSE_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS,
+                mp_context=multiprocessing.get_context(PARSE_START_METHOD)
+            )
+        return _pool
+
+
+def shutdown_parse_pool() -> None:
+    """プロセスプールを終了（次回の get_parse_pool で作り直す）"""
+    global _pool
+    
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """異常終了したプールを破棄（実行中のタスクは待たない）"""
+    global _pool
+    
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_parse_task(func: Callable[..., T], *args) -> T:
+    """
+    パース処理をプロセスプールで実行
+    
+    func と引数・戻り値はプロセス間で受け渡すため、モジュールの最上位で定義した
+    関数とpickle可能な値である必要がある。プールを使わない設定の場合と、
+    プールが使えない場合（HPB_PARSE_FALLBACK=1 のとき）はスレッドで実行する。
+    
+    Args:
+        func: 実行する関数
+        *args: 関数の引数
+    
+    Returns:
+        関数の戻り値
+    """
+    try:
+        pool = get_parse_pool()
+    except (OSError, NotImplementedError, ValueError) as e:
+        # /dev/shm がない環境などでプールを作れない
+        if not PARSE_FALLBACK:
+            raise
+        print(f"Parse pool unavailable, parsing in-process: {e}")
+        _stats["fallbacks"] += 1
+        pool = None
+    
+    if pool is not None:
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+            _stats["pool_tasks"] += 1
+            return result
+        except BrokenProcessPool as e:
+            # ワーカーが異常終了した（OOM など）。次のタスクからはプールを作り直す
+            _stats["pool_failures"] += 1
+            _discard_pool(pool)
+            if not PARSE_FALLBACK:
+                raise
+            print(f"Parse pool failed, parsing in-process: {e}")
+            _stats["fallbacks"] += 1
+    
+    _stats["inprocess_tasks"] += 1
+    return await asyncio.to_thread(func, *args)
+
+
+def get_parse_pool_stats() -> dict:
+    """プロセスプールの設定と実行件数"""
+    return {"workers": PARSE_WORKERS, "active": _pool is not None, **_stats}
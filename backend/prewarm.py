@@ -0,0 +1,297 @@
+"""
+HPB Price Analyzer - 事前スクレイピング（プリウォーム）モジュール
+よく分析される対象URLを閑散時間帯に取得してページキャッシュ（ディスク）に保存しておき、
+分析ジョブがHPBにアクセスせずキャッシュから取得できるようにする。
+取得したページはページキャッシュの有効秒数（HPB_CACHE_TTL）に関係なく、
+PREWARM_RESULT_TTL（既定は次回の実行まで）の間は再検証せずに使う。
+取得結果はメモリに保持せず、どのURLを取得したかの記録のみ保持する。
+"""
+
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from page_cache import normalize_url, get_page_cache
+from scraper import scrape_multiple_pages_async, build_page_url, PageResult
+from database import get_target_url_counts
+
+
+# プリウォーム設定
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "0") == "1"
+# 対象にするURL数と、利用回数を数える期間（日）
+PREWARM_TOP_URLS = int(os.getenv("PREWARM_TOP_URLS", "20"))
+PREWARM_LOOKBACK_DAYS = float(os.getenv("PREWARM_LOOKBACK_DAYS", "7"))
+# 実行する時間帯（"開始時-終了時"、PREWARM_TIMEZONE の時刻）
+PREWARM_WINDOW = os.getenv("PREWARM_WINDOW", "3-6")
+PREWARM_TIMEZONE = os.getenv("PREWARM_TIMEZONE", "Asia/Tokyo")
+# 開始時刻をずらす最大秒数（複数インスタンスが同時にHPBへアクセスしないように）
+PREWARM_JITTER = float(os.getenv("PREWARM_JITTER", "600"))
+# 1回の実行で取得するページ数の合計と、URLごとの取得ページ数の上限
+PREWARM_PAGE_BUDGET = int(os.getenv("PREWARM_PAGE_BUDGET", "500"))
+PREWARM_MAX_PAGES = int(os.getenv("PREWARM_MAX_PAGES", "100"))
+# 取得したページを再検証せずに使う秒数（既定は次回の実行までの1日）
+PREWARM_RESULT_TTL = float(os.getenv("PREWARM_RESULT_TTL", str(24 * 60 * 60)))
+
+# 公平スケジューラーでのプリウォームのユーザーID（FAIR_USER_WEIGHTS で重みを下げられる）
+PREWARM_USER_ID = "prewarm"
+
+
+@dataclass
+class PrewarmedResult:
+    """事前に取得したスクレイピングの記録（ページ本体はページキャッシュにある）"""
+    salon_count: int
+    max_pages: int  # 取得時のページ数の上限
+    pages: int  # 取得したページ数
+    complete: bool  # 最終ページまでエラーなく取得できたか
+    created_at: float  # time.monotonic()
+
+
+class PrewarmStore:
+    """
+    事前に取得した結果の記録（正規化URLごと）
+    
+    ページ本体はページキャッシュに保存されるため、ここではURLごとの取得状況のみを保持する。
+    
+    Args:
+        ttl: 取得済みとして扱う秒数（ページキャッシュで再検証せずに使う秒数と同じ）
+    """
+    
+    def __init__(self, ttl: float = PREWARM_RESULT_TTL):
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "runs": 0, "pages_fetched": 0}
+        self.last_run: Optional[dict] = None
+        self._lock = threading.Lock()
+        self._entries: dict[str, PrewarmedResult] = {}
+    
+    def get(self, url: str, max_pages: int) -> Optional[PrewarmedResult]:
+        """
+        分析のページがすべて取得済みか
+        
+        取得時と同じページ数の上限か、最終ページまで取得済みで上限がそれ以上の場合に
+        分析に必要なページがページキャッシュにあるとみなして記録を返す。
+        """
+        key = normalize_url(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created_at >= self.ttl:
+                del self._entries[key]
+                entry = None
+            
+            usable = entry is not None and (
+                entry.max_pages == max_pages or (entry.complete and max_pages >= entry.pages)
+            )
+            self.stats["hits" if usable else "misses"] += 1
+            return entry if usable else None
+    
+    def put(self, url: str, result: PrewarmedResult) -> None:
+        with self._lock:
+            self._entries[normalize_url(url)] = result
+            self.stats["stores"] += 1
+    
+    def snapshot(self) -> dict:
+        """統計と記録している結果の件数"""
+        with self._lock:
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "salons": sum(entry.salon_count for entry in self._entries.values()),
+                "last_run": self.last_run,
+            }
+
+
+def parse_window(value: str) -> tuple[int, int]:
+    """"3-6" 形式の時間帯を (開始時, 終了時) に変換"""
+    start, end = (int(hour) % 24 for hour in value.split("-", 1))
+    if start == end:
+        raise ValueError(f"PREWARM_WINDOW の開始と終了が同じです: {value}")
+    return start, end
+
+
+def in_window(now: datetime, window: tuple[int, int]) -> bool:
+    """現在時刻が時間帯内か（日付をまたぐ時間帯にも対応）"""
+    start, end = window
+    if start < end:
+        return start <= now.hour < end
+    return now.hour >= start or now.hour < end
+
+
+def seconds_until_hour(now: datetime, hour: int) -> float:
+    """次の hour 時0分までの秒数"""
+    target = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+def select_target_urls(url_counts: list[tuple[str, int]], limit: int) -> list[str]:
+    """
+    正規化URLごとに利用回数を合算し、多い順に対象URLを選ぶ
+    
+    Args:
+        url_counts: (対象URL, 利用回数) のリスト
+        limit: 選ぶURL数
+    
+    Returns:
+        対象URL（正規化URLごとに最初に出現したURL）
+    """
+    counts: Counter[str] = Counter()
+    originals: dict[str, str] = {}
+    for url, count in url_counts:
+        key = normalize_url(url)
+        originals.setdefault(key, url)
+        counts[key] += count
+    return [originals[key] for key, _ in counts.most_common(limit)]
+
+
+async def prewarm_url(url: str, max_pages: int, ttl: float = PREWARM_RESULT_TTL) -> PrewarmedResult:
+    """
+    1つのURLを取得してページキャッシュを更新
+    
+    取得したページは ttl 秒の間、ページキャッシュの有効秒数を過ぎても再検証せずに使う。
+    
+    Args:
+        url: 対象URL
+        max_pages: 取得ページ数の上限
+        ttl: 再検証せずに使う秒数
+    
+    Returns:
+        取得結果
+    """
+    fetched = []
+    pages = []
+    
+    def on_page(page: int, result: Optional[PageResult]) -> None:
+        fetched.append(result)
+        if result is not None:
+            pages.append(page)
+    
+    salons, _ = await scrape_multiple_pages_async(
+        url, max_pages, on_page=on_page, cache_mode="refresh", user_id=PREWARM_USER_ID
+    )
+    cache = get_page_cache()
+    if cache is not None:
+        until = time.time() + ttl
+        for page in pages:
+            await asyncio.to_thread(cache.pin, build_page_url(url, page), until)
+    complete = all(result is not None for result in fetched) and any(
+        not result.has_next or not result.salons for result in fetched
+    )
+    return PrewarmedResult(
+        salon_count=len(salons),
+        max_pages=max_pages,
+        pages=len(fetched),
+        complete=complete,
+        created_at=time.monotonic()
+    )
+
+
+async def run_prewarm_cycle(
+    store: PrewarmStore,
+    top_urls: int = PREWARM_TOP_URLS,
+    page_budget: int = PREWARM_PAGE_BUDGET,
+    max_pages: int = PREWARM_MAX_PAGES
+) -> dict:
+    """
+    利用回数の多い対象URLを、ページ数の予算内で順に取得
+    
+    Args:
+        store: 取得結果の保存先
+        top_urls: 対象にするURL数
+        page_budget: 取得するページ数の合計の上限
+        max_pages: URLごとの取得ページ数の上限
+    
+    Returns:
+        実行結果（取得したURL・ページ数）
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=PREWARM_LOOKBACK_DAYS)
+    url_counts = await asyncio.to_thread(get_target_url_counts, since.isoformat())
+    targets = select_target_urls(url_counts, top_urls)
+    
+    started = time.time()
+    remaining = page_budget
+    warmed = []
+    for url in targets:
+        if remaining <= 0:
+            break
+        try:
+            result = await prewarm_url(url, min(max_pages, remaining))
+        except Exception as e:
+            print(f"Prewarm failed for {url}: {e}")
+            continue
+        
+        remaining -= result.pages
+        store.stats["pages_fetched"] += result.pages
+        if result.salon_count:
+            store.put(url, result)
+            warmed.append(url)
+    
+    summary = {
+        "started_at": started,
+        "duration_seconds": round(time.time() - started, 3),
+        "candidates": len(targets),
+        "warmed_urls": warmed,
+        "pages_fetched": page_budget - remaining,
+    }
+    store.stats["runs"] += 1
+    store.last_run = summary
+    print(f"Prewarmed {len(warmed)}/{len(targets)} URLs ({summary['pages_fetched']} pages)")
+    return summary
+
+
+async def run_scheduler(store: PrewarmStore) -> None:
+    """
+    毎日の実行時間帯に1回プリウォームを実行（キャンセルされるまで続ける）
+    """
+    window = parse_window(PREWARM_WINDOW)
+    tz = ZoneInfo(PREWARM_TIMEZONE)
+    
+    while True:
+        now = datetime.now(tz)
+        delay = 0.0 if in_window(now, window) else seconds_until_hour(now, window[0])
+        await asyncio.sleep(delay + random.uniform(0, PREWARM_JITTER))
+        
+        try:
+            await run_prewarm_cycle(store)
+        except Exception as e:
+            print(f"Prewarm cycle failed: {e}")
+        
+        # 同じ時間帯に再実行しないよう、時間帯の終わりまで待つ
+        now = datetime.now(tz)
+        if in_window(now, window):
+            await asyncio.sleep(seconds_until_hour(now, window[1]))
+
+
+# プリウォーム結果の記録（シングルトン）
+_prewarm_store: Optional[PrewarmStore] = None
+
+
+def get_prewarm_store() -> Optional[PrewarmStore]:
+    """プリウォーム結果の記録を取得（無効化されている、または保存先のページキャッシュがない場合はNone）"""
+    global _prewarm_store
+    
+    if not PREWARM_ENABLED or get_page_cache() is None:
+        return None
+    if _prewarm_store is None:
+        _prewarm_store = PrewarmStore()
+    
+    return _prewarm_store
+
+
+def start_prewarm_scheduler() -> Optional[asyncio.Task]:
+    """
+    スケジューラーをバックグラウンドタスクとして開始
+    
+    Returns:
+        スケジューラーのタスク（無効化されている場合はNone）
+    """
+    store = get_prewarm_store()
+    if store is None:
+        return None
+    return asyncio.create_task(run_scheduler(store))
@@ -0,0 +1,215 @@
+"""
+HPB Price Analyzer - レート制限モジュール
+ホストごとに全分析で共有するトークンバケットと、遅延・エラー率に応じて
+同時接続数を増減する AIMD 制御、Retry-After による一時停止を行う
+制限はプロセス内で共有する（複数プロセスで実行する場合は設定値をプロセス数で割る）
+"""
+
+import os
+import time
+import random
+import asyncio
+from typing import Optional
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+
+# レート制限設定
+RATE_LIMIT_PER_SECOND = float(os.getenv("HPB_RATE_LIMIT", "5"))
+RATE_LIMIT_BURST = float(os.getenv("HPB_RATE_BURST", "5"))
+MIN_CONCURRENCY = int(os.getenv("HPB_MIN_CONCURRENCY", "1"))
+MAX_CONCURRENCY = int(os.getenv("HPB_MAX_CONCURRENCY", "10"))
+INITIAL_CONCURRENCY = int(os.getenv("HPB_INITIAL_CONCURRENCY", "4"))
+LATENCY_TARGET_SECONDS = float(os.getenv("HPB_LATENCY_TARGET", "2.0"))
+MAX_RETRY_AFTER_SECONDS = float(os.getenv("HPB_MAX_RETRY_AFTER", "60"))
+
+# リトライ設定（指数バックオフ + フルジッター）
+MAX_RETRIES = int(os.getenv("HPB_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY = float(os.getenv("HPB_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("HPB_RETRY_MAX_DELAY", "30"))
+
+# 同時接続数を減らすきっかけとなるステータス
+THROTTLE_STATUSES = frozenset((429, 503))
+# リトライするステータス
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Retry-After ヘッダーを秒数に変換
+    
+    秒数指定とHTTP日付の両方に対応し、上限は MAX_RETRY_AFTER_SECONDS
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER_SECONDS)
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    リトライまでの待ち時間
+    
+    Retry-After があればそれに従い、なければ指数バックオフにフルジッターをかける
+    """
+    if retry_after is not None:
+        return retry_after
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+class HostLimiter:
+    """
+    1ホスト分のレート制限
+    
+    - トークンバケットで秒間リクエスト数を制限
+    - 応答遅延が目標以下で成功すれば同時接続数を加算的に増やし、
+      429/503・通信エラー・遅延超過で乗算的に減らす（AIMD）
+    - Retry-After を受けたら、その時刻までホスト全体のリクエストを止める
+    """
+    
+    def __init__(
+        self,
+        rate: float = RATE_LIMIT_PER_SECOND,
+        burst: float = RATE_LIMIT_BURST,
+        initial_concurrency: int = INITIAL_CONCURRENCY,
+        min_concurrency: int = MIN_CONCURRENCY,
+        max_concurrency: int = MAX_CONCURRENCY,
+        latency_target: float = LATENCY_TARGET_SECONDS
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.limit = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.in_flight = 0
+        self.tokens = burst
+        self.blocked_until = 0.0
+        self.stats = {"requests": 0, "throttled": 0, "errors": 0, "slow": 0}
+        self._last_refill = time.monotonic()
+        self._cond = asyncio.Condition()
+    
+    @property
+    def concurrency_limit(self) -> int:
+        return max(self.min_concurrency, int(self.limit))
+    
+    async def acquire(self) -> None:
+        """
+        同時接続枠とトークンを確保（必要なら待機）
+        
+        トークン待ちの間に取り消された場合は、確保した同時接続枠を返却してから例外を送出する
+        """
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.concurrency_limit)
+            self.in_flight += 1
+        
+        try:
+            while True:
+                wait = self._reserve(time.monotonic())
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+        except BaseException:
+            await asyncio.shield(self.cancel())
+            raise
+    
+    async def release(
+        self,
+        latency: float,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None
+    ) -> None:
+        """
+        同時接続枠を返却し、結果に応じて同時接続数を調整
+        
+        Args:
+            latency: リクエストの所要時間（秒）
+            status_code: レスポンスのステータス（通信エラーの場合はNone）
+            retry_after: Retry-After の秒数
+        """
+        self.record(latency, status_code, retry_after)
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+    
+    async def cancel(self) -> None:
+        """結果を記録せずに同時接続枠を返却（取り消されたリクエスト用）"""
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+    
+    def record(self, latency: float, status_code: Optional[int], retry_after: Optional[float] = None) -> None:
+        """リクエスト結果から同時接続数を調整（AIMD）"""
+        self.stats["requests"] += 1
+        
+        if retry_after is not None:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        
+        if status_code is None or status_code in THROTTLE_STATUSES or status_code >= 500:
+            self.stats["throttled" if status_code in THROTTLE_STATUSES else "errors"] += 1
+            self.limit = max(float(self.min_concurrency), self.limit / 2)
+        elif latency > self.latency_target:
+            self.stats["slow"] += 1
+            self.limit = max(float(self.min_concurrency), self.limit * 0.75)
+        else:
+            # 同時接続数ぶん成功するとおよそ1増える
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+    
+    def _reserve(self, now: float) -> float:
+        """トークンを1つ消費、足りなければ待つべき秒数を返す"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        
+        self.tokens = min(self.burst, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+    
+    def snapshot(self) -> dict:
+        return {
+            "concurrency_limit": self.concurrency_limit,
+            "in_flight": self.in_flight,
+            "blocked_for": round(max(0.0, self.blocked_until - time.monotonic()), 2),
+            **self.stats,
+        }
+
+
+# ホスト名 -> レート制限（イベントループごとに保持）
+_limiters: dict[str, HostLimiter] = {}
+_limiters_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_host_limiter(url: str) -> HostLimiter:
+    """URLのホストに対応するレート制限を取得（全分析で共有）"""
+    global _limiters_loop
+    
+    loop = asyncio.get_running_loop()
+    if _limiters_loop is not loop:
+        _limiters.clear()
+        _limiters_loop = loop
+    
+    host = (urlsplit(url).hostname or "").lower()
+    if host not in _limiters:
+        _limiters[host] = HostLimiter(
+            rate=RATE_LIMIT_PER_SECOND,
+            burst=RATE_LIMIT_BURST,
+            initial_concurrency=INITIAL_CONCURRENCY,
+            min_concurrency=MIN_CONCURRENCY,
+            max_concurrency=MAX_CONCURRENCY,
+            latency_target=LATENCY_TARGET_SECONDS
+        )
+    return _limiters[host]
+
+
+def get_limiter_stats() -> dict:
+    """ホストごとのレート制限の状況"""
+    return {host: limiter.snapshot() for host, limiter in _limiters.items()}
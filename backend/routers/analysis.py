@@ -2,27 +2,100 @@
 HPB Price Analyzer - 分析APIエンドポイント
 """
 
-from typing import Optional
-from fastapi import APIRouter, HTTPException, Header
-from pydantic import BaseModel, HttpUrl
+import asyncio
+from typing import AsyncIterator, Literal, Optional
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Header, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, HttpUrl
 
-from scraper import scrape_hpb_url, scrape_multiple_pages
-from database import save_search_history, get_all_search_history, get_search_history_by_id, delete_search_history
+from scraper import iter_pages_async, dedupe_salons, salons_to_dicts, json_default
+from database import (
+    save_search_history,
+    get_all_search_history,
+    get_search_history_by_id,
+    get_search_history_json,
+    delete_search_history,
+    replace_history_salons,
+    get_salon_price_history,
+)
+from jobs import create_job, get_job, run_job, create_batch, get_batch, run_batch
+from job_store import get_job_store
+from fair_scheduler import is_scheduler_saturated
+from archive import get_page_archive, replay_manifest, start_recording
+from history_stream import HistoryStreamWriter, should_stream
+from fast_json import dumps, FastJSONResponse
+from metrics import span, ANALYSES, SALONS_SCRAPED
+from analytics import (
+    compute_history_stats,
+    get_cached_stats,
+    cache_stats,
+    invalidate_history_stats,
+    DEFAULT_BIN_WIDTH,
+    DEFAULT_MAX_POINTS,
+    MIN_BIN_WIDTH,
+    MAX_HISTOGRAM_BINS,
+)
 
 router = APIRouter(prefix="/api", tags=["analysis"])
 
+# 一括分析で受け付けるURL数の上限
+MAX_BATCH_URLS = 20
+
+# 取得待ちが上限に達しているときに返す Retry-After（秒）
+SATURATED_RETRY_AFTER = 10
+
 
 class AnalyzeRequest(BaseModel):
     """分析リクエスト"""
     url: HttpUrl
     max_pages: Optional[int] = 100  # デフォルトで100ページまで取得（実質制限なし）
+    cache_mode: Literal["use", "refresh", "bypass"] = "use"  # ページキャッシュの利用方法
 
 
 class AnalyzeResponse(BaseModel):
-    """分析レスポンス"""
-    history_id: str
+    """分析レスポンス（ジョブ受付）"""
+    job_id: str
+    status: str
+
+
+class JobStatusResponse(BaseModel):
+    """ジョブ状態レスポンス"""
+    job_id: str
+    status: str
+    pages_done: int
+    total_pages: Optional[int] = None
+    salon_count: int
+    history_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchAnalyzeRequest(BaseModel):
+    """一括分析リクエスト"""
+    urls: list[HttpUrl] = Field(min_length=1, max_length=MAX_BATCH_URLS)
+    max_pages: Optional[int] = 100  # URLごとの取得ページ数の上限
+    cache_mode: Literal["use", "refresh", "bypass"] = "use"
+
+
+class BatchAnalyzeResponse(BaseModel):
+    """一括分析レスポンス（ジョブ受付）"""
+    batch_id: str
+    status: str
+    job_ids: list[str]
+
+
+class BatchItemStatus(JobStatusResponse):
+    """一括分析のURLごとの進捗"""
+    url: str
+
+
+class BatchStatusResponse(BaseModel):
+    """一括分析の状態レスポンス"""
+    batch_id: str
+    status: str
     salon_count: int
-    salons: list[dict]
+    rollup_history_id: Optional[str] = None
+    error: Optional[str] = None
+    items: list[BatchItemStatus]
 
 
 class HistoryItem(BaseModel):
@@ -32,6 +105,10 @@ class HistoryItem(BaseModel):
     target_url: str
     title: Optional[str] = ""
     salon_count: int
+    min_price: Optional[int] = None
+    median_price: Optional[float] = None
+    max_price: Optional[int] = None
+    total_reviews: Optional[int] = None
 
 
 def get_user_id_from_header(authorization: Optional[str]) -> str:
@@ -48,78 +125,308 @@ def get_user_id_from_header(authorization: Optional[str]) -> str:
     return authorization.replace("Bearer ", "")
 
 
-@router.post("/analyze", response_model=AnalyzeResponse)
+def validate_analyze_request(request: AnalyzeRequest, x_user_id: Optional[str]) -> tuple[str, int]:
+    """
+    分析リクエストを検証
+    
+    Returns:
+        (対象URL, 取得ページ数の上限)
+    """
+    if not x_user_id:
+        raise HTTPException(status_code=401, detail="X-User-Id ヘッダーが必要です")
+    
+    url_str = str(request.url)
+    
+    # HPBのURLかチェック
+    if "hotpepper.jp" not in url_str:
+        raise HTTPException(
+            status_code=400,
+            detail="ホットペッパービューティーのURLを入力してください"
+        )
+    
+    # 取得待ちのページが上限に達している間は新しい分析を受け付けない
+    if is_scheduler_saturated():
+        raise HTTPException(
+            status_code=503,
+            detail="分析が混み合っています。しばらくしてから再度お試しください",
+            headers={"Retry-After": str(SATURATED_RETRY_AFTER)}
+        )
+    
+    return url_str, request.max_pages or 100
+
+
+@router.post("/analyze", response_model=AnalyzeResponse, status_code=202)
 async def analyze_url(
     request: AnalyzeRequest,
+    background_tasks: BackgroundTasks,
     x_user_id: Optional[str] = Header(None, alias="X-User-Id")
 ):
     """
-    HPB URLを分析してサロンデータを取得・保存
+    HPB URLの分析ジョブを登録
+    
+    スクレイピングと保存はバックグラウンドで実行し、進捗は
+    GET /api/jobs/{job_id} で取得する。永続ジョブキューが有効な場合は
+    キューに登録し、ワーカーが実行する。
     
     Args:
         request: 分析リクエスト（URL, max_pages）
+        background_tasks: バックグラウンドタスク
         x_user_id: ユーザーID（ヘッダーから）
     
     Returns:
-        保存された履歴IDとサロンデータ
+        ジョブIDと状態
+    """
+    url_str, max_pages = validate_analyze_request(request, x_user_id)
+    
+    # スクレイピングジョブを登録（複数ページ対応）
+    durable = get_job_store() is not None
+    job = create_job(x_user_id, url_str, max_pages, request.cache_mode, durable=durable)
+    if not durable:
+        background_tasks.add_task(run_job, job.id)
+    
+    return AnalyzeResponse(job_id=job.id, status=job.status)
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(
+    job_id: str,
+    x_user_id: Optional[str] = Header(None, alias="X-User-Id")
+):
+    """
+    分析ジョブの状態を取得
+    
+    Args:
+        job_id: ジョブID
+        x_user_id: ユーザーID
+        
+    Returns:
+        状態・取得済みページ数・保存された履歴ID
     """
     if not x_user_id:
         raise HTTPException(status_code=401, detail="X-User-Id ヘッダーが必要です")
     
-    try:
-        url_str = str(request.url)
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    
+    return JobStatusResponse(
+        job_id=job.id,
+        status=job.status,
+        pages_done=job.pages_done,
+        total_pages=job.total_pages,
+        salon_count=job.salon_count,
+        history_id=job.history_id,
+        error=job.error
+    )
+
+
+@router.post("/analyze/batch", response_model=BatchAnalyzeResponse, status_code=202)
+async def analyze_batch(
+    request: BatchAnalyzeRequest,
+    background_tasks: BackgroundTasks,
+    x_user_id: Optional[str] = Header(None, alias="X-User-Id")
+):
+    """
+    複数のHPB URLをまとめて分析するジョブを登録
+    
+    URLごとに履歴を保存し、複数エリアに掲載されたサロンを重複排除した
+    まとめの履歴も保存する。URLごとの進捗は GET /api/batches/{batch_id} で取得する。
+    
+    Args:
+        request: 一括分析リクエスト（URLのリスト, max_pages）
+        background_tasks: バックグラウンドタスク
+        x_user_id: ユーザーID（ヘッダーから）
+    
+    Returns:
+        一括分析ID・状態・URLごとのジョブID
+    """
+    url_strs = []
+    for url in request.urls:
+        url_str, max_pages = validate_analyze_request(
+            AnalyzeRequest(url=url, max_pages=request.max_pages, cache_mode=request.cache_mode),
+            x_user_id
+        )
+        # 同じURLの重複指定は1件にまとめる
+        if url_str not in url_strs:
+            url_strs.append(url_str)
+    
+    batch = create_batch(x_user_id, url_strs, max_pages, request.cache_mode)
+    background_tasks.add_task(run_batch, batch.id)
+    
+    return BatchAnalyzeResponse(batch_id=batch.id, status=batch.status, job_ids=batch.job_ids)
+
+
+@router.get("/batches/{batch_id}", response_model=BatchStatusResponse)
+async def get_batch_status(
+    batch_id: str,
+    x_user_id: Optional[str] = Header(None, alias="X-User-Id")
+):
+    """
+    一括分析の状態を取得
+    
+    Args:
+        batch_id: 一括分析ID
+        x_user_id: ユーザーID
         
-        # HPBのURLかチェック
-        if "hotpepper.jp" not in url_str:
-            raise HTTPException(
-                status_code=400,
-                detail="ホットペッパービューティーのURLを入力してください"
-            )
+    Returns:
+        全体の状態・まとめの履歴ID・URLごとの進捗
+    """
+    if not x_user_id:
+        raise HTTPException(status_code=401, detail="X-User-Id ヘッダーが必要です")
+    
+    batch = get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="一括分析が見つかりません")
+    
+    items = []
+    for job_id in batch.job_ids:
+        job = get_job(job_id)
+        if not job:
+            continue
+        items.append(BatchItemStatus(
+            job_id=job.id,
+            url=job.target_url,
+            status=job.status,
+            pages_done=job.pages_done,
+            total_pages=job.total_pages,
+            salon_count=job.salon_count,
+            history_id=job.history_id,
+            error=job.error
+        ))
+    
+    return BatchStatusResponse(
+        batch_id=batch.id,
+        status=batch.status,
+        salon_count=batch.salon_count,
+        rollup_history_id=batch.rollup_history_id,
+        error=batch.error,
+        items=items
+    )
+
+
+@router.post("/analyze/stream")
+async def analyze_url_stream(
+    request: AnalyzeRequest,
+    x_user_id: Optional[str] = Header(None, alias="X-User-Id")
+):
+    """
+    HPB URLを分析し、結果をページ単位でストリーミング（NDJSON）
+    
+    1行1イベントで以下を送信する:
+        {"type": "progress", "page": 2, "total_pages": 12}
+        {"type": "salons", "page": 2, "salons": [...]}
+        {"type": "done", "history_id": "...", "salon_count": 240, "title": "..."}
+        {"type": "error", "detail": "..."}
+    
+    Args:
+        request: 分析リクエスト（URL, max_pages）
+        x_user_id: ユーザーID（ヘッダーから）
+    """
+    url_str, max_pages = validate_analyze_request(request, x_user_id)
+    
+    return StreamingResponse(
+        stream_analysis(x_user_id, url_str, max_pages, request.cache_mode),
+        media_type="application/x-ndjson"
+    )
+
+
+async def stream_analysis(user_id: str, url_str: str, max_pages: int, cache_mode: str = "use") -> AsyncIterator[bytes]:
+    """
+    ページ順にサロンを送信し、最後に保存結果を送信
+    
+    ページ数の多い分析（should_stream）は、送信したページを履歴に順次追記し、
+    全サロンをメモリに溜めない。
+    """
+    def event(data: dict) -> bytes:
+        with span("serialize"):
+            return dumps(data, default=json_default) + b"\n"
+    
+    all_salons = []
+    salon_count = 0
+    seen_names = set()
+    title = ""
+    total_pages = None
+    recording = start_recording(url_str, max_pages)
+    writer = HistoryStreamWriter() if should_stream(max_pages) else None
+    
+    try:
+        async for page, result in iter_pages_async(
+            url_str,
+            max_pages,
+            cache_mode=cache_mode,
+            recording=recording,
+            user_id=user_id,
+            max_ahead=writer.read_ahead if writer is not None else None
+        ):
+            if page == 1:
+                title = result.title
+                total_pages = result.total_pages
+            
+            salons = dedupe_salons(result.salons, seen_names)
+            salon_count += len(salons)
+            if writer is not None:
+                await writer.add_page(page, salons)
+            else:
+                all_salons.extend(salons)
+            
+            yield event({"type": "progress", "page": page, "total_pages": total_pages})
+            yield event({"type": "salons", "page": page, "salons": salons})
         
-        # スクレイピング実行（複数ページ対応）
-        max_pages = request.max_pages or 100
-        salons, title = scrape_multiple_pages(url_str, max_pages)
+        if not salon_count:
+            ANALYSES.inc(mode="stream", status="failed")
+            yield event({"type": "error", "detail": "サロンデータを取得できませんでした。URLを確認してください"})
+            return
         
-        if not salons:
-            raise HTTPException(
-                status_code=404,
-                detail="サロンデータを取得できませんでした。URLを確認してください"
+        if writer is not None:
+            saved = await writer.finish(user_id, url_str, title)
+        else:
+            saved = await asyncio.to_thread(
+                save_search_history,
+                user_id=user_id,
+                target_url=url_str,
+                raw_data=salons_to_dicts(all_salons),
+                title=title
             )
+        if recording is not None:
+            await asyncio.to_thread(recording.finish, saved["id"])
         
-        # データベースに保存
-        print(f"DEBUG: Saving history for {url_str} with title: '{title}'")
-        saved = save_search_history(
-            user_id=x_user_id,
-            target_url=url_str,
-            raw_data=salons,
-            title=title
-        )
-        
-        return AnalyzeResponse(
-            history_id=saved["id"],
-            salon_count=len(salons),
-            salons=salons
-        )
-        
-    except HTTPException:
-        raise
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        ANALYSES.inc(mode="stream", status="completed")
+        SALONS_SCRAPED.inc(salon_count)
+        yield event({
+            "type": "done",
+            "history_id": saved["id"],
+            "salon_count": salon_count,
+            "title": title
+        })
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"サーバーエラー: {str(e)}")
+        if writer is not None:
+            await writer.discard()
+        ANALYSES.inc(mode="stream", status="failed")
+        yield event({"type": "error", "detail": f"サーバーエラー: {str(e)}"})
+    except BaseException:
+        # クライアントの切断（CancelledError / GeneratorExit）でも追記分を残さない
+        if writer is not None:
+            await asyncio.shield(writer.discard())
+        raise
 
 
 @router.get("/history")
 async def get_history(
+    response: Response,
     x_user_id: Optional[str] = Header(None, alias="X-User-Id"),
-    limit: int = 20
+    limit: int = 20,
+    cursor: Optional[str] = None
 ) -> list[HistoryItem]:
     """
     ユーザーの検索履歴を取得
     
+    次ページがある場合は X-Next-Cursor ヘッダーにカーソルを返す
+    
     Args:
+        response: レスポンス（ヘッダー設定用）
         x_user_id: ユーザーID
         limit: 取得件数上限
+        cursor: 前ページの X-Next-Cursor
         
     Returns:
         検索履歴リスト
@@ -128,7 +435,10 @@ async def get_history(
         raise HTTPException(status_code=401, detail="X-User-Id ヘッダーが必要です")
     
     try:
-        histories = get_all_search_history(limit)
+        histories, next_cursor = await asyncio.to_thread(get_all_search_history, limit, cursor)
+        
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         
         return [
             HistoryItem(
@@ -136,10 +446,16 @@ async def get_history(
                 created_at=h["created_at"],
                 target_url=h["target_url"],
                 title=h.get("title") or "",
-                salon_count=len(h.get("raw_data", []))
+                salon_count=h.get("salon_count") or 0,
+                min_price=h.get("min_price"),
+                median_price=h.get("median_price"),
+                max_price=h.get("max_price"),
+                total_reviews=h.get("total_reviews")
             )
             for h in histories
         ]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"履歴の取得に失敗しました: {str(e)}")
 
@@ -147,13 +463,19 @@ async def get_history(
 @router.get("/history/{history_id}")
 async def get_history_detail(
     history_id: str,
+    format: Literal["json", "columnar"] = "json",
     x_user_id: Optional[str] = Header(None, alias="X-User-Id")
-) -> dict:
+) -> Response:
     """
     特定の検索履歴の詳細を取得
     
+    数千件のサロンを含むため、履歴キャッシュのシリアライズ済みJSONをそのまま返す
+    （辞書の検証・再エンコードを通さない）。
+    format=columnar ではサロンを項目ごとの配列で返す（columnar.to_columnar）。
+    
     Args:
         history_id: 履歴ID
+        format: レスポンス形式（json: raw_data にサロンの配列 / columnar: 項目ごとの配列）
         x_user_id: ユーザーID
         
     Returns:
@@ -163,18 +485,127 @@ async def get_history_detail(
         raise HTTPException(status_code=401, detail="X-User-Id ヘッダーが必要です")
     
     try:
-        history = get_search_history_by_id(history_id)
+        body = await asyncio.to_thread(get_search_history_json, history_id, format)
         
-        if not history:
+        if body is None:
             raise HTTPException(status_code=404, detail="履歴が見つかりません")
         
-        return history
+        return FastJSONResponse(body)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"履歴の取得に失敗しました: {str(e)}")
 
 
+@router.get("/history/{history_id}/stats")
+async def get_history_stats(
+    history_id: str,
+    x_user_id: Optional[str] = Header(None, alias="X-User-Id"),
+    bin_width: int = DEFAULT_BIN_WIDTH,
+    bins: Optional[int] = None,
+    max_points: int = DEFAULT_MAX_POINTS
+) -> dict:
+    """
+    検索履歴の集計値を取得（ヒストグラム・パーセンタイル・回帰・散布図）
+    
+    履歴は保存後に変わらないため、結果は履歴IDとパラメータごとにメモ化する
+    
+    Args:
+        history_id: 履歴ID
+        x_user_id: ユーザーID
+        bin_width: ヒストグラムのビン幅（円、MIN_BIN_WIDTH 以上）
+        bins: ヒストグラムのビン数（指定時は bin_width より優先）
+        max_points: 散布図で返す点の最大数
+        
+    Returns:
+        集計結果
+    """
+    if not x_user_id:
+        raise HTTPException(status_code=401, detail="X-User-Id ヘッダーが必要です")
+    if bin_width < MIN_BIN_WIDTH or (bins is not None and not 1 <= bins <= MAX_HISTOGRAM_BINS) or max_points < 1:
+        raise HTTPException(status_code=400, detail="集計パラメータが不正です")
+    
+    key = (history_id, bin_width, bins, max_points)
+    stats = get_cached_stats(key)
+    if stats is not None:
+        return stats
+    
+    try:
+        history = await asyncio.to_thread(get_search_history_by_id, history_id)
+        
+        if not history:
+            raise HTTPException(status_code=404, detail="履歴が見つかりません")
+        
+        stats = await asyncio.to_thread(
+            compute_history_stats,
+            history.get("raw_data") or [],
+            bin_width,
+            bins,
+            max_points
+        )
+        cache_stats(key, stats)
+        return stats
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"集計に失敗しました: {str(e)}")
+
+
+@router.post("/history/{history_id}/reparse")
+async def reparse_history(
+    history_id: str,
+    x_user_id: Optional[str] = Header(None, alias="X-User-Id")
+) -> dict:
+    """
+    アーカイブ済みのページを再パースして検索履歴のサロンデータを作り直す
+    
+    HPBにはアクセスせず、スクレイピング時点のページを現在のパーサーで処理する
+    
+    Args:
+        history_id: 履歴ID
+        x_user_id: ユーザーID
+        
+    Returns:
+        再パース結果（サロン数・タイトル）
+    """
+    if not x_user_id:
+        raise HTTPException(status_code=401, detail="X-User-Id ヘッダーが必要です")
+    
+    archive = get_page_archive()
+    manifest = await asyncio.to_thread(archive.load_manifest, history_id) if archive else None
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="この履歴のアーカイブが見つかりません")
+    
+    try:
+        salons, title = await asyncio.to_thread(replay_manifest, archive, manifest)
+        
+        if not salons:
+            raise HTTPException(status_code=422, detail="再パースでサロンデータを取得できませんでした")
+        
+        updated = await asyncio.to_thread(
+            replace_history_salons,
+            history_id,
+            x_user_id,
+            salons_to_dicts(salons),
+            title
+        )
+        
+        if not updated:
+            raise HTTPException(status_code=404, detail="履歴が見つからないか、更新権限がありません")
+        
+        invalidate_history_stats(history_id)
+        
+        return {
+            "history_id": history_id,
+            "salon_count": len(salons),
+            "title": title
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"再パースに失敗しました: {str(e)}")
+
+
 @router.delete("/history/{history_id}")
 async def delete_history(
     history_id: str,
@@ -194,13 +625,44 @@ async def delete_history(
         raise HTTPException(status_code=401, detail="X-User-Id ヘッダーが必要です")
     
     try:
-        deleted = delete_search_history(history_id, x_user_id)
+        deleted = await asyncio.to_thread(delete_search_history, history_id, x_user_id)
         
         if not deleted:
             raise HTTPException(status_code=404, detail="履歴が見つからないか、削除権限がありません")
         
+        invalidate_history_stats(history_id)
+        archive = get_page_archive()
+        if archive:
+            await asyncio.to_thread(archive.delete_manifest, history_id)
+        
         return {"status": "success", "message": "履歴を削除しました"}
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"履歴の削除に失敗しました: {str(e)}")
+
+
+@router.get("/salons/{salon_id}/prices")
+async def get_salon_prices(
+    salon_id: str,
+    x_user_id: Optional[str] = Header(None, alias="X-User-Id"),
+    limit: int = 30
+) -> list[dict]:
+    """
+    サロンの価格推移を取得（過去の分析をまたいだ観測値）
+    
+    Args:
+        salon_id: HPBのサロンID（例: slnH000123456）
+        x_user_id: ユーザーID
+        limit: 取得件数上限
+        
+    Returns:
+        価格観測値のリスト（新しい順）
+    """
+    if not x_user_id:
+        raise HTTPException(status_code=401, detail="X-User-Id ヘッダーが必要です")
+    
+    try:
+        return await asyncio.to_thread(get_salon_price_history, salon_id, min(max(limit, 1), 365))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"価格推移の取得に失敗しました: {str(e)}")
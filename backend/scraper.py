@@ -3,27 +3,108 @@ HPB Price Analyzer - スクレイピングモジュール
 ホットペッパービューティーからサロン情報を抽出
 """
 
+import os
 import re
-from typing import Optional
-from dataclasses import dataclass, asdict
-import requests
+import time
+import asyncio
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Optional
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit, urlunsplit
+import httpx
 from bs4 import BeautifulSoup
+from lxml import etree
 
+from http_client import get_http_client, get_sync_http_client, timed_get, timed_get_sync
+from page_cache import get_page_cache, normalize_url, PageCache, CacheEntry
+from rate_limiter import get_host_limiter, parse_retry_after, backoff_delay, MAX_RETRIES, RETRY_STATUSES
+from singleflight import get_flight_group
+from parse_pool import run_parse_task
+from fair_scheduler import get_fair_scheduler
+from metrics import span, UPSTREAM_RESPONSES
 
-@dataclass
+if TYPE_CHECKING:
+    from archive import ScrapeRecording
+
+# HPB検索結果の1ページあたりの掲載件数
+SALONS_PER_PAGE = 20
+
+# ページ並列取得の同時実行数
+DEFAULT_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "5"))
+
+# HTMLパースエンジン: lxml（高速）/ bs4（従来のBeautifulSoup実装）
+PARSER_ENGINE = os.getenv("HPB_PARSER", "lxml")
+
+# HPBの代わりにページを取得する先（負荷試験用のスタブサーバーなど、例: http://127.0.0.1:8765）
+UPSTREAM_URL = os.getenv("HPB_UPSTREAM_URL", "")
+
+
+def upstream_url(url: str) -> str:
+    """
+    取得先URLを解決
+    
+    HPB_UPSTREAM_URL が設定されている場合、HPBのURLのスキームとホストを置き換える。
+    履歴・アーカイブにはHPBのURLのまま記録する。
+    """
+    if not UPSTREAM_URL:
+        return url
+    parts = urlsplit(url)
+    if not (parts.hostname or "").endswith("hotpepper.jp"):
+        return url
+    upstream = urlsplit(UPSTREAM_URL)
+    return urlunsplit((upstream.scheme, upstream.netloc, parts.path, parts.query, parts.fragment))
+
+
+@dataclass(slots=True)
 class SalonData:
-    """サロンデータを格納するデータクラス"""
+    """
+    サロンデータを格納するデータクラス
+    
+    100ページ規模のスクレイピングでも保持コストが小さいよう __slots__ を使い、
+    クーポン価格はタプルで持つ。辞書への変換は保存・送信の直前に1回だけ行う。
+    """
     name: str
     url: str
     blog_count: int
     review_count: int
-    coupon_prices: list[int]  # 最大3つのクーポン価格
+    coupon_prices: tuple[int, ...]  # 最大3つのクーポン価格
     min_price: Optional[int]
     max_price: Optional[int]
     average_price: Optional[float]
     
     def to_dict(self) -> dict:
-        return asdict(self)
+        return {
+            "name": self.name,
+            "url": self.url,
+            "blog_count": self.blog_count,
+            "review_count": self.review_count,
+            "coupon_prices": list(self.coupon_prices),
+            "min_price": self.min_price,
+            "max_price": self.max_price,
+            "average_price": self.average_price,
+        }
+
+
+def salons_to_dicts(salons: list[SalonData]) -> list[dict]:
+    """保存・送信用にサロンリストを辞書のリストに変換"""
+    return [salon.to_dict() for salon in salons]
+
+
+def json_default(obj):
+    """json.dumps の default 用（SalonData を辞書として書き出す）"""
+    if isinstance(obj, SalonData):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+@dataclass
+class PageResult:
+    """検索結果1ページ分のパース結果"""
+    salons: list[SalonData] = field(default_factory=list)
+    title: str = ""
+    has_next: bool = False
+    total_count: Optional[int] = None  # 検索結果の総件数
+    total_pages: Optional[int] = None  # 検索結果の総ページ数
 
 
 def extract_number(text: str) -> Optional[int]:
@@ -35,27 +116,164 @@ def extract_number(text: str) -> Optional[int]:
     return int(match.group()) if match else None
 
 
-def scrape_hpb_url(url: str) -> tuple[list[dict], str, bool]:
+def scrape_hpb_url(url: str, cache_mode: str = "use") -> tuple[list[SalonData], str, bool]:
     """
     HPB検索結果ページからサロン情報をスクレイピング
     
+    Args:
+        url: 検索結果URL
+        cache_mode: ページキャッシュの利用方法（use / refresh / bypass）
+    
     Returns:
         (サロンリスト, ページタイトル, 次ページがあるか)
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'ja,en-US;q=0.7,en;q=0.3',
-    }
+    url = upstream_url(url)
+    cache, entry = _lookup_cache(url, cache_mode)
+    if entry is not None and entry.is_fresh(cache.ttl):
+        body = entry.body
+    else:
+        try:
+            with span("fetch"):
+                response = timed_get_sync(get_sync_http_client(), url, headers=_revalidation_headers(entry))
+            UPSTREAM_RESPONSES.inc(status=response.status_code)
+            body = _store_response(cache, entry, url, response)
+        except httpx.HTTPError as e:
+            UPSTREAM_RESPONSES.inc(status="error")
+            raise ValueError(f"URLの取得に失敗しました: {e}")
     
-    try:
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        response.encoding = 'utf-8'
-    except requests.RequestException as e:
-        raise ValueError(f"URLの取得に失敗しました: {e}")
+    result = parse_hpb_page(_decode_html(body))
+    return result.salons, result.title, result.has_next
+
+
+def _decode_html(body: bytes) -> str:
+    """HPBのページはUTF-8"""
+    return body.decode('utf-8', errors='replace')
+
+
+def _lookup_cache(url: str, cache_mode: str) -> tuple[Optional[PageCache], Optional[CacheEntry]]:
+    """
+    キャッシュ利用方法に応じてキャッシュを参照
+    
+    Returns:
+        (保存先のキャッシュ, 参照したエントリ) bypass の場合はどちらもNone、
+        refresh の場合はエントリを参照しない
+    """
+    cache = get_page_cache() if cache_mode != "bypass" else None
+    if cache is None or cache_mode == "refresh":
+        return cache, None
+    
+    entry = cache.get(url)
+    if entry is not None and entry.is_fresh(cache.ttl):
+        cache.stats["hits"] += 1
+    return cache, entry
+
+
+def _revalidation_headers(entry: Optional[CacheEntry]) -> Optional[dict]:
+    """期限切れエントリの条件付きリクエスト用ヘッダー"""
+    if entry is None:
+        return None
+    headers = {}
+    if entry.etag:
+        headers['If-None-Match'] = entry.etag
+    if entry.last_modified:
+        headers['If-Modified-Since'] = entry.last_modified
+    return headers or None
+
+
+def _store_response(
+    cache: Optional[PageCache],
+    entry: Optional[CacheEntry],
+    url: str,
+    response: httpx.Response
+) -> bytes:
+    """
+    レスポンスを検証してキャッシュに反映し、本文を返す
+    
+    Raises:
+        httpx.HTTPStatusError: エラーステータスの場合
+    """
+    if response.status_code == 304 and cache is not None and entry is not None:
+        cache.stats["revalidated"] += 1
+        cache.touch(url)
+        return entry.body
+    
+    response.raise_for_status()
+    
+    if cache is not None:
+        cache.stats["misses"] += 1
+        cache.put(
+            url,
+            response.content,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified')
+        )
+    return response.content
+
+
+def parse_hpb_page(html: str, engine: Optional[str] = None) -> PageResult:
+    """
+    検索結果ページのHTMLをパース
+    
+    Args:
+        html: 検索結果ページのHTML
+        engine: パースエンジン（lxml / bs4、省略時は HPB_PARSER の設定）
+        
+    Returns:
+        サロンリスト・タイトル・ページ送り情報
+    """
+    with span("parse_page"):
+        if (engine or PARSER_ENGINE) == "bs4":
+            return parse_hpb_page_bs4(html)
+        return parse_hpb_page_lxml(html)
+
+
+def _parse_page_compact(html: str, engine: Optional[str] = None) -> tuple:
+    """
+    パース用ワーカーで実行するパース処理
     
-    soup = BeautifulSoup(response.text, 'lxml')
+    プロセス間で受け渡すデータを小さくするため、サロンはフィールドのタプルで返す。
+    
+    Returns:
+        (タイトル, 次ページがあるか, 総件数, 総ページ数, サロンのフィールドのタプルのリスト)
+    """
+    result = parse_hpb_page(html, engine)
+    rows = [
+        (s.name, s.url, s.blog_count, s.review_count, s.coupon_prices, s.min_price, s.max_price, s.average_price)
+        for s in result.salons
+    ]
+    return result.title, result.has_next, result.total_count, result.total_pages, rows
+
+
+async def parse_hpb_page_async(html: str, engine: Optional[str] = None) -> PageResult:
+    """
+    検索結果ページのHTMLをイベントループを止めずにパース
+    
+    HPB_PARSE_WORKERS が1以上ならプロセスプールで複数コアに分散し、
+    0ならスレッドで実行する。
+    
+    Args:
+        html: 検索結果ページのHTML
+        engine: パースエンジン（lxml / bs4、省略時は HPB_PARSER の設定）
+        
+    Returns:
+        サロンリスト・タイトル・ページ送り情報
+    """
+    # ワーカー内の parse_page / parse_card は別プロセスで記録されるため、
+    # 親プロセスでは受け渡しを含めた所要時間を parse_pool として記録する
+    with span("parse_pool"):
+        title, has_next, total_count, total_pages, rows = await run_parse_task(_parse_page_compact, html, engine)
+    return PageResult(
+        salons=[SalonData(*row) for row in rows],
+        title=title,
+        has_next=has_next,
+        total_count=total_count,
+        total_pages=total_pages
+    )
+
+
+def parse_hpb_page_bs4(html: str) -> PageResult:
+    """検索結果ページをBeautifulSoupでパース"""
+    soup = BeautifulSoup(html, 'lxml')
     
     # ページタイトルの抽出
     title_elem = soup.title.string if soup.title else ""
@@ -73,14 +291,51 @@ def scrape_hpb_url(url: str) -> tuple[list[dict], str, bool]:
     
     for card in salon_cards:
         try:
-            salon_data = parse_salon_card(card)
+            with span("parse_card"):
+                salon_data = parse_salon_card(card)
             if salon_data and salon_data.name:
-                salons.append(salon_data.to_dict())
+                salons.append(salon_data)
         except Exception as e:
             print(f"Parse error: {e}")
             continue
     
-    return salons, title, has_next
+    total_count, total_pages = parse_result_summary(soup)
+    
+    return PageResult(
+        salons=salons,
+        title=title,
+        has_next=has_next,
+        total_count=total_count,
+        total_pages=total_pages
+    )
+
+
+def parse_result_summary(soup: BeautifulSoup) -> tuple[Optional[int], Optional[int]]:
+    """
+    検索結果の総件数と総ページ数を抽出
+    
+    Returns:
+        (総件数, 総ページ数) 取得できない項目はNone
+    """
+    # 総件数: span.numberOfResult
+    total_count = None
+    count_elem = soup.select_one('.numberOfResult')
+    if count_elem:
+        total_count = extract_number(count_elem.get_text(strip=True))
+    
+    # 総ページ数: 「1/12ページ」表記
+    total_pages = None
+    paging_text = soup.find(string=re.compile(r'\d+/\d+ページ'))
+    if paging_text:
+        match = re.search(r'\d+/(\d+)ページ', str(paging_text))
+        if match:
+            total_pages = int(match.group(1))
+    
+    # ページ数表記がない場合は総件数から算出
+    if total_pages is None and total_count:
+        total_pages = -(-total_count // SALONS_PER_PAGE)
+    
+    return total_count, total_pages
 
 
 def parse_salon_card(card: BeautifulSoup) -> Optional[SalonData]:
@@ -133,16 +388,36 @@ def parse_salon_card(card: BeautifulSoup) -> Optional[SalonData]:
                     review_count = review_num
     
     # クーポン価格の抽出: .slcCouponPrice
+    price_texts = [elem.get_text(strip=True) for elem in card.select('.slcCouponPrice')]
+    
+    return build_salon_data(name, salon_url, blog_count, review_count, price_texts)
+
+
+def build_salon_data(
+    name: str,
+    salon_url: str,
+    blog_count: int,
+    review_count: int,
+    price_texts: list[str]
+) -> SalonData:
+    """
+    カードから抽出した値からSalonDataを生成（各パースエンジン共通）
+    
+    Args:
+        name: サロン名
+        salon_url: サロンURL（絶対パス）
+        blog_count: ブログ件数
+        review_count: 口コミ件数
+        price_texts: クーポン価格のテキスト（表示順）
+    """
     coupon_prices = []
-    price_elems = card.select('.slcCouponPrice')
-    for elem in price_elems:
-        price_text = elem.get_text(strip=True)
+    for price_text in price_texts:
         price = extract_number(price_text)
         if price and 500 <= price <= 100000:
             coupon_prices.append(price)
     
     # 最大3つに制限
-    coupon_prices = coupon_prices[:3]
+    coupon_prices = tuple(coupon_prices[:3])
     
     # 最小・最大・平均価格を算出
     min_price = min(coupon_prices) if coupon_prices else None
@@ -161,61 +436,482 @@ def parse_salon_card(card: BeautifulSoup) -> Optional[SalonData]:
     )
 
 
-def scrape_multiple_pages(base_url: str, max_pages: int = 50) -> tuple[list[dict], str]:
-    """複数ページをスクレイピング（ページネーション対応）"""
-    all_salons = []
-    seen_names = set()
-    first_page_title = ""
+# ===========================================
+# lxml パースエンジン
+# BeautifulSoup版と同じ結果を、木全体のBeautifulSoup変換と
+# カードごとのCSSセレクタ評価なしで得る
+# ===========================================
+
+def _has_class(name: str) -> str:
+    """class属性に指定クラスを含む条件（XPath）"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+_XP_CARDS = etree.XPath(f"//li[{_has_class('searchListCassette')}]")
+_XP_NEXT_PAGE = etree.XPath(f"(//*[{_has_class('iS')} and {_has_class('arrowPagingR')}])[1]")
+_XP_RESULT_COUNT = etree.XPath(f"(//*[{_has_class('numberOfResult')}])[1]")
+_XP_TEXT_NODES = etree.XPath("//text() | //comment()")
+_XP_NAME = etree.XPath(f"(.//h3[{_has_class('slcHead')}]//a)[1]")
+_XP_NAME_FALLBACK = etree.XPath("(.//h3//a)[1]")
+_XP_BLOG_DD = etree.XPath(f"(.//dt[{_has_class('slcDetailBlogIcon')}])[1]/following-sibling::dd[1]")
+_XP_REVIEW_DD = etree.XPath(f"(.//dt[{_has_class('slcDetailMessageIcon')}])[1]/following-sibling::dd[1]")
+_XP_FIRST_LINK = etree.XPath("(.//a)[1]")
+_XP_PRICES = etree.XPath(f".//*[{_has_class('slcCouponPrice')}]")
+
+# BeautifulSoup の get_text() が対象外とする文字列を含むタグ
+_NON_TEXT_TAGS = frozenset(('script', 'style', 'template', 'rt', 'rp'))
+
+_PAGING_RE = re.compile(r'\d+/\d+ページ')
+
+
+def _element_text(elem) -> str:
+    """BeautifulSoup の get_text(strip=True) と同じ規則で要素のテキストを取得"""
+    parts = []
     
-    for page in range(1, max_pages + 1):
-        # HPBのページネーションパラメータ: /PN{page}/
-        if 'PN' in base_url:
-            page_url = re.sub(r'PN\d+', f'PN{page}', base_url)
-        elif page == 1:
-            page_url = base_url
-        else:
-            # 末尾のスラッシュを考慮して /PN{page}/ を付与
-            base_url_clean = base_url.split('?')[0]
-            query_string = f"?{base_url.split('?')[1]}" if '?' in base_url else ""
-            
-            if not base_url_clean.endswith('/'):
-                base_url_clean += '/'
-            
-            page_url = f"{base_url_clean}PN{page}/{query_string}"
+    def walk(el, excluded: bool) -> None:
+        if el.text and not excluded:
+            parts.append(el.text)
+        for child in el:
+            # コメント等はテキストに含めないが、後続のテキスト（tail）は含める
+            if isinstance(child.tag, str):
+                walk(child, excluded or child.tag in _NON_TEXT_TAGS)
+            if child.tail and not excluded:
+                parts.append(child.tail)
+    
+    walk(elem, any(a.tag in _NON_TEXT_TAGS for a in elem.iterancestors()))
+    return "".join(p.strip() for p in parts if p.strip())
+
+
+def _element_string(elem) -> Optional[str]:
+    """BeautifulSoup の .string と同じ規則で単一の子文字列を取得"""
+    contents: list = [elem.text] if elem.text else []
+    for child in elem:
+        contents.append(child)
+        if child.tail:
+            contents.append(child.tail)
+    
+    if len(contents) != 1:
+        return None
+    child = contents[0]
+    if isinstance(child, str):
+        return child
+    if isinstance(child.tag, str):
+        return _element_string(child)
+    return child.text or ""
+
+
+def _parse_html_root(html: str):
+    """HTMLをlxmlの要素木に変換"""
+    try:
+        return etree.fromstring(html, etree.HTMLParser())
+    except ValueError:
+        # XML宣言付きの文字列はバイト列として渡す
+        return etree.fromstring(html.encode('utf-8'), etree.HTMLParser(encoding='utf-8'))
+
+
+def parse_hpb_page_lxml(html: str) -> PageResult:
+    """検索結果ページをlxml（プリコンパイル済みXPath）でパース"""
+    root = _parse_html_root(html)
+    if root is None:
+        print("Found 0 salon cards")
+        return PageResult()
+    
+    # ページタイトルの抽出
+    title_elem = next(root.iter('title'), None)
+    title_string = _element_string(title_elem) if title_elem is not None else ""
+    title = str(title_string).replace("｜ホットペッパービューティー", "").strip()
+    
+    # 次ページがあるかチェック: .iS.arrowPagingR
+    has_next = bool(_XP_NEXT_PAGE(root))
+    
+    salons = []
+    salon_cards = _XP_CARDS(root)
+    
+    print(f"Found {len(salon_cards)} salon cards")
+    
+    for card in salon_cards:
+        try:
+            with span("parse_card"):
+                salon_data = parse_salon_element(card)
+            if salon_data and salon_data.name:
+                salons.append(salon_data)
+        except Exception as e:
+            print(f"Parse error: {e}")
+            continue
+    
+    # 総件数: span.numberOfResult
+    total_count = None
+    count_elems = _XP_RESULT_COUNT(root)
+    if count_elems:
+        total_count = extract_number(_element_text(count_elems[0]))
+    
+    # 総ページ数: 「1/12ページ」表記
+    total_pages = None
+    for node in _XP_TEXT_NODES(root):
+        text = node if isinstance(node, str) else (node.text or "")
+        if _PAGING_RE.search(text):
+            match = re.search(r'\d+/(\d+)ページ', text)
+            if match:
+                total_pages = int(match.group(1))
+            break
+    
+    # ページ数表記がない場合は総件数から算出
+    if total_pages is None and total_count:
+        total_pages = -(-total_count // SALONS_PER_PAGE)
+    
+    return PageResult(
+        salons=salons,
+        title=title,
+        has_next=has_next,
+        total_count=total_count,
+        total_pages=total_pages
+    )
+
+
+def _count_in_dd(card, xpath: etree.XPath) -> int:
+    """dt の次の dd 内の最初のリンクから件数を抽出"""
+    dds = xpath(card)
+    if not dds:
+        return 0
+    links = _XP_FIRST_LINK(dds[0])
+    if not links:
+        return 0
+    number = extract_number(_element_text(links[0]))
+    return number if number else 0
+
+
+def parse_salon_element(card) -> Optional[SalonData]:
+    """
+    サロンカード（lxml要素）をパースしてSalonDataを生成
+    
+    parse_salon_card と同じ抽出規則で、同じ結果を返す
+    """
+    name_elems = _XP_NAME(card) or _XP_NAME_FALLBACK(card)
+    if not name_elems:
+        return None
+    name_elem = name_elems[0]
+    
+    name = _element_text(name_elem)
+    salon_url = name_elem.get('href', '')
+    
+    # URLを絶対パスに
+    if salon_url and not salon_url.startswith('http'):
+        salon_url = f"https://beauty.hotpepper.jp{salon_url}"
+    
+    if not name or len(name) < 2:
+        return None
+    
+    blog_count = _count_in_dd(card, _XP_BLOG_DD)
+    review_count = _count_in_dd(card, _XP_REVIEW_DD)
+    price_texts = [_element_text(elem) for elem in _XP_PRICES(card)]
+    
+    return build_salon_data(name, salon_url, blog_count, review_count, price_texts)
+
+
+def build_page_url(base_url: str, page: int) -> str:
+    """ページ番号に対応する検索結果URLを生成"""
+    # HPBのページネーションパラメータ: /PN{page}/
+    if 'PN' in base_url:
+        return re.sub(r'PN\d+', f'PN{page}', base_url)
+    if page == 1:
+        return base_url
+    
+    # 末尾のスラッシュを考慮して /PN{page}/ を付与
+    base_url_clean = base_url.split('?')[0]
+    query_string = f"?{base_url.split('?')[1]}" if '?' in base_url else ""
+    
+    if not base_url_clean.endswith('/'):
+        base_url_clean += '/'
+    
+    return f"{base_url_clean}PN{page}/{query_string}"
+
+
+async def fetch_page_html(client: httpx.AsyncClient, url: str, cache_mode: str = "use") -> str:
+    """
+    検索結果ページのHTMLを非同期で取得
+    
+    キャッシュが有効期限内ならネットワークにアクセスせずに返し、期限切れなら
+    ETag / Last-Modified による条件付きリクエストで再検証する。
+    同じページを取得中の呼び出しがあれば、新たに取得せずその結果を待つ。
+    リクエストはホスト単位のレート制限を通し、429/5xx・通信エラーは
+    Retry-After またはジッター付きバックオフの後にリトライする。
+    
+    Args:
+        client: HTTPクライアント
+        url: 検索結果URL
+        cache_mode: ページキャッシュの利用方法（use / refresh / bypass）
+    
+    Raises:
+        ValueError: リトライしても取得できなかった場合
+    """
+    url = upstream_url(url)
+    
+    # 同じページを取得中の分析があればその結果を共有する
+    # （use はキャッシュを返し、refresh はキャッシュを更新し、bypass はキャッシュに触れないため、それぞれ別に集約）
+    key = (normalize_url(url), cache_mode)
+    return await get_flight_group("pages").do(
+        key,
+        lambda: _fetch_page_html(client, url, cache_mode)
+    )
+
+
+async def _fetch_page_html(client: httpx.AsyncClient, url: str, cache_mode: str) -> str:
+    """fetch_page_html の本体（キャッシュ参照・レート制限・リトライ）"""
+    # ディスクI/Oはスレッドで実行
+    cache, entry = await asyncio.to_thread(_lookup_cache, url, cache_mode)
+    if entry is not None and entry.is_fresh(cache.ttl):
+        return _decode_html(entry.body)
+    
+    limiter = get_host_limiter(url)
+    last_error = None
+    
+    for attempt in range(MAX_RETRIES + 1):
+        acquired = False
+        cancelled = False
+        started = time.monotonic()
+        response = None
+        retry_after = None
+        try:
+            # 枠の確保中に取り消された場合は acquire 自身が枠を返却する
+            await limiter.acquire()
+            acquired = True
+            started = time.monotonic()
+            response = await timed_get(client, url, headers=_revalidation_headers(entry))
+            if response.status_code in RETRY_STATUSES:
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        except httpx.HTTPError as e:
+            last_error = e
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            if acquired and cancelled:
+                # 取り消しはホストの状態と無関係なので同時接続数の調整に使わない
+                await asyncio.shield(limiter.cancel())
+            elif acquired:
+                await limiter.release(
+                    time.monotonic() - started,
+                    response.status_code if response is not None else None,
+                    retry_after
+                )
+                UPSTREAM_RESPONSES.inc(status=response.status_code if response is not None else "error")
         
-        print(f"Fetching page {page}: {page_url}")
+        if response is not None and response.status_code not in RETRY_STATUSES:
+            try:
+                body = await asyncio.to_thread(_store_response, cache, entry, url, response)
+            except httpx.HTTPError as e:
+                raise ValueError(f"URLの取得に失敗しました: {e}")
+            return _decode_html(body)
+        
+        if response is not None:
+            last_error = f"HTTP {response.status_code}"
+        
+        if attempt < MAX_RETRIES:
+            delay = backoff_delay(attempt, retry_after)
+            print(f"Retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s ({last_error}): {url}")
+            await asyncio.sleep(delay)
+    
+    raise ValueError(f"URLの取得に失敗しました: {last_error}")
+
+
+async def iter_pages_async(
+    base_url: str,
+    max_pages: int = 50,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    client: Optional[httpx.AsyncClient] = None,
+    on_page: Optional[Callable[[int, Optional[PageResult]], None]] = None,
+    cache_mode: str = "use",
+    recording: Optional["ScrapeRecording"] = None,
+    done_pages: Optional[dict[int, PageResult]] = None,
+    user_id: Optional[str] = None,
+    max_ahead: Optional[int] = None
+) -> AsyncIterator[tuple[int, PageResult]]:
+    """
+    検索結果ページを並列に取得し、ページ順に返す
+    
+    1ページ目から総ページ数を読み取り、残りのページを同時実行数の上限付きで
+    並列取得する。サロンのない・取得に失敗した・次ページのないページで終了し、
+    それ以降のページは返さない（逐次取得と同じ終了条件）。
+    
+    Args:
+        base_url: 検索結果URL
+        max_pages: 取得ページ数の上限
+        concurrency: 同時に取得するページ数の上限
+        client: 使用するHTTPクライアント（省略時は共有クライアント）
+        on_page: ページ取得ごとに (ページ番号, パース結果) で呼ばれるコールバック
+                 取得順に呼ばれ、取得に失敗したページはパース結果がNone
+        cache_mode: ページキャッシュの利用方法（use / refresh / bypass）
+        recording: 取得したHTMLを保存するアーカイブの記録（省略時は保存しない）
+        done_pages: 取得済みのページ（ページ番号 -> パース結果）、中断したスクレイピングの
+                    再開時に渡すと、これらのページは取得せずにこの結果を使う
+        user_id: 分析したユーザー（指定するとページ取得をユーザー間で公平に割り当てる）
+        max_ahead: 最後に返したページより先に取得するページ数の上限（省略時は制限なし）
+                   呼び出し側の処理が遅い場合に、取得済みで未処理のページがメモリに溜まらないようにする
         
+    Yields:
+        (ページ番号, パース結果)
+    """
+    if client is None:
+        client = get_http_client()
+    done_pages = done_pages or {}
+    scheduler = get_fair_scheduler() if user_id else None
+    
+    async def fetch(page: int) -> Optional[PageResult]:
+        if page in done_pages:
+            result = done_pages[page]
+            if on_page:
+                on_page(page, result)
+            return result
+        
+        page_url = build_page_url(base_url, page)
+        print(f"Fetching page {page}: {page_url}")
         try:
-            salons, title, has_next = scrape_hpb_url(page_url)
-            if page == 1:
-                first_page_title = title
-            
-            if not salons:
-                break
+            # 取得枠の順番待ちは fetch の所要時間に含めない
+            async with scheduler.slot(user_id) if scheduler else nullcontext():
+                with span("fetch"):
+                    html = await fetch_page_html(client, page_url, cache_mode)
+            if recording is not None:
+                # アーカイブへの保存に失敗してもスクレイピングは続ける
+                try:
+                    await asyncio.to_thread(recording.add_page, page, page_url, html)
+                except OSError as e:
+                    print(f"Archive error on page {page}: {e}")
+            # パースはCPU処理のためスレッドまたはパース用プロセスで実行し、イベントループを止めない
+            result = await parse_hpb_page_async(html)
+        except Exception as e:
+            print(f"Page {page} error: {e}")
+            result = None
+        
+        if on_page:
+            on_page(page, result)
+        return result
+    
+    # 1ページ目で総ページ数を確認
+    first = await fetch(1)
+    if first is None or not first.salons:
+        return
+    yield 1, first
+    
+    if not first.has_next or max_pages <= 1:
+        print("Reached last page at 1")
+        return
+    
+    last_page = max_pages
+    if first.total_pages:
+        last_page = min(last_page, first.total_pages)
+    
+    # 終端ページ（次ページなし・空・エラー）が見つかったら以降は取得しない
+    stop_page = last_page
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    # 呼び出し側に返した最後のページ（先読みの上限の基準）
+    yielded_page = 1
+    progress = asyncio.Condition()
+    
+    async def fetch_bounded(page: int) -> Optional[PageResult]:
+        nonlocal stop_page
+        if max_ahead:
+            async with progress:
+                await progress.wait_for(lambda: page <= yielded_page + max_ahead)
+        async with semaphore:
+            if page > stop_page:
+                return None
+            result = await fetch(page)
+        if result is None or not result.salons or not result.has_next:
+            stop_page = min(stop_page, page)
+        return result
+    
+    tasks = {
+        page: asyncio.create_task(fetch_bounded(page))
+        for page in range(2, last_page + 1)
+    }
+    
+    try:
+        for page, task in tasks.items():
+            result = await task
+            if result is None or not result.salons:
+                return
+            yield page, result
             
-            for salon in salons:
-                if salon['name'] not in seen_names:
-                    seen_names.add(salon['name'])
-                    all_salons.append(salon)
+            if max_ahead:
+                async with progress:
+                    yielded_page = page
+                    progress.notify_all()
             
             # 次のページがない場合は終了
-            if not has_next:
+            if not result.has_next:
                 print(f"Reached last page at {page}")
-                break
-                
-        except Exception as e:
-            print(f"Page {page} error: {e}")
-            break
+                return
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+
+def dedupe_salons(salons: list[SalonData], seen_names: set[str]) -> list[SalonData]:
+    """
+    サロン名で重複を除外
+    
+    Args:
+        salons: サロンリスト
+        seen_names: これまでに出現したサロン名（このセットに追加される）
+        
+    Returns:
+        未出現のサロンのみのリスト
+    """
+    with span("dedupe"):
+        unique = []
+        for salon in salons:
+            if salon.name not in seen_names:
+                seen_names.add(salon.name)
+                unique.append(salon)
+        return unique
+
+
+async def scrape_multiple_pages_async(
+    base_url: str,
+    max_pages: int = 50,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    client: Optional[httpx.AsyncClient] = None,
+    on_page: Optional[Callable[[int, Optional[PageResult]], None]] = None,
+    cache_mode: str = "use",
+    recording: Optional["ScrapeRecording"] = None,
+    done_pages: Optional[dict[int, PageResult]] = None,
+    user_id: Optional[str] = None
+) -> tuple[list[SalonData], str]:
+    """
+    複数ページを並列にスクレイピング（ページネーション対応）
+    
+    結果はページ順にマージするため、重複排除・タイトルの扱いは
+    逐次取得の場合と同じになる。引数は iter_pages_async と同じ。
+    
+    Returns:
+        (重複排除済みサロンリスト, 1ページ目のタイトル)
+    """
+    all_salons = []
+    seen_names = set()
+    first_page_title = ""
+    
+    async for page, result in iter_pages_async(
+        base_url, max_pages, concurrency, client, on_page, cache_mode, recording, done_pages, user_id
+    ):
+        if page == 1:
+            first_page_title = result.title
+        all_salons.extend(dedupe_salons(result.salons, seen_names))
     
     return all_salons, first_page_title
 
 
+def scrape_multiple_pages(base_url: str, max_pages: int = 50) -> tuple[list[SalonData], str]:
+    """複数ページをスクレイピング（ページネーション対応）"""
+    return asyncio.run(scrape_multiple_pages_async(base_url, max_pages))
+
+
 if __name__ == "__main__":
     test_url = "https://beauty.hotpepper.jp/genre/kgkw094/pre47/city20500000/"
     try:
-        results = scrape_hpb_url(test_url)
+        results, _, _ = scrape_hpb_url(test_url)
         print(f"取得サロン数: {len(results)}")
         for salon in results[:5]:
-            print(f"  {salon['name']}: ブログ{salon['blog_count']}件, 口コミ{salon['review_count']}件, 価格{salon['coupon_prices']}, 平均{salon['average_price']}")
+            print(f"  {salon.name}: ブログ{salon.blog_count}件, 口コミ{salon.review_count}件, 価格{list(salon.coupon_prices)}, 平均{salon.average_price}")
     except Exception as e:
         print(f"エラー: {e}")
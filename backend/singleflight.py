@@ -0,0 +1,87 @@
+"""
+HPB Price Analyzer - リクエスト集約モジュール
+同じキーの処理が実行中なら新たに開始せず、その結果を共有する（singleflight）
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+class _Call:
+    """実行中の処理と、その結果を待っている呼び出し数"""
+    
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    キーごとに実行中の処理を1つにまとめる
+    
+    実行中の処理は待っている呼び出しがすべてキャンセルされた時点でキャンセルし、
+    1つの呼び出しのキャンセルが他の呼び出しに影響しないようにする。
+    """
+    
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+        self.stats = {"started": 0, "shared": 0}
+    
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        キーに対応する処理を実行、または実行中の処理の結果を待つ
+        
+        Args:
+            key: 処理を識別するキー
+            factory: 処理のコルーチンを生成する関数（実行中の処理がない場合のみ呼ぶ）
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.stats["started"] += 1
+        else:
+            self.stats["shared"] += 1
+        
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+    
+    def in_flight(self) -> int:
+        return len(self._calls)
+    
+    def snapshot(self) -> dict:
+        return {**self.stats, "in_flight": len(self._calls)}
+    
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+# 名前 -> 集約グループ（イベントループごとに保持）
+_groups: dict[str, SingleFlight] = {}
+_groups_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_flight_group(name: str) -> SingleFlight:
+    """名前に対応する集約グループを取得（プロセス内の全リクエストで共有）"""
+    global _groups_loop
+    
+    loop = asyncio.get_running_loop()
+    if _groups_loop is not loop:
+        _groups.clear()
+        _groups_loop = loop
+    
+    if name not in _groups:
+        _groups[name] = SingleFlight()
+    return _groups[name]
+
+
+def get_flight_stats() -> dict:
+    """グループごとの集約状況"""
+    return {name: group.snapshot() for name, group in _groups.items()}
@@ -0,0 +1,34 @@
+"""
+テスト共通設定
+"""
+
+import pytest
+
+import page_cache
+import history_cache
+import rate_limiter
+
+
+@pytest.fixture(autouse=True)
+def isolated_page_cache(tmp_path, monkeypatch):
+    """テストごとに空のページキャッシュを使う"""
+    cache = page_cache.PageCache(str(tmp_path / "page_cache"))
+    monkeypatch.setattr(page_cache, "_page_cache", cache)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def fast_rate_limiter(monkeypatch):
+    """レート制限とリトライ待ちでテストが遅くならないようにする"""
+    monkeypatch.setattr(rate_limiter, "RATE_LIMIT_PER_SECOND", 10000.0)
+    monkeypatch.setattr(rate_limiter, "RATE_LIMIT_BURST", 10000.0)
+    monkeypatch.setattr(rate_limiter, "INITIAL_CONCURRENCY", 10)
+    monkeypatch.setattr(rate_limiter, "RETRY_BASE_DELAY", 0.0)
+
+
+@pytest.fixture(autouse=True)
+def isolated_history_cache(monkeypatch):
+    """テストごとに空の履歴キャッシュを使う"""
+    cache = history_cache.HistoryCache()
+    monkeypatch.setattr(history_cache, "_history_cache", cache)
+    return cache
@@ -0,0 +1,133 @@
+"""
+analytics モジュールのテスト
+"""
+
+import pytest
+
+import analytics
+from analytics import compute_history_stats, cache_stats, get_cached_stats, invalidate_history_stats
+
+
+def make_salons(prices_reviews):
+    return [
+        {"name": f"サロン{i}", "url": f"https://example.com/{i}", "review_count": r, "average_price": p}
+        for i, (p, r) in enumerate(prices_reviews)
+    ]
+
+
+class TestComputeHistoryStats:
+    """compute_history_stats のテスト"""
+    
+    def test_summary_and_percentiles(self):
+        salons = make_salons([(1000, 1), (2000, 2), (3000, 3), (4000, 4), (5000, 5)])
+        
+        stats = compute_history_stats(salons)
+        
+        assert stats["priced_count"] == 5
+        assert stats["summary"]["mean"] == 3000
+        assert stats["summary"]["min"] == 1000
+        assert stats["summary"]["max"] == 5000
+        assert stats["summary"]["percentiles"]["p50"] == 3000
+        assert stats["summary"]["percentiles"]["p25"] == 2000
+    
+    def test_histogram_fixed_width(self):
+        """ビン幅指定時は0円から区切り、境界値は上のビンに入る"""
+        salons = make_salons([(400, 0), (500, 0), (999, 0), (1000, 0)])
+        
+        histogram = compute_history_stats(salons, bin_width=500)["histogram"]
+        
+        assert [(b["min_price"], b["max_price"], b["count"]) for b in histogram] == [
+            (0, 500, 1), (500, 1000, 2), (1000, 1500, 1)
+        ]
+        assert histogram[1]["salons"] == ["サロン1", "サロン2"]
+    
+    def test_histogram_bin_count(self):
+        salons = make_salons([(1000, 0), (2000, 0), (3000, 0)])
+        
+        histogram = compute_history_stats(salons, bins=2)["histogram"]
+        
+        assert len(histogram) == 2
+        assert sum(b["count"] for b in histogram) == 3
+        assert histogram[-1]["max_price"] == 3000
+    
+    def test_histogram_bin_count_capped(self):
+        """ビン幅指定でビン数が上限を超える場合はビン幅を広げる"""
+        salons = make_salons([(1000, 0), (10_000_000, 0)])
+        
+        histogram = compute_history_stats(salons, bin_width=100)["histogram"]
+        
+        assert len(histogram) <= analytics.MAX_HISTOGRAM_BINS
+        assert histogram[0]["max_price"] % 100 == 0
+        assert sum(b["count"] for b in histogram) == 2
+        assert histogram[-1]["max_price"] > 10_000_000
+    
+    def test_histogram_sample_names_limited(self):
+        salons = make_salons([(1000, 0)] * 10)
+        
+        histogram = compute_history_stats(salons)["histogram"]
+        
+        assert histogram[2]["count"] == 10
+        assert len(histogram[2]["salons"]) == analytics.BIN_SAMPLE_NAMES
+    
+    def test_regression(self):
+        salons = make_salons([(1000, 0), (2000, 10), (3000, 20)])
+        
+        regression = compute_history_stats(salons)["regression"]
+        
+        assert regression["slope"] == pytest.approx(100)
+        assert regression["intercept"] == pytest.approx(1000)
+        assert regression["r"] == pytest.approx(1)
+    
+    def test_regression_degenerate(self):
+        """点が足りない・口コミ数が一定の場合は回帰しない"""
+        assert compute_history_stats(make_salons([(1000, 5)]))["regression"] is None
+        assert compute_history_stats(make_salons([(1000, 5), (2000, 5)]))["regression"] is None
+    
+    def test_scatter_downsampled(self):
+        salons = make_salons([(1000 + i, i) for i in range(1000)])
+        
+        scatter = compute_history_stats(salons, max_points=50)["scatter"]
+        
+        assert len(scatter) == 50
+        reviews = [p["review_count"] for p in scatter]
+        assert reviews[0] == 0 and reviews[-1] == 999
+    
+    def test_excludes_missing_prices(self):
+        salons = make_salons([(1000, 1)]) + [{"name": "価格なし", "review_count": 3, "average_price": None}]
+        
+        stats = compute_history_stats(salons)
+        
+        assert stats["salon_count"] == 2
+        assert stats["priced_count"] == 1
+        assert [p["name"] for p in stats["scatter"]] == ["サロン0"]
+    
+    def test_empty(self):
+        stats = compute_history_stats([])
+        
+        assert stats["summary"] is None
+        assert stats["histogram"] == []
+        assert stats["regression"] is None
+        assert stats["scatter"] == []
+
+
+class TestStatsCache:
+    """集計結果のメモ化のテスト"""
+    
+    def test_invalidate(self):
+        cache_stats(("h1", 500, None, 500), {"a": 1})
+        cache_stats(("h2", 500, None, 500), {"b": 2})
+        
+        invalidate_history_stats("h1")
+        
+        assert get_cached_stats(("h1", 500, None, 500)) is None
+        assert get_cached_stats(("h2", 500, None, 500)) == {"b": 2}
+    
+    def test_lru_eviction(self, monkeypatch):
+        monkeypatch.setattr(analytics, "STATS_CACHE_SIZE", 2)
+        cache_stats(("x1",), {})
+        cache_stats(("x2",), {})
+        get_cached_stats(("x1",))
+        cache_stats(("x3",), {})
+        
+        assert get_cached_stats(("x2",)) is None
+        assert get_cached_stats(("x1",)) == {}
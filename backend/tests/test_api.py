@@ -2,8 +2,10 @@
 FastAPI エンドポイントのテスト
 """
 
+import json
+import asyncio
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
 
@@ -11,6 +13,12 @@ from httpx import AsyncClient
 import sys
 sys.path.insert(0, '..')
 from main import app
+from scraper import PageResult, SalonData
+
+
+def make_salon(name: str, review_count: int = 0, average_price: float = None) -> SalonData:
+    prices = (int(average_price),) if average_price else ()
+    return SalonData(name, "", 0, review_count, prices, average_price, average_price, average_price)
 
 
 client = TestClient(app)
@@ -35,6 +43,18 @@ class TestHealthEndpoints:
         assert response.status_code == 200
         data = response.json()
         assert data["status"] == "healthy"
+    
+    def test_internal_stats_require_admin_token(self, monkeypatch):
+        """内部の状況は管理用トークンがある場合のみ返す（未設定なら無効）"""
+        assert client.get("/health/http").status_code == 404
+        
+        monkeypatch.setattr("main.ADMIN_TOKEN", "secret")
+        
+        assert client.get("/health/http").status_code == 403
+        assert client.get("/health/http", headers={"X-Admin-Token": "wrong"}).status_code == 403
+        response = client.get("/health/http", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == 200
+        assert "rate_limit" in response.json()
 
 
 class TestAnalyzeEndpoint:
@@ -61,24 +81,18 @@ class TestAnalyzeEndpoint:
         assert response.status_code == 400
         assert "ホットペッパービューティー" in response.json()["detail"]
     
-    @patch('routers.analysis.scrape_hpb_url')
-    @patch('routers.analysis.save_search_history')
+    @patch('jobs.scrape_multiple_pages_async', new_callable=AsyncMock)
+    @patch('jobs.save_search_history')
     def test_analyze_success(self, mock_save, mock_scrape):
         """正常なスクレイピング・保存フロー"""
         # モックの設定
-        mock_scrape.return_value = [
-            {
-                "name": "テストサロン",
-                "review_count": 10,
-                "prices": [5000],
-                "average_price": 5000.0
-            }
-        ]
+        salons = [make_salon("テストサロン", review_count=10, average_price=5000.0)]
+        mock_scrape.return_value = (salons, "テストエリア")
         mock_save.return_value = {
             "id": "test-history-id",
             "user_id": "test-user-id",
             "target_url": "https://beauty.hotpepper.jp/test",
-            "raw_data": mock_scrape.return_value
+            "raw_data": [salon.to_dict() for salon in salons]
         }
         
         response = client.post(
@@ -87,25 +101,203 @@ class TestAnalyzeEndpoint:
             headers={"X-User-Id": "test-user-id"}
         )
         
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        
+        # バックグラウンドタスクはレスポンス送信後に実行済み
+        response = client.get(f"/api/jobs/{job_id}", headers={"X-User-Id": "test-user-id"})
+        
         assert response.status_code == 200
         data = response.json()
+        assert data["status"] == "completed"
         assert data["history_id"] == "test-history-id"
         assert data["salon_count"] == 1
-        assert len(data["salons"]) == 1
+        assert mock_save.call_args.kwargs["title"] == "テストエリア"
+        assert mock_save.call_args.kwargs["raw_data"][0]["coupon_prices"] == [5000]
     
-    @patch('routers.analysis.scrape_hpb_url')
+    @patch('jobs.scrape_multiple_pages_async', new_callable=AsyncMock)
     def test_analyze_no_results(self, mock_scrape):
-        """スクレイピング結果が空の場合は404"""
-        mock_scrape.return_value = []
+        """スクレイピング結果が空の場合はジョブ失敗"""
+        mock_scrape.return_value = ([], "")
         
         response = client.post(
             "/api/analyze",
             json={"url": "https://beauty.hotpepper.jp/test"},
             headers={"X-User-Id": "test-user-id"}
         )
+        job_id = response.json()["job_id"]
+        response = client.get(f"/api/jobs/{job_id}", headers={"X-User-Id": "test-user-id"})
+        
+        data = response.json()
+        assert data["status"] == "failed"
+        assert "取得できませんでした" in data["error"]
+    
+    def test_get_job_not_found(self):
+        """存在しないジョブは404"""
+        response = client.get("/api/jobs/nonexistent-id", headers={"X-User-Id": "test-user-id"})
         
         assert response.status_code == 404
-        assert "取得できませんでした" in response.json()["detail"]
+
+
+class TestAnalyzeBatchEndpoint:
+    """一括分析エンドポイントのテスト"""
+    
+    AREAS = {
+        "https://beauty.hotpepper.jp/genre/kgkw094/pre13/": (["サロンA", "サロンB"], "東京"),
+        "https://beauty.hotpepper.jp/genre/kgkw094/pre14/": (["サロンB", "サロンC"], "神奈川"),
+    }
+    
+    @classmethod
+    async def fake_scrape(cls, url, max_pages, **kwargs):
+        names, title = cls.AREAS.get(url, ([], ""))
+        return [make_salon(name, average_price=5000.0) for name in names], title
+    
+    def test_batch_invalid_url(self):
+        """HPB以外のURLが含まれる場合は400"""
+        response = client.post(
+            "/api/analyze/batch",
+            json={"urls": ["https://beauty.hotpepper.jp/test", "https://example.com"]},
+            headers={"X-User-Id": "test-user-id"}
+        )
+        
+        assert response.status_code == 400
+    
+    def test_batch_empty_urls(self):
+        """URLが空の場合は422"""
+        response = client.post(
+            "/api/analyze/batch",
+            json={"urls": []},
+            headers={"X-User-Id": "test-user-id"}
+        )
+        
+        assert response.status_code == 422
+    
+    @patch('jobs.save_search_history')
+    def test_batch_success(self, mock_save):
+        """URLごとの履歴と、重複を除いたまとめの履歴を保存"""
+        mock_save.side_effect = lambda **kwargs: {"id": f"history-{mock_save.call_count}"}
+        urls = list(self.AREAS)
+        
+        with patch('jobs.scrape_multiple_pages_async', side_effect=self.fake_scrape):
+            response = client.post(
+                "/api/analyze/batch",
+                json={"urls": urls + [urls[0]]},
+                headers={"X-User-Id": "test-user-id"}
+            )
+        
+        assert response.status_code == 202
+        body = response.json()
+        assert len(body["job_ids"]) == 2  # 重複したURLは1件にまとめる
+        
+        response = client.get(f"/api/batches/{body['batch_id']}", headers={"X-User-Id": "test-user-id"})
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "completed"
+        assert data["salon_count"] == 3
+        assert [item["url"] for item in data["items"]] == urls
+        assert all(item["status"] == "completed" for item in data["items"])
+        assert [item["salon_count"] for item in data["items"]] == [2, 2]
+        
+        # URLごとに2件 + まとめ1件
+        assert mock_save.call_count == 3
+        rollup = mock_save.call_args.kwargs
+        assert data["rollup_history_id"] == "history-3"
+        assert [salon["name"] for salon in rollup["raw_data"]] == ["サロンA", "サロンB", "サロンC"]
+        assert rollup["target_url"] == "https://beauty.hotpepper.jp/genre/kgkw094/"
+    
+    @patch('jobs.save_search_history')
+    def test_batch_partial_failure(self, mock_save):
+        """一部のURLが失敗しても、取得できたサロンでまとめを保存"""
+        mock_save.side_effect = lambda **kwargs: {"id": f"history-{mock_save.call_count}"}
+        urls = [list(self.AREAS)[0], "https://beauty.hotpepper.jp/genre/kgkw094/pre99/"]
+        
+        with patch('jobs.scrape_multiple_pages_async', side_effect=self.fake_scrape):
+            body = client.post(
+                "/api/analyze/batch",
+                json={"urls": urls},
+                headers={"X-User-Id": "test-user-id"}
+            ).json()
+        
+        data = client.get(f"/api/batches/{body['batch_id']}", headers={"X-User-Id": "test-user-id"}).json()
+        
+        assert data["status"] == "completed"
+        assert data["salon_count"] == 2
+        assert [item["status"] for item in data["items"]] == ["completed", "failed"]
+    
+    @patch('jobs.scrape_multiple_pages_async', new_callable=AsyncMock)
+    def test_batch_all_failed(self, mock_scrape):
+        """全URLが失敗した場合は一括分析も失敗"""
+        mock_scrape.return_value = ([], "")
+        
+        body = client.post(
+            "/api/analyze/batch",
+            json={"urls": ["https://beauty.hotpepper.jp/test"]},
+            headers={"X-User-Id": "test-user-id"}
+        ).json()
+        data = client.get(f"/api/batches/{body['batch_id']}", headers={"X-User-Id": "test-user-id"}).json()
+        
+        assert data["status"] == "failed"
+        assert data["rollup_history_id"] is None
+    
+    def test_get_batch_not_found(self):
+        """存在しない一括分析は404"""
+        response = client.get("/api/batches/nonexistent-id", headers={"X-User-Id": "test-user-id"})
+        
+        assert response.status_code == 404
+
+
+class TestAnalyzeStreamEndpoint:
+    """ストリーミング分析エンドポイントのテスト"""
+    
+    @staticmethod
+    def fake_pages(pages):
+        async def iter_pages(url, max_pages, **kwargs):
+            for page, salons in enumerate(pages, start=1):
+                yield page, PageResult(salons=salons, title="テストエリア", has_next=True, total_pages=len(pages))
+        return iter_pages
+    
+    def test_stream_events(self):
+        """ページごとのサロンと完了イベントを送信"""
+        pages = [
+            [make_salon("サロンA"), make_salon("サロンB")],
+            [make_salon("サロンB"), make_salon("サロンC")],
+        ]
+        with patch('routers.analysis.iter_pages_async', self.fake_pages(pages)), \
+                patch('routers.analysis.save_search_history') as mock_save:
+            mock_save.return_value = {"id": "test-history-id"}
+            
+            response = client.post(
+                "/api/analyze/stream",
+                json={"url": "https://beauty.hotpepper.jp/test"},
+                headers={"X-User-Id": "test-user-id"}
+            )
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        events = [json.loads(line) for line in response.text.splitlines()]
+        
+        salon_events = [e for e in events if e["type"] == "salons"]
+        assert [[s["name"] for s in e["salons"]] for e in salon_events] == [["サロンA", "サロンB"], ["サロンC"]]
+        assert events[-1] == {"type": "done", "history_id": "test-history-id", "salon_count": 3, "title": "テストエリア"}
+    
+    def test_stream_no_results(self):
+        """サロンが取得できない場合はエラーイベント"""
+        with patch('routers.analysis.iter_pages_async', self.fake_pages([])):
+            response = client.post(
+                "/api/analyze/stream",
+                json={"url": "https://beauty.hotpepper.jp/test"},
+                headers={"X-User-Id": "test-user-id"}
+            )
+        
+        events = [json.loads(line) for line in response.text.splitlines()]
+        assert events == [{"type": "error", "detail": "サロンデータを取得できませんでした。URLを確認してください"}]
+    
+    def test_stream_without_user_id(self):
+        """X-User-Idヘッダーがない場合は401"""
+        response = client.post("/api/analyze/stream", json={"url": "https://beauty.hotpepper.jp/test"})
+        
+        assert response.status_code == 401
 
 
 class TestHistoryEndpoints:
@@ -117,20 +309,24 @@ class TestHistoryEndpoints:
         
         assert response.status_code == 401
     
-    @patch('routers.analysis.get_user_search_history')
+    @patch('routers.analysis.get_all_search_history')
     def test_get_history_success(self, mock_get_history):
         """履歴取得成功"""
-        mock_get_history.return_value = [
+        mock_get_history.return_value = ([
             {
                 "id": "history-1",
                 "created_at": "2026-01-01T00:00:00Z",
                 "target_url": "https://beauty.hotpepper.jp/test",
-                "raw_data": [{"name": "サロン1"}]
+                "salon_count": 12,
+                "min_price": 3300,
+                "median_price": 5500.0,
+                "max_price": 9900,
+                "total_reviews": 420
             }
-        ]
+        ], "next-cursor")
         
         response = client.get(
-            "/api/history",
+            "/api/history?limit=1",
             headers={"X-User-Id": "test-user-id"}
         )
         
@@ -138,6 +334,33 @@ class TestHistoryEndpoints:
         data = response.json()
         assert len(data) == 1
         assert data[0]["id"] == "history-1"
+        assert data[0]["salon_count"] == 12
+        assert data[0]["median_price"] == 5500.0
+        assert response.headers["X-Next-Cursor"] == "next-cursor"
+        mock_get_history.assert_called_once_with(1, None)
+    
+    @patch('routers.analysis.get_all_search_history')
+    def test_get_history_last_page(self, mock_get_history):
+        """最後のページは X-Next-Cursor なし"""
+        mock_get_history.return_value = ([], None)
+        
+        response = client.get(
+            "/api/history?cursor=abc",
+            headers={"X-User-Id": "test-user-id"}
+        )
+        
+        assert response.status_code == 200
+        assert "X-Next-Cursor" not in response.headers
+        mock_get_history.assert_called_once_with(20, "abc")
+    
+    def test_get_history_invalid_cursor(self):
+        """日時・UUIDとして解釈できないカーソルは400"""
+        response = client.get(
+            "/api/history?cursor=MjAyNi0wMS0wMSIsaWQuZ3QuMHwx",
+            headers={"X-User-Id": "test-user-id"}
+        )
+        
+        assert response.status_code == 400
     
     def test_get_history_detail_without_user_id(self):
         """履歴詳細取得にX-User-Idが必要"""
@@ -145,10 +368,10 @@ class TestHistoryEndpoints:
         
         assert response.status_code == 401
     
-    @patch('routers.analysis.get_search_history_by_id')
-    def test_get_history_detail_not_found(self, mock_get_by_id):
+    @patch('routers.analysis.get_search_history_json')
+    def test_get_history_detail_not_found(self, mock_get_json):
         """存在しない履歴は404"""
-        mock_get_by_id.return_value = None
+        mock_get_json.return_value = None
         
         response = client.get(
             "/api/history/nonexistent-id",
@@ -156,3 +379,96 @@ class TestHistoryEndpoints:
         )
         
         assert response.status_code == 404
+    
+    @patch('routers.analysis.get_search_history_json')
+    def test_get_history_detail_serialized(self, mock_get_json):
+        """シリアライズ済みのJSONをそのまま返す"""
+        mock_get_json.return_value = '{"id":"h1","raw_data":[{"name":"サロンA"}]}'.encode("utf-8")
+        
+        response = client.get(
+            "/api/history/h1",
+            headers={"X-User-Id": "test-user-id"}
+        )
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        assert response.json() == {"id": "h1", "raw_data": [{"name": "サロンA"}]}
+        mock_get_json.assert_called_once_with("h1", "json")
+    
+    @patch('routers.analysis.get_search_history_json')
+    def test_get_history_detail_columnar(self, mock_get_json):
+        """format=columnar を指定すると列形式で返す"""
+        mock_get_json.return_value = b'{"id":"h1","format":"columnar"}'
+        
+        response = client.get(
+            "/api/history/h1?format=columnar",
+            headers={"X-User-Id": "test-user-id"}
+        )
+        
+        assert response.status_code == 200
+        assert response.json()["format"] == "columnar"
+        mock_get_json.assert_called_once_with("h1", "columnar")
+    
+    def test_history_reads_run_off_event_loop(self):
+        """履歴の取得・削除の同期的なDB・アーカイブ呼び出しはイベントループのスレッドで実行しない"""
+        on_loop = []
+        
+        def record_loop(result):
+            def call(*args):
+                try:
+                    asyncio.get_running_loop()
+                    on_loop.append(True)
+                except RuntimeError:
+                    on_loop.append(False)
+                return result
+            return call
+        
+        archive = MagicMock()
+        archive.delete_manifest.side_effect = record_loop(None)
+        with patch('routers.analysis.get_search_history_json', side_effect=record_loop(b'{"id":"h1"}')), \
+                patch('routers.analysis.delete_search_history', side_effect=record_loop(True)), \
+                patch('routers.analysis.get_page_archive', return_value=archive):
+            assert client.get("/api/history/h1", headers={"X-User-Id": "test-user-id"}).status_code == 200
+            assert client.delete("/api/history/h1", headers={"X-User-Id": "test-user-id"}).status_code == 200
+        
+        archive.delete_manifest.assert_called_once_with("h1")
+        assert on_loop == [False, False, False]
+    
+    def test_get_history_detail_invalid_format(self):
+        """未知の format は422"""
+        response = client.get(
+            "/api/history/h1?format=csv",
+            headers={"X-User-Id": "test-user-id"}
+        )
+        
+        assert response.status_code == 422
+    
+    @patch('routers.analysis.get_search_history_by_id')
+    def test_get_history_stats_memoized(self, mock_get_by_id):
+        """集計結果は履歴IDとパラメータごとにメモ化される"""
+        mock_get_by_id.return_value = {
+            "id": "stats-id",
+            "raw_data": [
+                {"name": "サロンA", "review_count": 10, "average_price": 4000},
+                {"name": "サロンB", "review_count": 30, "average_price": 6000},
+            ],
+        }
+        headers = {"X-User-Id": "test-user-id"}
+        
+        first = client.get("/api/history/stats-id/stats", headers=headers)
+        second = client.get("/api/history/stats-id/stats", headers=headers)
+        
+        assert first.status_code == 200
+        assert first.json() == second.json()
+        assert first.json()["summary"]["percentiles"]["p50"] == 5000
+        assert mock_get_by_id.call_count == 1
+    
+    def test_get_history_stats_invalid_params(self):
+        """不正な集計パラメータは400"""
+        for params in ("bin_width=0", "bin_width=1", "bins=1001"):
+            response = client.get(
+                f"/api/history/stats-id/stats?{params}",
+                headers={"X-User-Id": "test-user-id"}
+            )
+            
+            assert response.status_code == 400
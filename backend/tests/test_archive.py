@@ -0,0 +1,224 @@
+"""
+ページアーカイブモジュールのテスト
+"""
+
+import asyncio
+import os
+import re
+import httpx
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+
+import archive
+from archive import PageArchive, ScrapeRecording, replay_manifest
+from scraper import scrape_multiple_pages_async
+from benchmarks.stub_server import render_page
+from main import app
+
+
+BASE_URL = "https://beauty.hotpepper.jp/genre/kgkw094/"
+
+
+@pytest.fixture
+def page_archive(tmp_path):
+    return PageArchive(str(tmp_path / "archive"))
+
+
+def record_scrape(page_archive: PageArchive, pages: int) -> tuple[list, str, ScrapeRecording]:
+    """スタブページをスクレイピングしてアーカイブに記録"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        match = re.search(r'/PN(\d+)/', request.url.path)
+        page = int(match.group(1)) if match else 1
+        return httpx.Response(200, text=render_page(page, pages, 3))
+    
+    recording = ScrapeRecording(page_archive, BASE_URL, 10)
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    salons, title = asyncio.run(scrape_multiple_pages_async(BASE_URL, 10, client=client, recording=recording))
+    return salons, title, recording
+
+
+class TestPageArchive:
+    """PageArchive のテスト"""
+    
+    def test_round_trip_and_dedupe(self, page_archive):
+        html = render_page(1, 1, 2)
+        
+        digest = page_archive.put_page(html)
+        
+        assert page_archive.put_page(html) == digest
+        assert page_archive.get_page(digest) == html
+        assert page_archive.stats["blobs_written"] == 1
+        assert page_archive.stats["blobs_deduped"] == 1
+    
+    def test_compressed_with_zstd(self, page_archive):
+        digest = page_archive.put_page(render_page(1, 1, 20))
+        
+        path = page_archive._find_blob(digest)
+        assert path.endswith(".html.zst")
+        assert os.path.getsize(path) < len(render_page(1, 1, 20).encode("utf-8")) / 3
+    
+    def test_gzip_fallback(self, page_archive, monkeypatch):
+        monkeypatch.setattr(archive, "zstandard", None)
+        html = render_page(1, 1, 2)
+        
+        digest = page_archive.put_page(html)
+        
+        assert page_archive._find_blob(digest).endswith(".html.gz")
+        assert page_archive.get_page(digest) == html
+    
+    def test_missing_page(self, page_archive):
+        with pytest.raises(FileNotFoundError):
+            page_archive.get_page("0" * 64)
+    
+    def test_manifest_round_trip(self, page_archive):
+        page_archive.save_manifest("h1", {"pages": []})
+        
+        assert page_archive.load_manifest("h1") == {"pages": []}
+        page_archive.delete_manifest("h1")
+        assert page_archive.load_manifest("h1") is None
+    
+    def test_manifest_path_stays_in_archive(self, page_archive):
+        path = page_archive._manifest_path("../../etc/passwd")
+        
+        assert os.path.dirname(path) == os.path.join(page_archive.directory, "manifests")
+
+
+class TestReplay:
+    """記録とオフライン再パースのテスト"""
+    
+    def test_replay_matches_scrape(self, page_archive):
+        salons, title, recording = record_scrape(page_archive, pages=4)
+        recording.finish("h1")
+        
+        manifest = page_archive.load_manifest("h1")
+        replayed, replayed_title = replay_manifest(page_archive, manifest)
+        
+        assert [p["page"] for p in manifest["pages"]] == [1, 2, 3, 4]
+        assert replayed == salons
+        assert replayed_title == title
+    
+    def test_replay_with_other_engine(self, page_archive):
+        salons, _, recording = record_scrape(page_archive, pages=2)
+        recording.finish("h1")
+        
+        replayed, _ = replay_manifest(page_archive, page_archive.load_manifest("h1"), engine="bs4")
+        
+        assert replayed == salons
+    
+    def test_replay_stops_at_missing_page(self, page_archive):
+        _, _, recording = record_scrape(page_archive, pages=4)
+        del recording.pages[3]
+        recording.finish("h1")
+        
+        replayed, _ = replay_manifest(page_archive, page_archive.load_manifest("h1"))
+        
+        assert len(replayed) == 6
+    
+    def test_shared_recording_attached_per_history(self, page_archive):
+        """締めた記録は以降のページを加えず、各履歴に同じマニフェストを保存する"""
+        _, _, recording = record_scrape(page_archive, pages=2)
+        recording.close()
+        recording.add_page(3, BASE_URL, "<html></html>")
+        recording.attach("h1")
+        recording.attach("h2")
+        
+        first, second = page_archive.load_manifest("h1"), page_archive.load_manifest("h2")
+        
+        assert [p["page"] for p in first["pages"]] == [1, 2]
+        assert first["pages"] == second["pages"]
+        assert second["history_id"] == "h2"
+
+
+class TestGarbageCollection:
+    """参照されない本文の削除のテスト"""
+    
+    def age(self, path: str, seconds: float) -> None:
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime - seconds, stat.st_mtime - seconds))
+    
+    def test_unreferenced_blobs_collected(self, page_archive):
+        """削除した履歴だけが参照していた本文を削除し、他の履歴と共有する本文は残す"""
+        shared = page_archive.put_page(render_page(1, 2, 3))
+        only_h2 = page_archive.put_page(render_page(2, 2, 3))
+        page_archive.save_manifest("h1", {"pages": [{"page": 1, "url": BASE_URL, "sha256": shared}]})
+        page_archive.save_manifest("h2", {"pages": [
+            {"page": 1, "url": BASE_URL, "sha256": shared},
+            {"page": 2, "url": BASE_URL, "sha256": only_h2},
+        ]})
+        for digest in (shared, only_h2):
+            self.age(page_archive._find_blob(digest), 3600)
+        
+        page_archive.delete_manifest("h2")
+        result = page_archive.collect_garbage(grace=60)
+        
+        assert result["blobs_collected"] == 1
+        assert result["bytes_freed"] > 0
+        assert page_archive._find_blob(only_h2) is None
+        assert page_archive.get_page(shared) == render_page(1, 2, 3)
+    
+    def test_recent_blobs_kept(self, page_archive):
+        """マニフェスト保存前の記録中の本文（猶予期間内）は削除しない"""
+        digest = page_archive.put_page(render_page(1, 1, 3))
+        
+        assert page_archive.collect_garbage(grace=60)["blobs_collected"] == 0
+        assert page_archive._find_blob(digest) is not None
+    
+    def test_dedupe_refreshes_blob(self, page_archive):
+        """既存の本文を再び参照すると猶予期間が延びる"""
+        html = render_page(1, 1, 3)
+        digest = page_archive.put_page(html)
+        self.age(page_archive._find_blob(digest), 3600)
+        
+        page_archive.put_page(html)
+        
+        assert page_archive.collect_garbage(grace=60)["blobs_collected"] == 0
+    
+    def test_retention_expires_manifests(self, page_archive):
+        digest = page_archive.put_page(render_page(1, 1, 3))
+        page_archive.save_manifest("old", {"pages": [{"page": 1, "url": BASE_URL, "sha256": digest}]})
+        self.age(page_archive._manifest_path("old"), 3 * 86400)
+        self.age(page_archive._find_blob(digest), 3 * 86400)
+        
+        result = page_archive.collect_garbage(grace=60, retention_days=2)
+        
+        assert result["manifests_expired"] == 1
+        assert result["blobs_collected"] == 1
+        assert page_archive.load_manifest("old") is None
+    
+    def test_unreadable_manifest_stops_sweep(self, page_archive):
+        """読めないマニフェストがある場合は本文を削除しない"""
+        digest = page_archive.put_page(render_page(1, 1, 3))
+        self.age(page_archive._find_blob(digest), 3600)
+        os.makedirs(os.path.dirname(page_archive._manifest_path("broken")), exist_ok=True)
+        with open(page_archive._manifest_path("broken"), "w") as f:
+            f.write("{")
+        
+        assert page_archive.collect_garbage(grace=60)["blobs_collected"] == 0
+        assert page_archive._find_blob(digest) is not None
+
+
+class TestReparseEndpoint:
+    """再パースエンドポイントのテスト"""
+    
+    client = TestClient(app)
+    
+    def test_reparse(self, page_archive):
+        salons, _, recording = record_scrape(page_archive, pages=2)
+        recording.finish("h1")
+        
+        with patch("routers.analysis.get_page_archive", return_value=page_archive), \
+                patch("routers.analysis.replace_history_salons", return_value={"id": "h1"}) as mock_replace:
+            response = self.client.post("/api/history/h1/reparse", headers={"X-User-Id": "user-1"})
+        
+        assert response.status_code == 200
+        assert response.json()["salon_count"] == len(salons)
+        args = mock_replace.call_args.args
+        assert args[:2] == ("h1", "user-1")
+        assert args[2] == [salon.to_dict() for salon in salons]
+    
+    def test_reparse_without_archive(self, page_archive):
+        with patch("routers.analysis.get_page_archive", return_value=page_archive):
+            response = self.client.post("/api/history/unknown/reparse", headers={"X-User-Id": "user-1"})
+        
+        assert response.status_code == 404
@@ -0,0 +1,44 @@
+"""
+ベンチマークスイートのテスト（計測値の比較と短時間の実行）
+"""
+
+from benchmarks.bench_suite import compare_results, run_suite, time_op
+
+
+def make_report(**medians) -> dict:
+    return {"commit": "abc", "results": {name: {"median_us": value} for name, value in medians.items()}}
+
+
+class TestCompareResults:
+    """compare_results のテスト"""
+    
+    def test_regression_over_threshold(self):
+        rows = compare_results(make_report(a=100.0, b=100.0), make_report(a=125.0, b=105.0), threshold=0.2)
+        
+        assert [(r["name"], r["ratio"], r["regression"]) for r in rows] == [
+            ("a", 1.25, True),
+            ("b", 1.05, False),
+        ]
+    
+    def test_skip_new_benchmarks(self):
+        rows = compare_results(make_report(a=100.0), make_report(a=90.0, c=10.0))
+        
+        assert [r["name"] for r in rows] == ["a"]
+        assert rows[0]["regression"] is False
+
+
+def test_time_op():
+    calls = []
+    
+    result = time_op(lambda: calls.append(1), number=3, repeat=2)
+    
+    assert len(calls) == 7  # ウォームアップ1回 + 3回 x 2
+    assert result["median_us"] >= 0
+    assert result["number"] == 3
+
+
+def test_run_suite_quick():
+    report = run_suite(["extract_number", "parse_hpb_page"], scale=0.05)
+    
+    assert set(report["results"]) == {"extract_number", "parse_hpb_page[bs4]", "parse_hpb_page[lxml]"}
+    assert report["results"]["parse_hpb_page[lxml]"]["pages"] >= 5
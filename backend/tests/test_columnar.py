@@ -0,0 +1,75 @@
+"""
+履歴詳細の列形式のテスト
+"""
+
+import json
+
+from columnar import split_url, to_columnar, from_columnar, SALON_FIELDS
+from history_cache import HistoryCache, serialize
+
+
+def make_history(count: int) -> dict:
+    return {
+        "id": "h1",
+        "created_at": "2026-01-01T00:00:00+00:00",
+        "target_url": "https://beauty.hotpepper.jp/genre/kgkw094/",
+        "title": "テストエリア",
+        "raw_data": [
+            {
+                "name": f"サロン{i}",
+                "url": f"https://beauty.hotpepper.jp/slnH{i:09d}/",
+                "blog_count": i % 7,
+                "review_count": i * 3,
+                "coupon_prices": [5000, 6000 + i],
+                "min_price": 5000,
+                "max_price": 6000 + i,
+                "average_price": 5500 + i / 2,
+            }
+            for i in range(count)
+        ],
+    }
+
+
+def test_split_url():
+    assert split_url("https://beauty.hotpepper.jp/slnH000000001/") == ("https://beauty.hotpepper.jp/", "slnH000000001/")
+    assert split_url("https://beauty.hotpepper.jp/kr/slnH000000001/?vos=a/b") == (
+        "https://beauty.hotpepper.jp/kr/", "slnH000000001/?vos=a/b"
+    )
+    assert split_url("https://beauty.hotpepper.jp") == ("", "https://beauty.hotpepper.jp")
+    assert split_url("") == ("", "")
+
+
+def test_round_trip():
+    history = make_history(5)
+    history["raw_data"].append({**history["raw_data"][0], "url": "", "min_price": None, "coupon_prices": []})
+    
+    columnar = to_columnar(history)
+    
+    assert columnar["format"] == "columnar"
+    assert "raw_data" not in columnar
+    assert columnar["salons"]["count"] == 6
+    assert columnar["salons"]["url_prefixes"] == ["https://beauty.hotpepper.jp/", ""]
+    assert set(columnar["salons"]["columns"]) == set(SALON_FIELDS) | {"url_prefix"}
+    assert from_columnar(json.loads(json.dumps(columnar))) == history
+
+
+def test_columnar_is_smaller():
+    history = make_history(1000)
+    
+    assert len(serialize(history)) > 2 * len(json.dumps(to_columnar(history), ensure_ascii=False))
+
+
+def test_cache_adds_format_lazily():
+    """列形式は初めて要求されたときにシリアライズしてサイズに加える"""
+    history = make_history(10)
+    cache = HistoryCache()
+    body = cache.put("h1", history)
+    
+    columnar = cache.get_bytes("h1", "columnar")
+    
+    assert from_columnar(json.loads(columnar)) == history
+    assert cache.get_bytes("h1", "columnar") is columnar
+    assert cache.get_bytes("h1") is body
+    assert cache.snapshot()["size_bytes"] == len(body) + len(columnar)
+    cache.invalidate("h1")
+    assert cache.snapshot()["size_bytes"] == 0
@@ -0,0 +1,117 @@
+"""
+レスポンス圧縮ミドルウェアのテスト
+"""
+
+import asyncio
+import gzip
+import zlib
+
+import brotli
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+import compression
+from compression import CompressionMiddleware, choose_encoding
+
+
+BODY = "サロン,5000\n" * 500
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+    
+    @app.get("/large")
+    async def large():
+        return PlainTextResponse(BODY)
+    
+    @app.get("/small")
+    async def small():
+        return PlainTextResponse("ok")
+    
+    @app.get("/stream")
+    async def stream():
+        async def lines():
+            for i in range(3):
+                yield f'{{"page": {i}}}\n'.encode()
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    
+    return app
+
+
+@pytest.fixture
+def client() -> TestClient:
+    return TestClient(make_app())
+
+
+def get_raw(client: TestClient, path: str, encoding: str):
+    """圧縮されたままの本文を取得（httpx の自動展開を使わない）"""
+    with client.stream("GET", path, headers={"Accept-Encoding": encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate, br") == "br"
+    assert choose_encoding("gzip") == "gzip"
+    assert choose_encoding("br;q=0, gzip") == "gzip"
+    assert choose_encoding("identity") is None
+    assert choose_encoding("") is None
+
+
+def test_choose_encoding_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    
+    assert choose_encoding("br, gzip") == "gzip"
+    assert choose_encoding("br") is None
+
+
+def test_brotli(client):
+    response, raw = get_raw(client, "/large", "br")
+    
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) == len(raw) < len(BODY.encode())
+    assert brotli.decompress(raw).decode() == BODY
+
+
+def test_gzip(client):
+    response, raw = get_raw(client, "/large", "gzip")
+    
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(raw).decode() == BODY
+
+
+def test_small_response_not_compressed(client):
+    response, raw = get_raw(client, "/small", "br, gzip")
+    
+    assert "content-encoding" not in response.headers
+    assert raw == b"ok"
+
+
+def test_stream_flushes_each_chunk():
+    """ストリーミングは各チャンクをその時点までで展開できる形で送る（TestClient は本文をまとめるため直接呼ぶ）"""
+    messages = []
+    scope = {
+        "type": "http", "method": "GET", "path": "/stream", "raw_path": b"/stream", "root_path": "",
+        "scheme": "http", "query_string": b"", "headers": [(b"accept-encoding", b"gzip")],
+        "server": ("testserver", 80), "client": ("testclient", 50000), "http_version": "1.1",
+    }
+    
+    async def receive():
+        # 切断の待ち受けは送信が終わると取り消される
+        await asyncio.Event().wait()
+    
+    async def send(message):
+        messages.append(message)
+    
+    asyncio.run(make_app()(scope, receive, send))
+    
+    headers = dict(messages[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    decompressor = zlib.decompressobj(31)
+    lines = [decompressor.decompress(message["body"]) for message in messages[1:]]
+    assert lines[:3] == [b'{"page": 0}\n', b'{"page": 1}\n', b'{"page": 2}\n']
+    assert decompressor.eof
@@ -0,0 +1,204 @@
+"""
+データベース連携モジュールのテスト（Supabaseに接続しない部分）
+"""
+
+import httpx
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import patch, MagicMock
+
+from database import (
+    summarize_salons,
+    encode_history_cursor,
+    decode_history_cursor,
+    extract_salon_id,
+    build_observation_rows,
+    save_price_observations,
+    save_search_history,
+    get_target_url_counts,
+    get_all_search_history,
+    append_history_chunks,
+    finalize_history_stream,
+    delete_stale_history_chunks,
+)
+
+
+class TestSummarizeSalons:
+    """保存時の集計値のテスト"""
+    
+    def test_summary(self):
+        salons = [
+            {"min_price": 3000, "max_price": 5000, "average_price": 4000.0, "review_count": 10},
+            {"min_price": 6000, "max_price": 9000, "average_price": 7500.0, "review_count": 5},
+            {"min_price": None, "max_price": None, "average_price": None, "review_count": 0},
+        ]
+        
+        assert summarize_salons(salons) == {
+            "salon_count": 3,
+            "min_price": 3000,
+            "median_price": 5750.0,
+            "max_price": 9000,
+            "total_reviews": 15,
+        }
+    
+    def test_empty(self):
+        assert summarize_salons([]) == {
+            "salon_count": 0,
+            "min_price": None,
+            "median_price": None,
+            "max_price": None,
+            "total_reviews": 0,
+        }
+
+
+class TestHistoryCursor:
+    """キーセットページング用カーソルのテスト"""
+    
+    def test_round_trip(self):
+        row = {"created_at": "2026-01-01T00:00:00.123+00:00", "id": "0b7c7d3e-1111-2222-3333-444455556666"}
+        
+        created_at, history_id = decode_history_cursor(encode_history_cursor(row))
+        
+        assert created_at.isoformat() == "2026-01-01T00:00:00.123000+00:00"
+        assert str(history_id) == row["id"]
+    
+    def test_invalid_cursor(self):
+        with pytest.raises(ValueError):
+            decode_history_cursor("not-a-cursor")
+    
+    @pytest.mark.parametrize("created_at, history_id", [
+        ('2026-01-01",id.gt.0', "0b7c7d3e-1111-2222-3333-444455556666"),
+        ("2026-01-01T00:00:00+00:00", "1),user_id.eq.(x"),
+    ])
+    def test_cursor_rejects_filter_syntax(self, created_at, history_id):
+        """日時・UUIDとして解釈できない値（フィルター構文の注入）は受け付けない"""
+        cursor = encode_history_cursor({"created_at": created_at, "id": history_id})
+        
+        with pytest.raises(ValueError):
+            decode_history_cursor(cursor)
+    
+    def test_filter_rebuilt_from_parsed_values(self):
+        client = MagicMock()
+        query = client.table.return_value.select.return_value
+        query.params = httpx.QueryParams()
+        query.limit.return_value.execute.return_value.data = []
+        cursor = encode_history_cursor({"created_at": "2026-01-01T00:00:00Z", "id": "0B7C7D3E-1111-2222-3333-444455556666"})
+        
+        with patch("database.get_supabase_client", return_value=client):
+            get_all_search_history(20, cursor)
+        
+        assert query.params["or"] == (
+            '(created_at.lt."2026-01-01T00:00:00+00:00",and(created_at.eq."2026-01-01T00:00:00+00:00",'
+            'id.lt.0b7c7d3e-1111-2222-3333-444455556666))'
+        )
+
+
+class TestPriceObservations:
+    """正規化テーブルへの一括保存のテスト"""
+    
+    SALONS = [
+        {"name": "サロンA", "url": "https://beauty.hotpepper.jp/slnH000000001/", "blog_count": 1, "review_count": 10,
+         "coupon_prices": [5000], "min_price": 5000, "max_price": 5000, "average_price": 5000.0},
+        {"name": "サロンB", "url": "https://beauty.hotpepper.jp/slnH000000002/?vos=abc", "blog_count": 0, "review_count": 3,
+         "coupon_prices": [], "min_price": None, "max_price": None, "average_price": None},
+        {"name": "サロンA（別名）", "url": "https://beauty.hotpepper.jp/slnH000000001/", "blog_count": 1, "review_count": 10,
+         "coupon_prices": [5000], "min_price": 5000, "max_price": 5000, "average_price": 5000.0},
+    ]
+    
+    def test_extract_salon_id(self):
+        assert extract_salon_id("https://beauty.hotpepper.jp/slnH000123456/?vos=x") == "slnH000123456"
+        assert extract_salon_id("https://example.com/other/") == "https://example.com/other/"
+    
+    def test_build_rows_dedupes_salons(self):
+        salon_rows, observation_rows = build_observation_rows("history-1", self.SALONS, "2026-01-01T00:00:00+00:00")
+        
+        assert [r["salon_id"] for r in salon_rows] == ["slnH000000001", "slnH000000002"]
+        assert [r["position"] for r in observation_rows] == [1, 2]
+        assert observation_rows[0]["observed_at"] == "2026-01-01T00:00:00+00:00"
+        assert salon_rows[0]["last_seen_at"] == "2026-01-01T00:00:00+00:00"
+    
+    def test_single_bulk_write_per_table(self):
+        client = MagicMock()
+        with patch("database.get_supabase_client", return_value=client):
+            count = save_price_observations("history-1", self.SALONS)
+        
+        assert count == 2
+        client.table.assert_any_call("salons")
+        client.table.assert_any_call("price_observations")
+        assert client.table.return_value.upsert.call_count == 1
+        assert client.table.return_value.insert.call_count == 1
+        assert client.table.return_value.upsert.call_args.kwargs == {"on_conflict": "salon_id"}
+    
+    def test_save_history_survives_observation_error(self):
+        """正規化テーブルの保存に失敗しても履歴は保存済みとして返す"""
+        client = MagicMock()
+        client.table.return_value.insert.return_value.execute.return_value.data = [{"id": "history-1", "created_at": "2026-01-01"}]
+        
+        with patch("database.get_supabase_client", return_value=client), \
+                patch("database.save_price_observations", side_effect=RuntimeError("boom")):
+            saved = save_search_history("user-1", "https://beauty.hotpepper.jp/", self.SALONS, "タイトル")
+        
+        assert saved["id"] == "history-1"
+
+
+def test_target_url_counts():
+    """期間内の対象URLを回数の多い順に返す"""
+    client = MagicMock()
+    query = client.table.return_value.select.return_value.gte.return_value.order.return_value.limit.return_value
+    query.execute.return_value.data = [
+        {"target_url": "https://beauty.hotpepper.jp/a/"},
+        {"target_url": "https://beauty.hotpepper.jp/b/"},
+        {"target_url": "https://beauty.hotpepper.jp/b/"},
+    ]
+    
+    with patch("database.get_supabase_client", return_value=client):
+        counts = get_target_url_counts("2026-01-01T00:00:00+00:00")
+    
+    assert counts == [("https://beauty.hotpepper.jp/b/", 2), ("https://beauty.hotpepper.jp/a/", 1)]
+    client.table.return_value.select.return_value.gte.assert_called_once_with("created_at", "2026-01-01T00:00:00+00:00")
+
+
+class TestHistoryStream:
+    """ストリーミング保存のテスト"""
+    
+    def test_append_upserts_by_page(self):
+        client = MagicMock()
+        with patch("database.get_supabase_client", return_value=client):
+            append_history_chunks("stream-1", [(1, [{"name": "サロンA"}]), (2, [{"name": "サロンB"}])])
+        
+        client.table.assert_called_once_with("search_history_chunks")
+        rows = client.table.return_value.upsert.call_args.args[0]
+        assert [(r["stream_id"], r["seq"]) for r in rows] == [("stream-1", 1), ("stream-1", 2)]
+        assert rows[0]["created_at"] == rows[1]["created_at"]
+        assert client.table.return_value.upsert.call_args.kwargs == {"on_conflict": "stream_id,seq"}
+    
+    def test_delete_stale_chunks(self):
+        """最後の書き込みから max_age を過ぎた追記分を削除する"""
+        client = MagicMock()
+        query = client.table.return_value.delete.return_value
+        query.lt.return_value.execute.return_value.data = [{"stream_id": "s1"}, {"stream_id": "s2"}]
+        
+        with patch("database.get_supabase_client", return_value=client):
+            deleted = delete_stale_history_chunks(3600)
+        
+        assert deleted == 2
+        client.table.assert_called_once_with("search_history_chunks")
+        column, cutoff = query.lt.call_args.args
+        assert column == "created_at"
+        age = datetime.now(timezone.utc) - datetime.fromisoformat(cutoff)
+        assert 3600 <= age.total_seconds() < 3660
+    
+    def test_finalize_calls_rpc(self):
+        client = MagicMock()
+        client.rpc.return_value.execute.return_value.data = [{"id": "history-1", "salon_count": 2}]
+        
+        with patch("database.get_supabase_client", return_value=client):
+            saved = finalize_history_stream("stream-1", "user-1", "https://beauty.hotpepper.jp/", "タイトル")
+        
+        assert saved["id"] == "history-1"
+        client.rpc.assert_called_once_with("finalize_search_history_stream", {
+            "p_stream_id": "stream-1",
+            "p_user_id": "user-1",
+            "p_target_url": "https://beauty.hotpepper.jp/",
+            "p_title": "タイトル",
+        })
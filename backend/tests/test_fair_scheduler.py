@@ -0,0 +1,157 @@
+"""
+ユーザー間の公平なスクレイピングスケジューラーのテスト
+"""
+
+import asyncio
+import re
+import httpx
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+
+import fair_scheduler
+from fair_scheduler import FairScheduler, parse_weights
+from scraper import scrape_multiple_pages_async
+from benchmarks.stub_server import render_page
+
+
+async def run_grants(scheduler: FairScheduler, requests: list[str], hold: float = 0.001) -> list[str]:
+    """requests の順に取得枠を要求し、割り当てられた順のユーザーを返す"""
+    order = []
+    
+    async def work(user_id: str):
+        async with scheduler.slot(user_id):
+            order.append(user_id)
+            await asyncio.sleep(hold)
+    
+    await asyncio.gather(*[work(user_id) for user_id in requests])
+    return order
+
+
+def test_parse_weights():
+    assert parse_weights("user-a:2, user-b:0.5,invalid") == {"user-a": 2.0, "user-b": 0.5}
+
+
+class TestFairScheduler:
+    """FairScheduler のテスト"""
+    
+    def test_round_robin(self):
+        """先に大量に積んだユーザーがいても、後から来たユーザーと交互に割り当てる"""
+        scheduler = FairScheduler(capacity=1, per_user_inflight=1, max_queued=100, weights={})
+        
+        order = asyncio.run(run_grants(scheduler, ["big"] * 5 + ["small"] * 2))
+        
+        assert order[:5] == ["big", "small", "big", "small", "big"]
+        assert scheduler.snapshot()["active"] == 0
+    
+    def test_weighted(self):
+        """重みの比率で割り当てる"""
+        scheduler = FairScheduler(capacity=1, per_user_inflight=1, max_queued=100, weights={"a": 2.0})
+        
+        order = asyncio.run(run_grants(scheduler, ["a"] * 6 + ["b"] * 6))
+        
+        assert order[:9].count("a") == 6
+        assert order[:9].count("b") == 3
+    
+    def test_per_user_inflight_limit(self):
+        """1ユーザーの同時取得数は上限まで"""
+        scheduler = FairScheduler(capacity=4, per_user_inflight=2, max_queued=100, weights={})
+        peak = 0
+        
+        async def work():
+            nonlocal peak
+            async with scheduler.slot("user"):
+                peak = max(peak, scheduler.snapshot()["users"]["user"]["in_flight"])
+                await asyncio.sleep(0.001)
+        
+        async def main():
+            await asyncio.gather(*[work() for _ in range(6)])
+        
+        asyncio.run(main())
+        
+        assert peak == 2
+    
+    def test_cancelled_waiter_leaves_queue(self):
+        scheduler = FairScheduler(capacity=1, per_user_inflight=1, max_queued=100, weights={})
+        
+        async def main():
+            await scheduler.acquire("a")
+            waiter = asyncio.create_task(scheduler.acquire("b"))
+            await asyncio.sleep(0)
+            assert scheduler.queued == 1
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            assert scheduler.queued == 0
+            scheduler.release("a")
+            await scheduler.acquire("c")
+        
+        asyncio.run(main())
+        
+        assert scheduler.snapshot()["users"] == {"c": {"in_flight": 1, "queued": 0}}
+    
+    def test_saturated(self):
+        scheduler = FairScheduler(capacity=1, per_user_inflight=1, max_queued=2, weights={})
+        
+        async def main():
+            await scheduler.acquire("a")
+            waiters = [asyncio.create_task(scheduler.acquire("a")) for _ in range(2)]
+            await asyncio.sleep(0)
+            saturated = scheduler.is_saturated()
+            for waiter in waiters:
+                waiter.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+            return saturated
+        
+        assert asyncio.run(main()) is True
+        assert scheduler.is_saturated() is False
+
+
+def test_small_scrape_not_starved(monkeypatch):
+    """大きな分析の実行中に始めた小さな分析が、大きな分析の残りページを待たない"""
+    monkeypatch.setattr(fair_scheduler, "FAIR_CAPACITY", 2)
+    monkeypatch.setattr(fair_scheduler, "FAIR_PER_USER_INFLIGHT", 2)
+    requested = []
+    
+    async def handler(request: httpx.Request) -> httpx.Response:
+        match = re.search(r'/PN(\d+)/', request.url.path)
+        page = int(match.group(1)) if match else 1
+        requested.append((request.url.path.split("/")[1], page))
+        await asyncio.sleep(0.005)
+        return httpx.Response(200, text=render_page(page, 20, 2))
+    
+    async def main():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        big = asyncio.create_task(scrape_multiple_pages_async(
+            "https://beauty.hotpepper.jp/big/", 20, concurrency=10, client=client, user_id="big", cache_mode="bypass"
+        ))
+        await asyncio.sleep(0.02)
+        small = await scrape_multiple_pages_async(
+            "https://beauty.hotpepper.jp/small/", 2, concurrency=10, client=client, user_id="small", cache_mode="bypass"
+        )
+        big_done = big.done()
+        await big
+        return small, big_done
+    
+    small, big_done = asyncio.run(main())
+    
+    assert len(small[0]) == 4
+    assert not big_done
+    small_last = max(i for i, (area, _) in enumerate(requested) if area == "small")
+    # 小さな分析の2ページは、大きな分析の残りより先に取得される
+    assert sum(1 for area, _ in requested[small_last:] if area == "big") > 5
+
+
+def test_analyze_rejected_when_saturated():
+    """取得待ちが上限に達している間は503"""
+    from main import app
+    client = TestClient(app)
+    
+    with patch("routers.analysis.is_scheduler_saturated", return_value=True):
+        response = client.post(
+            "/api/analyze",
+            json={"url": "https://beauty.hotpepper.jp/test"},
+            headers={"X-User-Id": "test-user-id"}
+        )
+    
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "10"
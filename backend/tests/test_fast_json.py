@@ -0,0 +1,35 @@
+"""
+JSONシリアライズモジュールのテスト
+"""
+
+import json
+
+import fast_json
+from fast_json import dumps, FastJSONResponse
+from scraper import SalonData, json_default
+
+
+SALON = SalonData("サロンA", "https://beauty.hotpepper.jp/slnH000000001/", 1, 10, (5000, 8000), 5000, 8000, 6500.0)
+DATA = {"type": "salons", "page": 1, "salons": [SALON], "total_pages": None}
+
+
+def expected() -> bytes:
+    return json.dumps(DATA, ensure_ascii=False, separators=(",", ":"), default=json_default).encode("utf-8")
+
+
+def test_dumps_matches_stdlib():
+    assert json.loads(dumps(DATA, default=json_default)) == json.loads(expected())
+
+
+def test_stdlib_fallback(monkeypatch):
+    """orjson がない環境でも同じ形式で出力する"""
+    monkeypatch.setattr(fast_json, "orjson", None)
+    
+    assert dumps(DATA, default=json_default) == expected()
+
+
+def test_response_passes_bytes_through():
+    body = '{"id":"h1"}'.encode("utf-8")
+    
+    assert FastJSONResponse(body).body is body
+    assert FastJSONResponse({"id": "h1"}).body == body
@@ -0,0 +1,139 @@
+"""
+履歴キャッシュモジュールのテスト
+"""
+
+import json
+import pytest
+from unittest.mock import patch, MagicMock
+
+import fast_json
+from history_cache import HistoryCache, estimate_size
+from tests.test_columnar import make_history
+from database import get_search_history_by_id, get_search_history_json, delete_search_history
+
+
+HISTORY = {"id": "h1", "raw_data": [{"name": "サロンA", "average_price": 5000}]}
+
+
+class TestHistoryCache:
+    """HistoryCache のテスト"""
+    
+    def test_hit_and_miss(self):
+        cache = HistoryCache()
+        
+        assert cache.get("h1") is None
+        cache.put("h1", HISTORY)
+        assert cache.get("h1") == HISTORY
+        
+        snapshot = cache.snapshot()
+        assert snapshot["hits"] == 1
+        assert snapshot["misses"] == 1
+        assert snapshot["hit_rate"] == 0.5
+        assert snapshot["size_bytes"] == estimate_size(HISTORY)
+    
+    def test_lru_eviction_by_bytes(self):
+        size = estimate_size({"id": "a"})
+        cache = HistoryCache(max_bytes=size * 2)
+        cache.put("a", {"id": "a"})
+        cache.put("b", {"id": "b"})
+        cache.get("a")
+        cache.put("c", {"id": "c"})
+        
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.snapshot()["size_bytes"] == size * 2
+        assert cache.stats["evictions"] == 1
+    
+    def test_oversized_entry_not_stored(self):
+        cache = HistoryCache(max_bytes=10)
+        cache.put("h1", HISTORY)
+        
+        assert cache.snapshot()["entries"] == 0
+    
+    def test_ttl_expiry(self):
+        cache = HistoryCache(ttl=0)
+        cache.put("h1", HISTORY)
+        
+        assert cache.get("h1") is None
+        assert cache.snapshot()["size_bytes"] == 0
+    
+    def test_serialized_once(self):
+        """登録時にシリアライズしたJSONをそのまま返す"""
+        cache = HistoryCache()
+        body = cache.put("h1", HISTORY)
+        
+        assert json.loads(body) == HISTORY
+        assert cache.get_bytes("h1") is body
+        assert cache.get("h1") == HISTORY
+    
+    def test_only_bytes_retained(self):
+        """辞書は保持せず、取得のたびにJSONから作る（サイズは保持するバイト列の合計）"""
+        cache = HistoryCache()
+        cache.put("h1", HISTORY)
+        
+        first = cache.get("h1")
+        first["raw_data"].clear()
+        
+        assert cache.get("h1") == HISTORY
+        assert cache.snapshot()["size_bytes"] == estimate_size(HISTORY)
+    
+    def test_decoded_from_columnar(self):
+        """列形式だけを保持している場合も履歴データと通常のJSONを返す"""
+        history = make_history(3)
+        cache = HistoryCache()
+        cache.put("h1", history, "columnar")
+        
+        assert cache.get("h1") == history
+        assert json.loads(cache.get_bytes("h1")) == history
+    
+    def test_invalidate(self):
+        cache = HistoryCache()
+        cache.put("h1", HISTORY)
+        cache.invalidate("h1")
+        
+        assert cache.get("h1") is None
+        assert cache.snapshot()["size_bytes"] == 0
+
+
+class TestDatabaseIntegration:
+    """database モジュールからの利用のテスト"""
+    
+    def make_client(self):
+        client = MagicMock()
+        table = client.table.return_value
+        table.select.return_value.eq.return_value.single.return_value.execute.return_value.data = HISTORY
+        table.delete.return_value.eq.return_value.eq.return_value.execute.return_value.data = [HISTORY]
+        return client
+    
+    def test_second_read_served_from_cache(self, isolated_history_cache):
+        client = self.make_client()
+        with patch("database.get_supabase_client", return_value=client):
+            first = get_search_history_by_id("h1")
+            second = get_search_history_by_id("h1")
+        
+        assert first == second == HISTORY
+        assert client.table.return_value.select.call_count == 1
+        assert isolated_history_cache.stats["hits"] == 1
+    
+    def test_json_served_from_cache(self, isolated_history_cache):
+        client = self.make_client()
+        with patch("database.get_supabase_client", return_value=client), \
+                patch("history_cache.dumps", wraps=fast_json.dumps) as dumps:
+            first = get_search_history_json("h1")
+            second = get_search_history_json("h1")
+            get_search_history_by_id("h1")
+        
+        assert json.loads(first) == HISTORY
+        assert second is first
+        assert dumps.call_count == 1
+        assert client.table.return_value.select.call_count == 1
+    
+    def test_delete_invalidates(self, isolated_history_cache):
+        client = self.make_client()
+        with patch("database.get_supabase_client", return_value=client):
+            get_search_history_by_id("h1")
+            assert delete_search_history("h1", "user-1") is True
+            get_search_history_by_id("h1")
+        
+        assert client.table.return_value.select.call_count == 2
+        assert isolated_history_cache.stats["invalidations"] == 1
@@ -0,0 +1,230 @@
+"""
+検索履歴のストリーミング保存のテスト
+"""
+
+import asyncio
+import threading
+import pytest
+from unittest.mock import patch
+
+import jobs
+import history_stream
+from history_stream import HistoryStreamWriter, read_ahead_pages
+from scraper import iter_pages_async, SalonData
+from job_store import JobStore
+from worker import run_durable_job
+from tests.test_scraper_pages import make_client
+
+
+URL = "https://beauty.hotpepper.jp/genre/kgkw094/"
+
+
+def make_salons(page: int, count: int = 20) -> list[SalonData]:
+    return [SalonData(f"サロン{page}-{i}", "", 0, 0, (5000,), 5000, 5000, 5000.0) for i in range(count)]
+
+
+@pytest.fixture
+def storage():
+    """追記・確定・削除を記録する偽の保存先"""
+    calls = {"chunks": [], "finalized": [], "discarded": []}
+    
+    def append(stream_id, chunks):
+        calls["chunks"].append((stream_id, chunks))
+    
+    def finalize(stream_id, user_id, target_url, title):
+        calls["finalized"].append((stream_id, user_id, target_url, title))
+        return {"id": "history-1", "created_at": "2026-01-01T00:00:00+00:00"}
+    
+    def discard(stream_id):
+        calls["discarded"].append(stream_id)
+    
+    with patch("history_stream.append_history_chunks", side_effect=append), \
+            patch("history_stream.finalize_history_stream", side_effect=finalize), \
+            patch("history_stream.discard_history_stream", side_effect=discard):
+        yield calls
+
+
+def appended_names(calls) -> list[str]:
+    return [salon["name"] for _, chunks in calls["chunks"] for _, salons in chunks for salon in salons]
+
+
+class TestHistoryStreamWriter:
+    """追記待ちのサロン数の上限のテスト"""
+    
+    def test_window_bounds_buffer(self, storage):
+        writer = HistoryStreamWriter("stream-1", window=200)
+        
+        async def run():
+            for page in range(1, 16):
+                await writer.add_page(page, make_salons(page))
+            return await writer.finish("user-1", URL, "タイトル")
+        
+        saved = asyncio.run(run())
+        
+        assert saved["id"] == "history-1"
+        assert writer.salon_count == 300
+        # 先読みの分（5ページ = 100件）を除いた100件が追記待ちの上限
+        assert writer.buffer_limit == 100
+        assert writer.peak_buffered <= 100
+        assert all(sum(len(salons) for _, salons in chunks) <= 100 for _, chunks in storage["chunks"])
+        # ページ番号ごとに、ページ順に追記する
+        pages = [page for _, chunks in storage["chunks"] for page, _ in chunks]
+        assert pages == list(range(1, 16))
+        assert storage["finalized"] == [("stream-1", "user-1", URL, "タイトル")]
+    
+    def test_read_ahead_pages(self):
+        assert read_ahead_pages(200) == 5
+        assert read_ahead_pages(10) == 1
+    
+    def test_discard_while_finalizing_is_noop(self, storage):
+        """確定の途中でキャンセルされた場合、スレッドで続く確定と競合しないよう削除しない"""
+        writer = HistoryStreamWriter("stream-1")
+        finalizing = threading.Event()
+        release = threading.Event()
+        
+        def finalize(*args):
+            finalizing.set()
+            release.wait(5)
+            return {"id": "history-1"}
+        
+        async def run():
+            await writer.add_page(1, make_salons(1))
+            task = asyncio.create_task(writer.finish("user-1", URL))
+            await asyncio.to_thread(finalizing.wait, 5)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await writer.discard()
+            release.set()
+        
+        with patch("history_stream.finalize_history_stream", side_effect=finalize):
+            asyncio.run(run())
+        
+        assert storage["discarded"] == []
+
+
+def test_iter_pages_read_ahead():
+    """max_ahead を指定すると、返したページより先は指定ページ数までしか取得しない"""
+    requested = []
+    ahead = []
+    
+    async def run():
+        async for page, _ in iter_pages_async(
+            URL, 20, concurrency=10, client=make_client(pages=20, requested=requested), max_ahead=2
+        ):
+            await asyncio.sleep(0.01)
+            ahead.append(max(requested) - page)
+    
+    asyncio.run(run())
+    
+    assert sorted(requested) == list(range(1, 21))
+    assert max(ahead) <= 2
+
+
+class TestStreamingJob:
+    """ストリーミング保存で実行するジョブのテスト"""
+    
+    @pytest.fixture(autouse=True)
+    def enable(self, monkeypatch):
+        monkeypatch.setattr(history_stream, "STREAM_SAVE_ENABLED", True)
+        monkeypatch.setattr(history_stream, "STREAM_SAVE_MIN_PAGES", 10)
+        monkeypatch.setattr(history_stream, "STREAM_SAVE_WINDOW", 100)
+    
+    def test_large_job_streams(self, storage):
+        job = jobs.create_job("user-1", URL, 30)
+        with patch("scraper.get_http_client", return_value=make_client(pages=30, salons_per_page=20)), \
+                patch("jobs.save_search_history") as save:
+            asyncio.run(jobs.run_job(job.id))
+        
+        save.assert_not_called()
+        assert job.status == "completed"
+        assert job.history_id == "history-1"
+        assert job.salon_count == 600
+        assert job.pages_done == 30
+        assert len(appended_names(storage)) == len(set(appended_names(storage))) == 600
+        assert len(storage["chunks"]) > 1
+        assert storage["finalized"][0][1:3] == ("user-1", URL)
+    
+    def test_small_job_saves_at_once(self, storage):
+        job = jobs.create_job("user-1", URL, 5)
+        with patch("scraper.get_http_client", return_value=make_client(pages=5)), \
+                patch("jobs.save_search_history", return_value={"id": "history-1"}) as save:
+            asyncio.run(jobs.run_job(job.id))
+        
+        assert job.status == "completed"
+        assert len(save.call_args.kwargs["raw_data"]) == 15
+        assert storage["chunks"] == []
+    
+    def test_failed_job_discards(self, storage):
+        job = jobs.create_job("user-1", URL, 30)
+        with patch("scraper.get_http_client", return_value=make_client(pages=30, salons_per_page=20)), \
+                patch("history_stream.finalize_history_stream", side_effect=RuntimeError("boom")):
+            asyncio.run(jobs.run_job(job.id))
+        
+        assert job.status == "failed"
+        assert storage["discarded"] == [storage["chunks"][0][0]]
+    
+    def test_cancelled_job_discards(self, storage):
+        """キャンセルされたジョブ（シャットダウンなど）も追記分を削除する"""
+        job = jobs.create_job("user-1", URL, 30)
+        
+        async def run():
+            task = asyncio.create_task(jobs.run_job(job.id))
+            while not storage["chunks"]:
+                await asyncio.sleep(0.001)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        
+        with patch("scraper.get_http_client", return_value=make_client(pages=30, salons_per_page=20)):
+            asyncio.run(run())
+        
+        assert storage["discarded"] == [storage["chunks"][0][0]]
+        assert storage["finalized"] == []
+    
+    def test_disconnected_stream_discards(self, storage):
+        """/analyze/stream のクライアントが切断しても追記分を削除する"""
+        from routers.analysis import stream_analysis
+        
+        async def run():
+            events = stream_analysis("user-1", URL, 30)
+            async for _ in events:
+                if storage["chunks"]:
+                    break
+            await events.aclose()
+        
+        with patch("scraper.get_http_client", return_value=make_client(pages=30, salons_per_page=20)):
+            asyncio.run(run())
+        
+        assert storage["discarded"] == [storage["chunks"][0][0]]
+        assert storage["finalized"] == []
+    
+    def test_sweeper_deletes_stale_chunks(self, monkeypatch):
+        """確定も削除もされなかった追記分を STREAM_CHUNK_TTL ごとに削除する"""
+        ages = []
+        
+        async def run():
+            with patch("history_stream.delete_stale_history_chunks", side_effect=lambda age: ages.append(age) or 0):
+                task = history_stream.start_chunk_sweeper()
+                await asyncio.sleep(0.01)
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        
+        asyncio.run(run())
+        
+        assert ages == [history_stream.STREAM_CHUNK_TTL]
+        monkeypatch.setattr(history_stream, "STREAM_SAVE_ENABLED", False)
+        assert history_stream.start_chunk_sweeper() is None
+    
+    def test_durable_job_resumes_with_job_id(self, storage, tmp_path):
+        """永続ジョブはジョブIDを stream_id にして追記する（再開時は同じページを上書き）"""
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        store.enqueue(jobs.ScrapeJob(id="job-1", user_id="user-1", target_url=URL, max_pages=30).to_dict())
+        job = jobs.ScrapeJob(**store.claim("worker-a"))
+        
+        with patch("scraper.get_http_client", return_value=make_client(pages=30, salons_per_page=20)), \
+                patch("worker.save_search_history") as save:
+            asyncio.run(run_durable_job(store, job, "worker-a"))
+        
+        save.assert_not_called()
+        assert {stream_id for stream_id, _ in storage["chunks"]} == {"job-1"}
+        assert store.get("job-1")["status"] == "completed"
+        assert store.get("job-1")["salon_count"] == 600
@@ -0,0 +1,57 @@
+"""
+共有HTTPクライアントのテスト
+"""
+
+import asyncio
+import httpx
+
+import http_client
+from http_client import get_http_client, get_sync_http_client, timed_get, get_recent_timings, get_timing_summary
+from benchmarks.stub_server import StubServer
+
+
+def test_async_client_shared_within_loop():
+    """同じイベントループ内では同じクライアントを返す"""
+    async def get_twice():
+        return get_http_client(), get_http_client()
+    
+    first, second = asyncio.run(get_twice())
+    
+    assert first is second
+
+
+def test_async_client_recreated_for_new_loop():
+    """イベントループが変わるとクライアントを作り直す"""
+    async def get_one():
+        return get_http_client()
+    
+    assert asyncio.run(get_one()) is not asyncio.run(get_one())
+
+
+def test_sync_client_singleton():
+    """同期クライアントはシングルトン"""
+    assert get_sync_http_client() is get_sync_http_client()
+
+
+def test_timed_get_records_connection_reuse():
+    """2回目以降のリクエストは接続を再利用し、通信時間が記録される"""
+    http_client._timings.clear()
+    
+    async def fetch_pages(url):
+        async with httpx.AsyncClient() as client:
+            for _ in range(3):
+                response = await timed_get(client, url)
+                assert response.status_code == 200
+    
+    with StubServer(pages=1) as stub:
+        asyncio.run(fetch_pages(stub.base_url))
+    
+    timings = get_recent_timings()
+    assert len(timings) == 3
+    assert [t["connection_reused"] for t in timings] == [True, True, False]
+    assert timings[-1]["connect_ms"] > 0
+    assert all(t["ttfb_ms"] > 0 for t in timings)
+    
+    summary = get_timing_summary()
+    assert summary["requests"] == 3
+    assert summary["connection_reuse_rate"] == round(2 / 3, 3)
@@ -0,0 +1,211 @@
+"""
+永続ジョブキューとワーカーのテスト
+"""
+
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import patch
+
+import jobs
+import job_store
+from job_store import JobStore, encode_page, decode_page
+from archive import PageArchive
+from scraper import parse_hpb_page
+from worker import run_durable_job
+from benchmarks.stub_server import render_page
+from tests.test_scraper_pages import make_client
+
+
+URL = "https://beauty.hotpepper.jp/genre/kgkw094/"
+
+
+def make_job(**fields) -> jobs.ScrapeJob:
+    fields.setdefault("id", "job-1")
+    fields.setdefault("created_at", 1.0)
+    return jobs.ScrapeJob(user_id="user-1", target_url=URL, max_pages=5, **fields)
+
+
+@pytest.fixture
+def store(tmp_path) -> JobStore:
+    return JobStore(str(tmp_path / "jobs.sqlite3"), lease_seconds=60, max_attempts=3)
+
+
+def test_page_round_trip():
+    result = parse_hpb_page(render_page(2, 5, 3))
+    
+    assert decode_page(encode_page(result)) == result
+
+
+class TestJobStore:
+    """JobStore のテスト"""
+    
+    def test_claim_once(self, store):
+        """同じジョブを複数のワーカーが占有しない"""
+        store.enqueue(make_job().to_dict())
+        
+        first = store.claim("worker-a")
+        
+        assert first["id"] == "job-1"
+        assert first["status"] == "running"
+        assert store.claim("worker-b") is None
+    
+    def test_claim_oldest_first(self, store):
+        store.enqueue(make_job(id="job-new", created_at=2.0).to_dict())
+        store.enqueue(make_job(id="job-old", created_at=1.0).to_dict())
+        
+        assert store.claim("worker-a")["id"] == "job-old"
+        assert store.claim("worker-a")["id"] == "job-new"
+    
+    def test_expired_lease_is_taken_over(self, store):
+        """占有期限の切れたジョブは別のワーカーが引き継ぎ、元のワーカーは書き込めない"""
+        store.lease_seconds = -1
+        store.enqueue(make_job().to_dict())
+        store.claim("worker-a")
+        
+        assert store.claim("worker-b")["id"] == "job-1"
+        assert not store.checkpoint("job-1", "worker-a", 1, 5)
+        assert store.checkpoint("job-1", "worker-b", 1, 5)
+    
+    def test_max_attempts(self, store):
+        """実行回数の上限に達したジョブは失敗にする"""
+        store.lease_seconds = -1
+        store.max_attempts = 2
+        store.enqueue(make_job().to_dict())
+        store.claim("worker-a")
+        store.claim("worker-b")
+        
+        assert store.claim("worker-c") is None
+        job = store.get("job-1")
+        assert job["status"] == "failed"
+        assert job["error"]
+    
+    def test_checkpoint_and_finish(self, store):
+        store.enqueue(make_job().to_dict())
+        store.claim("worker-a")
+        result = parse_hpb_page(render_page(1, 5, 3))
+        
+        assert store.checkpoint("job-1", "worker-a", 1, 5, page=1, result=result)
+        assert store.load_pages("job-1") == {1: result}
+        assert store.get("job-1")["pages_done"] == 1
+        
+        finished = make_job(status="completed", pages_done=5, total_pages=5, salon_count=15,
+                            history_id="history-1", finished_at=time.time())
+        assert store.finish(finished.to_dict(), "worker-a")
+        assert store.get("job-1") == finished.to_dict()
+        assert store.load_pages("job-1") == {}
+        assert store.counts() == {"completed": 1}
+    
+    def test_cleanup(self, store):
+        store.enqueue(make_job(status="completed", finished_at=time.time() - 100).to_dict())
+        store.enqueue(make_job(id="job-2").to_dict())
+        
+        assert store.cleanup(retention_seconds=10) == 1
+        assert store.get("job-1") is None
+        assert store.get("job-2") is not None
+
+
+class TestDurableJob:
+    """ワーカーでのジョブ実行のテスト"""
+    
+    def run(self, store, worker_id, client):
+        job = jobs.ScrapeJob(**store.claim(worker_id))
+        with patch("scraper.get_http_client", return_value=client), \
+                patch("worker.save_search_history", return_value={"id": "history-1"}) as save:
+            asyncio.run(run_durable_job(store, job, worker_id))
+        return save
+    
+    def test_run_to_completion(self, store):
+        store.enqueue(make_job().to_dict())
+        
+        save = self.run(store, "worker-a", make_client(pages=5))
+        
+        job = store.get("job-1")
+        assert job["status"] == "completed"
+        assert job["history_id"] == "history-1"
+        assert job["salon_count"] == 15
+        assert job["pages_done"] == 5
+        assert len(save.call_args.kwargs["raw_data"]) == 15
+    
+    def test_resume_from_checkpoint(self, store):
+        """落ちたワーカーのチェックポイント済みページは取得し直さない"""
+        store.lease_seconds = -1
+        store.enqueue(make_job().to_dict())
+        store.claim("worker-a")
+        for page in (1, 2, 4):
+            store.checkpoint("job-1", "worker-a", page, 5, page=page, result=parse_hpb_page(render_page(page, 5, 3)))
+        store.lease_seconds = 60
+        
+        requested = []
+        save = self.run(store, "worker-b", make_client(pages=5, requested=requested))
+        
+        assert sorted(requested) == [3, 5]
+        job = store.get("job-1")
+        assert job["status"] == "completed"
+        assert job["pages_done"] == 5
+        names = [salon["name"] for salon in save.call_args.kwargs["raw_data"]]
+        assert len(names) == len(set(names)) == 15
+    
+    def test_lost_lease_does_not_save(self, store):
+        """占有を失ったワーカーは履歴を保存しない"""
+        store.enqueue(make_job().to_dict())
+        store.claim("worker-a")
+        job = jobs.ScrapeJob(**store.get("job-1"))
+        
+        with patch("scraper.get_http_client", return_value=make_client(pages=5)), \
+                patch("worker.save_search_history") as save:
+            asyncio.run(run_durable_job(store, job, "worker-b"))
+        
+        save.assert_not_called()
+        assert store.get("job-1")["status"] == "running"
+    
+    def test_checkpoint_runs_off_event_loop(self, store):
+        """SQLiteへのチェックポイントはイベントループのスレッドで実行しない"""
+        store.enqueue(make_job().to_dict())
+        threads = []
+        checkpoint = store.checkpoint
+        
+        def record_thread(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return checkpoint(*args, **kwargs)
+        
+        with patch.object(store, "checkpoint", side_effect=record_thread):
+            self.run(store, "worker-a", make_client(pages=5))
+        
+        assert len(threads) == 5
+        assert threading.main_thread() not in threads
+        assert store.get("job-1")["pages_done"] == 5
+    
+    def test_records_archive(self, store, tmp_path):
+        """アーカイブが有効なら永続ジョブでもページを記録する"""
+        store.enqueue(make_job().to_dict())
+        page_archive = PageArchive(str(tmp_path / "archive"))
+        
+        with patch("archive.get_page_archive", return_value=page_archive):
+            self.run(store, "worker-a", make_client(pages=5))
+        
+        manifest = page_archive.load_manifest("history-1")
+        assert [entry["page"] for entry in manifest["pages"]] == [1, 2, 3, 4, 5]
+
+
+def test_api_enqueues_durable_job(store, monkeypatch):
+    """永続ジョブキューが有効なら、APIはキューに登録して状態をキューから返す"""
+    from fastapi.testclient import TestClient
+    from main import app
+    
+    monkeypatch.setattr(job_store, "DURABLE_JOBS_ENABLED", True)
+    monkeypatch.setattr(job_store, "_job_store", store)
+    client = TestClient(app)
+    
+    with patch("jobs.scrape_multiple_pages_async") as scrape:
+        response = client.post("/api/analyze", json={"url": URL}, headers={"X-User-Id": "user-1"})
+    
+    assert response.status_code == 202
+    scrape.assert_not_called()
+    job_id = response.json()["job_id"]
+    assert job_id not in jobs._jobs
+    
+    response = client.get(f"/api/jobs/{job_id}", headers={"X-User-Id": "user-1"})
+    assert response.json()["status"] == "pending"
+    assert store.claim("worker-a")["id"] == job_id
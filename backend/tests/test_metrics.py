@@ -0,0 +1,93 @@
+"""
+メトリクスモジュールのテスト
+"""
+
+import asyncio
+import re
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from metrics import Counter, Histogram, span, reset_metrics, STAGE_SECONDS, STAGE_ERRORS, UPSTREAM_RESPONSES
+from scraper import scrape_multiple_pages_async
+from benchmarks.stub_server import render_page
+from main import app
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    reset_metrics()
+    yield
+    reset_metrics()
+
+
+class TestMetricTypes:
+    """カウンタ・ヒストグラムのテスト"""
+    
+    def test_counter_render(self):
+        counter = Counter("test_total", "Test counter", ("status",))
+        counter.inc(status=200)
+        counter.inc(2, status=200)
+        counter.inc(status='a"b')
+        
+        assert counter.render() == [
+            "# HELP test_total Test counter",
+            "# TYPE test_total counter",
+            'test_total{status="200"} 3',
+            'test_total{status="a\\"b"} 1',
+        ]
+    
+    def test_histogram_cumulative_buckets(self):
+        histogram = Histogram("test_seconds", "Test histogram", ("stage",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value, stage="x")
+        
+        lines = histogram.render()[2:]
+        
+        assert lines == [
+            'test_seconds_bucket{stage="x",le="0.1"} 1',
+            'test_seconds_bucket{stage="x",le="1"} 3',
+            'test_seconds_bucket{stage="x",le="+Inf"} 4',
+            'test_seconds_sum{stage="x"} 6.05',
+            'test_seconds_count{stage="x"} 4',
+        ]
+    
+    def test_span_records_errors(self):
+        with pytest.raises(ValueError):
+            with span("test_stage"):
+                raise ValueError("boom")
+        
+        assert STAGE_SECONDS.snapshot(stage="test_stage")["count"] == 1
+        assert STAGE_ERRORS.value(stage="test_stage") == 1
+
+
+class TestInstrumentation:
+    """スクレイピングの各段階の計測のテスト"""
+    
+    def test_scrape_stages(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            match = re.search(r'/PN(\d+)/', request.url.path)
+            page = int(match.group(1)) if match else 1
+            return httpx.Response(200, text=render_page(page, 2, 3))
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        asyncio.run(scrape_multiple_pages_async(
+            "https://beauty.hotpepper.jp/genre/kgkw094/", 5, client=client, cache_mode="bypass"
+        ))
+        
+        assert STAGE_SECONDS.snapshot(stage="fetch")["count"] == 2
+        assert STAGE_SECONDS.snapshot(stage="parse_page")["count"] == 2
+        assert STAGE_SECONDS.snapshot(stage="parse_card")["count"] == 6
+        assert STAGE_SECONDS.snapshot(stage="dedupe")["count"] == 2
+        assert UPSTREAM_RESPONSES.value(status=200) == 2
+
+
+def test_metrics_endpoint():
+    client = TestClient(app)
+    client.get("/health")
+    
+    response = client.get("/metrics")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'hpb_http_request_duration_seconds_count{method="GET",route="/health",status="200"} 1' in response.text
@@ -0,0 +1,128 @@
+"""
+ページキャッシュのテスト
+"""
+
+import time
+import asyncio
+import httpx
+import pytest
+
+from page_cache import PageCache, normalize_url
+from scraper import fetch_page_html
+from benchmarks.stub_server import render_page
+
+
+URL = "https://beauty.hotpepper.jp/genre/kgkw094/"
+
+
+class TestNormalizeUrl:
+    """URL正規化のテスト"""
+    
+    def test_host_case_and_trailing_slash(self):
+        assert normalize_url("HTTPS://Beauty.Hotpepper.jp/genre/kgkw094") == "https://beauty.hotpepper.jp/genre/kgkw094/"
+    
+    def test_sort_query_and_drop_fragment(self):
+        assert normalize_url("https://beauty.hotpepper.jp/genre/?b=2&a=1#top") == "https://beauty.hotpepper.jp/genre/?a=1&b=2"
+    
+    def test_drop_default_port(self):
+        assert normalize_url("https://beauty.hotpepper.jp:443/genre/") == "https://beauty.hotpepper.jp/genre/"
+
+
+class TestPageCache:
+    """ディスクキャッシュのテスト"""
+    
+    def test_put_and_get(self, tmp_path):
+        cache = PageCache(str(tmp_path))
+        cache.put(URL, "本文".encode("utf-8"), etag='"abc"')
+        
+        entry = cache.get(URL.rstrip("/"))
+        
+        assert entry.body == "本文".encode("utf-8")
+        assert entry.etag == '"abc"'
+    
+    def test_lru_eviction(self, tmp_path):
+        """サイズ上限を超えると最も使われていないエントリから削除"""
+        body = bytes(range(256)) * 40  # 圧縮が効きにくい本文
+        cache = PageCache(str(tmp_path))
+        cache.put(f"{URL}PN1/", body)
+        cache.max_bytes = cache.size_bytes() * 2 + 10
+        cache.put(f"{URL}PN2/", body)
+        cache.get(f"{URL}PN1/")
+        cache.put(f"{URL}PN3/", body)
+        
+        assert cache.get(f"{URL}PN1/") is not None
+        assert cache.get(f"{URL}PN2/") is None
+        assert cache.get(f"{URL}PN3/") is not None
+        assert cache.stats["evictions"] == 1
+    
+    def test_index_survives_restart(self, tmp_path):
+        """プロセス再起動後もディスクのエントリを利用"""
+        PageCache(str(tmp_path)).put(URL, b"cached")
+        
+        assert PageCache(str(tmp_path)).get(URL).body == b"cached"
+    
+    def test_pinned_entry_fresh_until(self, tmp_path):
+        """pin したエントリは ttl を過ぎても指定時刻まで再検証しない"""
+        cache = PageCache(str(tmp_path), ttl=0)
+        cache.put(URL, b"cached")
+        
+        assert not cache.get(URL).is_fresh(cache.ttl)
+        assert cache.pin(URL, time.time() + 60)
+        assert cache.get(URL).is_fresh(cache.ttl)
+        assert cache.pin(URL, time.time() - 1)
+        assert not cache.get(URL).is_fresh(cache.ttl)
+        assert not cache.pin(f"{URL}PN2/", time.time() + 60)
+
+
+class TestFetchPageHtmlCache:
+    """fetch_page_html のキャッシュ利用のテスト"""
+    
+    @staticmethod
+    def make_client(requests: list, etag: str = '"v1"'):
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(dict(request.headers))
+            if request.headers.get("If-None-Match") == etag:
+                return httpx.Response(304)
+            return httpx.Response(200, text=render_page(1, 1, 2), headers={"ETag": etag})
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    
+    def test_fresh_entry_skips_network(self):
+        requests = []
+        client = self.make_client(requests)
+        
+        first = asyncio.run(fetch_page_html(client, URL))
+        second = asyncio.run(fetch_page_html(client, URL))
+        
+        assert first == second
+        assert len(requests) == 1
+    
+    def test_stale_entry_revalidates(self, isolated_page_cache):
+        requests = []
+        client = self.make_client(requests)
+        asyncio.run(fetch_page_html(client, URL))
+        isolated_page_cache.ttl = 0
+        
+        html = asyncio.run(fetch_page_html(client, URL))
+        
+        assert "スタブサロン1" in html
+        assert requests[-1]["if-none-match"] == '"v1"'
+        assert isolated_page_cache.stats["revalidated"] == 1
+    
+    @pytest.mark.parametrize("mode", ["refresh", "bypass"])
+    def test_refresh_and_bypass_fetch(self, mode):
+        requests = []
+        client = self.make_client(requests)
+        asyncio.run(fetch_page_html(client, URL))
+        
+        asyncio.run(fetch_page_html(client, URL, cache_mode=mode))
+        
+        assert len(requests) == 2
+        assert "if-none-match" not in requests[-1]
+    
+    def test_error_response_not_cached(self, isolated_page_cache):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(503)))
+        
+        with pytest.raises(ValueError):
+            asyncio.run(fetch_page_html(client, URL))
+        
+        assert isolated_page_cache.get(URL) is None
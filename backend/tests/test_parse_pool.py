@@ -0,0 +1,87 @@
+"""
+パース用プロセスプールのテスト
+"""
+
+import asyncio
+import pathlib
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+
+import parse_pool
+from scraper import parse_hpb_page, parse_hpb_page_async
+
+
+FIXTURE_DIR = pathlib.Path(__file__).parent / "fixtures"
+
+
+@pytest.fixture
+def page_html() -> str:
+    return (FIXTURE_DIR / "hpb_search_page1.html").read_text(encoding="utf-8")
+
+
+@pytest.fixture(autouse=True)
+def reset_pool(monkeypatch):
+    """テストごとにプールと実行件数を初期化"""
+    monkeypatch.setattr(parse_pool, "_stats", dict.fromkeys(parse_pool._stats, 0))
+    yield
+    parse_pool.shutdown_parse_pool()
+
+
+class BrokenExecutor:
+    """ワーカーが異常終了したプールの代わり"""
+    
+    def submit(self, fn, *args):
+        raise BrokenProcessPool("worker died")
+    
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+class TestParsePool:
+    """パース用プロセスプールのテスト"""
+    
+    def test_inprocess_by_default(self, monkeypatch, page_html):
+        """ワーカー数0ならプロセス内でパース"""
+        monkeypatch.setattr(parse_pool, "PARSE_WORKERS", 0)
+        
+        result = asyncio.run(parse_hpb_page_async(page_html))
+        
+        assert result == parse_hpb_page(page_html)
+        assert parse_pool.get_parse_pool() is None
+        assert parse_pool.get_parse_pool_stats()["inprocess_tasks"] == 1
+    
+    def test_pool_matches_inprocess(self, monkeypatch, page_html):
+        """ワーカープロセスでのパース結果はプロセス内と同じ"""
+        monkeypatch.setattr(parse_pool, "PARSE_WORKERS", 1)
+        
+        async def main():
+            return await asyncio.gather(*[parse_hpb_page_async(page_html, engine) for engine in ("lxml", "bs4")])
+        
+        results = asyncio.run(main())
+        
+        expected = parse_hpb_page(page_html)
+        assert expected.salons
+        assert results == [expected, expected]
+        assert parse_pool.get_parse_pool_stats()["pool_tasks"] == 2
+    
+    def test_fallback_when_pool_breaks(self, monkeypatch, page_html):
+        """プールが異常終了した場合はプロセス内でパースし、プールを作り直す"""
+        monkeypatch.setattr(parse_pool, "PARSE_WORKERS", 1)
+        monkeypatch.setattr(parse_pool, "_pool", BrokenExecutor())
+        
+        result = asyncio.run(parse_hpb_page_async(page_html))
+        
+        assert result == parse_hpb_page(page_html)
+        stats = parse_pool.get_parse_pool_stats()
+        assert stats["pool_failures"] == 1
+        assert stats["fallbacks"] == 1
+        assert stats["active"] is False
+    
+    def test_no_fallback_raises(self, monkeypatch, page_html):
+        """フォールバックを無効にした場合は例外"""
+        monkeypatch.setattr(parse_pool, "PARSE_WORKERS", 1)
+        monkeypatch.setattr(parse_pool, "PARSE_FALLBACK", False)
+        monkeypatch.setattr(parse_pool, "_pool", BrokenExecutor())
+        
+        with pytest.raises(BrokenProcessPool):
+            asyncio.run(parse_hpb_page_async(page_html))
@@ -0,0 +1,51 @@
+"""
+lxmlパースエンジンとBeautifulSoup版の同等性テスト
+"""
+
+import pathlib
+import pytest
+
+from scraper import parse_hpb_page, parse_hpb_page_bs4, parse_hpb_page_lxml
+from benchmarks.stub_server import render_page
+
+
+FIXTURES = sorted((pathlib.Path(__file__).parent / "fixtures").glob("*.html"))
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda p: p.name)
+def test_fixture_equivalence(path):
+    """保存済みページで両エンジンの結果が一致"""
+    html = path.read_text(encoding="utf-8")
+    
+    expected = parse_hpb_page_bs4(html)
+    actual = parse_hpb_page_lxml(html)
+    
+    assert expected.salons
+    assert repr(actual) == repr(expected)
+
+
+@pytest.mark.parametrize("html", [
+    "",
+    "<html><head><title></title></head><body></body></html>",
+    "<html><head><title>A<!-- x -->B</title></head></html>",
+    "<html><body><p>タイトルなし</p></body></html>",
+    "<ul><li class='searchListCassette'><h3 class='slcHead'><a href='/slnH1/'>サロン<rt>さろん</rt>名</a></h3>"
+    "<p class=' slcCouponPrice\tfs14 '>¥5,500</p></li></ul>",
+], ids=["empty", "empty_title", "title_with_comment", "no_title", "ruby_and_class_whitespace"])
+def test_markup_edge_cases(html):
+    """崩れたマークアップでも両エンジンの結果が一致"""
+    assert repr(parse_hpb_page_lxml(html)) == repr(parse_hpb_page_bs4(html))
+
+
+def test_stub_page_equivalence():
+    """スタブサーバーのページで両エンジンの結果が一致"""
+    html = render_page(2, 5, 20)
+    
+    assert parse_hpb_page_lxml(html) == parse_hpb_page_bs4(html)
+
+
+def test_engine_selection():
+    """engine引数でエンジンを切り替えられる"""
+    html = render_page(1, 1, 3)
+    
+    assert parse_hpb_page(html, engine="bs4") == parse_hpb_page(html, engine="lxml")
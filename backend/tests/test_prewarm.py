@@ -0,0 +1,244 @@
+"""
+プリウォーム（事前スクレイピング）モジュールのテスト
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import jobs
+import prewarm
+from prewarm import (
+    PrewarmStore,
+    PrewarmedResult,
+    parse_window,
+    in_window,
+    seconds_until_hour,
+    select_target_urls,
+    run_prewarm_cycle,
+)
+from scraper import PageResult, SalonData
+from tests.test_scraper_pages import make_client
+
+
+URL = "https://beauty.hotpepper.jp/genre/kgkw094/"
+
+
+def make_salon(name: str) -> SalonData:
+    return SalonData(name, "", 0, 0, (5000,), 5000, 5000, 5000.0)
+
+
+def make_result(pages: int = 3, max_pages: int = 100, complete: bool = True) -> PrewarmedResult:
+    return PrewarmedResult(
+        salon_count=1,
+        max_pages=max_pages,
+        pages=pages,
+        complete=complete,
+        created_at=time.monotonic()
+    )
+
+
+def fake_scrape(pages_by_url: dict[str, int]):
+    """URLごとのページ数だけ on_page を呼び、最後のページで終了する偽のスクレイピング"""
+    async def scrape(url, max_pages, on_page=None, **kwargs):
+        pages = min(pages_by_url[url], max_pages)
+        for page in range(1, pages + 1):
+            has_next = page < pages_by_url[url]
+            on_page(page, PageResult(salons=[make_salon(f"{url}-{page}")], has_next=has_next))
+        return [make_salon(f"{url}-{page}") for page in range(1, pages + 1)], "タイトル"
+    return scrape
+
+
+class TestWindow:
+    """実行時間帯の計算のテスト"""
+    
+    def test_parse_window(self):
+        assert parse_window("3-6") == (3, 6)
+        assert parse_window("23-2") == (23, 2)
+    
+    def test_in_window(self):
+        assert in_window(datetime(2026, 1, 1, 3, 0), (3, 6))
+        assert not in_window(datetime(2026, 1, 1, 6, 0), (3, 6))
+        # 日付をまたぐ時間帯
+        assert in_window(datetime(2026, 1, 1, 1, 30), (23, 2))
+        assert not in_window(datetime(2026, 1, 1, 12, 0), (23, 2))
+    
+    def test_seconds_until_hour(self):
+        assert seconds_until_hour(datetime(2026, 1, 1, 2, 30), 3) == 30 * 60
+        # 過ぎている場合は翌日
+        assert seconds_until_hour(datetime(2026, 1, 1, 3, 0), 3) == 24 * 3600
+
+
+def test_select_target_urls_merges_normalized():
+    counts = [
+        ("https://beauty.hotpepper.jp/genre/kgkw094/pre13/", 3),
+        ("https://beauty.hotpepper.jp/genre/kgkw094/pre14/", 4),
+        ("https://beauty.hotpepper.jp/genre/kgkw094/pre13/?", 2),
+        ("https://beauty.hotpepper.jp/genre/kgkw094/pre27/", 1),
+    ]
+    
+    assert select_target_urls(counts, 2) == [
+        "https://beauty.hotpepper.jp/genre/kgkw094/pre13/",
+        "https://beauty.hotpepper.jp/genre/kgkw094/pre14/",
+    ]
+
+
+class TestPrewarmStore:
+    """取得済み結果の保持のテスト"""
+    
+    URL = "https://beauty.hotpepper.jp/genre/kgkw094/"
+    
+    def test_same_max_pages(self):
+        store = PrewarmStore()
+        store.put(self.URL, make_result(pages=5, max_pages=5, complete=False))
+        
+        assert store.get(self.URL, 5) is not None
+        assert store.get(self.URL, 10) is None
+        assert store.stats["hits"] == 1
+        assert store.stats["misses"] == 1
+    
+    def test_complete_result_serves_larger_limits(self):
+        store = PrewarmStore()
+        store.put(self.URL, make_result(pages=3, max_pages=100))
+        
+        assert store.get(self.URL, 3) is not None
+        assert store.get(self.URL, 50) is not None
+        assert store.get(self.URL, 2) is None
+    
+    def test_expired(self):
+        store = PrewarmStore(ttl=0)
+        store.put(self.URL, make_result())
+        
+        assert store.get(self.URL, 100) is None
+        assert store.snapshot()["entries"] == 0
+
+
+class TestPrewarmCycle:
+    """プリウォームの実行のテスト"""
+    
+    URLS = {
+        "https://beauty.hotpepper.jp/genre/kgkw094/pre13/": 3,
+        "https://beauty.hotpepper.jp/genre/kgkw094/pre14/": 4,
+        "https://beauty.hotpepper.jp/genre/kgkw094/pre27/": 2,
+    }
+    
+    def run_cycle(self, store, **kwargs):
+        with patch("prewarm.get_target_url_counts", return_value=[(url, 1) for url in self.URLS]), \
+                patch("prewarm.scrape_multiple_pages_async", side_effect=fake_scrape(self.URLS)) as scrape:
+            summary = asyncio.run(run_prewarm_cycle(store, **kwargs))
+        return summary, scrape
+    
+    def test_page_budget(self):
+        """ページ数の予算を使い切ったら以降のURLは取得しない"""
+        store = PrewarmStore()
+        
+        summary, scrape = self.run_cycle(store, top_urls=3, page_budget=5, max_pages=100)
+        
+        assert scrape.call_count == 2
+        assert [call.args[1] for call in scrape.call_args_list] == [5, 2]
+        assert summary["pages_fetched"] == 5
+        assert summary["warmed_urls"] == list(self.URLS)[:2]
+        assert all(call.kwargs["cache_mode"] == "refresh" for call in scrape.call_args_list)
+        
+        first = store.get(list(self.URLS)[0], 100)
+        assert first.complete and first.pages == 3
+        # 予算で打ち切ったURLは同じ上限の分析にのみ使う
+        second = store._entries[prewarm.normalize_url(list(self.URLS)[1])]
+        assert not second.complete
+    
+    def test_job_reads_prewarmed_pages_from_page_cache(self, monkeypatch):
+        """プリウォームしたページは分析ジョブがページキャッシュから取得し、HPBにアクセスしない"""
+        store = PrewarmStore()
+        monkeypatch.setattr(prewarm, "_prewarm_store", store)
+        monkeypatch.setattr(prewarm, "PREWARM_ENABLED", True)
+        requested = []
+        
+        async def main():
+            with patch("scraper.get_http_client", return_value=make_client(pages=3, requested=requested)):
+                store.put(URL, await prewarm.prewarm_url(URL, 100))
+                warmed = len(requested)
+                
+                job = jobs.create_job("user-1", URL, 100)
+                with patch("jobs.save_search_history", return_value={"id": "history-1"}) as save:
+                    await jobs.run_job(job.id)
+            return job, warmed, save
+        
+        job, warmed, save = asyncio.run(main())
+        
+        assert len(requested) == warmed
+        assert job.status == "completed"
+        assert job.salon_count == 9
+        assert save.call_args.kwargs["title"]
+        assert store.stats["hits"] == 1
+    
+    def test_refresh_job_fetches_again(self, monkeypatch):
+        """cache_mode が use 以外のジョブはプリウォームしたページを使わない"""
+        store = PrewarmStore()
+        monkeypatch.setattr(prewarm, "_prewarm_store", store)
+        monkeypatch.setattr(prewarm, "PREWARM_ENABLED", True)
+        requested = []
+        
+        async def main():
+            with patch("scraper.get_http_client", return_value=make_client(pages=3, requested=requested)):
+                store.put(URL, await prewarm.prewarm_url(URL, 100))
+                requested.clear()
+                
+                job = jobs.create_job("user-1", URL, 100, cache_mode="refresh")
+                with patch("jobs.save_search_history", return_value={"id": "history-1"}):
+                    await jobs.run_job(job.id)
+            return job
+        
+        job = asyncio.run(main())
+        
+        assert sorted(requested) == [1, 2, 3]
+        assert job.status == "completed"
+        assert store.stats["hits"] == store.stats["misses"] == 0
+    
+    def test_daytime_job_makes_no_upstream_requests(self, monkeypatch, isolated_page_cache):
+        """HPB_CACHE_TTL を過ぎた日中の分析も、プリウォームしたページを再検証せずに使う"""
+        store = PrewarmStore()
+        monkeypatch.setattr(prewarm, "_prewarm_store", store)
+        monkeypatch.setattr(prewarm, "PREWARM_ENABLED", True)
+        requested = []
+        
+        async def main():
+            with patch("scraper.get_http_client", return_value=make_client(pages=3, requested=requested)):
+                store.put(URL, await prewarm.prewarm_url(URL, 100))
+                requested.clear()
+                
+                # 04:00 に取得したページを 12:00 に分析する（HPB_CACHE_TTL の1時間を過ぎている）
+                daytime = time.time() + 8 * 3600
+                job = jobs.create_job("user-1", URL, 100)
+                with patch("page_cache.time", SimpleNamespace(time=lambda: daytime)), \
+                        patch("jobs.save_search_history", return_value={"id": "history-1"}):
+                    await jobs.run_job(job.id)
+            return job
+        
+        job = asyncio.run(main())
+        
+        assert isolated_page_cache.ttl == 3600
+        assert requested == []
+        assert job.status == "completed"
+        assert job.salon_count == 9
+        assert isolated_page_cache.stats["revalidated"] == 0
+    
+    def test_pages_expire_after_result_ttl(self, isolated_page_cache):
+        """PREWARM_RESULT_TTL を過ぎたページは通常どおり再検証する"""
+        with patch("scraper.get_http_client", return_value=make_client(pages=2)):
+            asyncio.run(prewarm.prewarm_url(URL, 100, ttl=3600))
+        
+        entry = isolated_page_cache.get(URL)
+        now = time.time()
+        with patch("page_cache.time", SimpleNamespace(time=lambda: now + 1800)):
+            assert entry.is_fresh(0)
+        with patch("page_cache.time", SimpleNamespace(time=lambda: now + 8 * 3600)):
+            assert not entry.is_fresh(isolated_page_cache.ttl)
+    
+    def test_disabled_without_page_cache(self, monkeypatch):
+        monkeypatch.setattr(prewarm, "PREWARM_ENABLED", True)
+        monkeypatch.setattr(prewarm, "_prewarm_store", None)
+        monkeypatch.setattr(prewarm, "get_page_cache", lambda: None)
+        
+        assert prewarm.get_prewarm_store() is None
@@ -0,0 +1,212 @@
+"""
+レート制限とリトライのテスト
+"""
+
+import time
+import asyncio
+import httpx
+import pytest
+from email.utils import formatdate
+
+from rate_limiter import HostLimiter, parse_retry_after, backoff_delay, get_host_limiter
+from scraper import fetch_page_html
+from benchmarks.stub_server import render_page
+
+
+URL = "https://beauty.hotpepper.jp/genre/kgkw094/"
+
+
+class TestParseRetryAfter:
+    """Retry-After の解釈のテスト"""
+    
+    def test_seconds(self):
+        assert parse_retry_after("3") == 3.0
+    
+    def test_http_date(self):
+        seconds = parse_retry_after(formatdate(time.time() + 10, usegmt=True))
+        assert 8 <= seconds <= 10
+    
+    def test_capped(self):
+        assert parse_retry_after("86400") == 60.0
+    
+    def test_invalid(self):
+        assert parse_retry_after("soon") is None
+        assert parse_retry_after(None) is None
+
+
+class TestHostLimiter:
+    """AIMD による同時接続数調整のテスト"""
+    
+    def test_additive_increase(self):
+        limiter = HostLimiter(initial_concurrency=2, max_concurrency=4)
+        for _ in range(4):
+            limiter.record(0.1, 200)
+        
+        assert limiter.concurrency_limit == 3
+    
+    def test_multiplicative_decrease_on_throttle(self):
+        limiter = HostLimiter(initial_concurrency=8)
+        limiter.record(0.1, 429)
+        
+        assert limiter.concurrency_limit == 4
+        assert limiter.stats["throttled"] == 1
+    
+    def test_decrease_on_slow_response(self):
+        limiter = HostLimiter(initial_concurrency=8, latency_target=1.0)
+        limiter.record(3.0, 200)
+        
+        assert limiter.concurrency_limit == 6
+    
+    def test_never_below_minimum(self):
+        limiter = HostLimiter(initial_concurrency=2, min_concurrency=1)
+        for _ in range(5):
+            limiter.record(0.1, None)
+        
+        assert limiter.concurrency_limit == 1
+    
+    def test_retry_after_blocks_host(self):
+        limiter = HostLimiter()
+        limiter.record(0.1, 503, retry_after=5)
+        
+        assert limiter._reserve(time.monotonic()) > 4
+    
+    def test_token_bucket(self):
+        """バースト分を使い切ると待ち時間が発生"""
+        limiter = HostLimiter(rate=2, burst=2)
+        now = time.monotonic()
+        
+        assert limiter._reserve(now) == 0
+        assert limiter._reserve(now) == 0
+        assert limiter._reserve(now) > 0
+    
+    def test_concurrency_limit_enforced(self):
+        """同時接続数の上限を超えて実行しない"""
+        limiter = HostLimiter(rate=1000, burst=1000, initial_concurrency=2, max_concurrency=2)
+        peak = 0
+        
+        async def request():
+            nonlocal peak
+            await limiter.acquire()
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+            await limiter.release(0.01, 200)
+        
+        async def main():
+            await asyncio.gather(*(request() for _ in range(6)))
+        
+        asyncio.run(main())
+        assert peak == 2
+    
+    def test_cancelled_acquire_returns_slot(self):
+        """トークン待ちの acquire を取り消しても同時接続枠が残らない"""
+        limiter = HostLimiter(rate=0.01, burst=1, initial_concurrency=2, max_concurrency=2)
+        
+        async def main():
+            await limiter.acquire()
+            waiting = [asyncio.create_task(limiter.acquire()) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            # 1件はトークン待ち、残りは同時接続枠待ち
+            assert limiter.in_flight == 2
+            for task in waiting:
+                task.cancel()
+            await asyncio.gather(*waiting, return_exceptions=True)
+            assert limiter.in_flight == 1
+            await limiter.release(0.01, 200)
+        
+        asyncio.run(main())
+        assert limiter.in_flight == 0
+    
+    def test_cancelled_fetch_returns_slot(self):
+        """応答待ちのページ取得を取り消しても同時接続枠が残らず、同時接続数も減らさない"""
+        async def handler(request):
+            await asyncio.sleep(10)
+            return httpx.Response(200, text="")
+        
+        async def main():
+            limiter = get_host_limiter(URL)
+            limit = limiter.limit
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                task = asyncio.create_task(fetch_page_html(client, URL, cache_mode="bypass"))
+                await asyncio.sleep(0.05)
+                assert limiter.in_flight == 1
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            return limiter, limit
+        
+        limiter, limit = asyncio.run(main())
+        assert limiter.in_flight == 0
+        assert limiter.limit == limit
+
+
+def test_backoff_uses_retry_after():
+    assert backoff_delay(2, retry_after=1.5) == 1.5
+
+
+def test_backoff_jitter_bounded():
+    assert all(0 <= backoff_delay(3) <= 4.0 for _ in range(20))
+
+
+class TestFetchRetry:
+    """fetch_page_html のリトライのテスト"""
+    
+    def test_retry_until_success(self):
+        """429・503の後に成功すれば結果を返す"""
+        responses = [
+            httpx.Response(429, headers={"Retry-After": "0"}),
+            httpx.Response(503),
+            httpx.Response(200, text=render_page(1, 1, 2)),
+        ]
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda r: responses.pop(0)))
+        
+        html = asyncio.run(fetch_page_html(client, URL, cache_mode="bypass"))
+        
+        assert "スタブサロン1" in html
+        assert responses == []
+    
+    def test_retry_transport_error(self):
+        """通信エラーもリトライする"""
+        calls = []
+        
+        def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                raise httpx.ConnectTimeout("timeout", request=request)
+            return httpx.Response(200, text=render_page(1, 1, 2))
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        asyncio.run(fetch_page_html(client, URL, cache_mode="bypass"))
+        
+        assert len(calls) == 2
+    
+    def test_give_up_after_max_retries(self):
+        calls = []
+        
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(503)
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        
+        with pytest.raises(ValueError, match="503"):
+            asyncio.run(fetch_page_html(client, URL, cache_mode="bypass"))
+        assert len(calls) == 4
+    
+    def test_no_retry_on_not_found(self):
+        calls = []
+        
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(404)
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        
+        with pytest.raises(ValueError):
+            asyncio.run(fetch_page_html(client, URL, cache_mode="bypass"))
+        assert len(calls) == 1
+    
+    def test_limiter_shared_per_host(self):
+        async def get_two():
+            return get_host_limiter(URL), get_host_limiter("https://beauty.hotpepper.jp/other/")
+        
+        first, second = asyncio.run(get_two())
+        assert first is second
@@ -0,0 +1,194 @@
+"""
+複数ページ並列スクレイピングのテスト
+"""
+
+import asyncio
+import json
+import re
+import httpx
+import pytest
+
+from scraper import (
+    build_page_url,
+    parse_hpb_page,
+    scrape_multiple_pages_async,
+    salons_to_dicts,
+    json_default,
+    SalonData,
+)
+from benchmarks.stub_server import render_page
+
+
+def make_client(pages: int, salons_per_page: int = 3, requested: list | None = None) -> httpx.AsyncClient:
+    """スタブページを返すモッククライアントを生成"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        match = re.search(r'/PN(\d+)/', request.url.path)
+        page = int(match.group(1)) if match else 1
+        if requested is not None:
+            requested.append(page)
+        if page > pages:
+            return httpx.Response(404)
+        return httpx.Response(200, text=render_page(page, pages, salons_per_page))
+    
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def run_scrape(client: httpx.AsyncClient, max_pages: int, concurrency: int = 4):
+    return asyncio.run(scrape_multiple_pages_async(
+        "https://beauty.hotpepper.jp/genre/kgkw094/",
+        max_pages,
+        concurrency=concurrency,
+        client=client
+    ))
+
+
+class TestBuildPageUrl:
+    """ページURL生成のテスト"""
+    
+    def test_first_page_unchanged(self):
+        assert build_page_url("https://beauty.hotpepper.jp/genre/kgkw094/", 1) == "https://beauty.hotpepper.jp/genre/kgkw094/"
+    
+    def test_append_page(self):
+        assert build_page_url("https://beauty.hotpepper.jp/genre/kgkw094", 3) == "https://beauty.hotpepper.jp/genre/kgkw094/PN3/"
+    
+    def test_keep_query_string(self):
+        assert build_page_url("https://beauty.hotpepper.jp/genre/?q=1", 2) == "https://beauty.hotpepper.jp/genre/PN2/?q=1"
+    
+    def test_replace_existing_page(self):
+        assert build_page_url("https://beauty.hotpepper.jp/genre/PN5/", 2) == "https://beauty.hotpepper.jp/genre/PN2/"
+
+
+class TestParseHpbPage:
+    """ページ全体のパースのテスト"""
+    
+    def test_result_summary(self):
+        """総件数と総ページ数を読み取る"""
+        result = parse_hpb_page(render_page(1, 7, 20))
+        
+        assert result.total_count == 140
+        assert result.total_pages == 7
+        assert result.has_next is True
+        assert len(result.salons) == 20
+    
+    def test_last_page(self):
+        """最終ページは次ページなし"""
+        result = parse_hpb_page(render_page(7, 7, 20))
+        
+        assert result.has_next is False
+
+
+class TestScrapeMultiplePagesAsync:
+    """並列スクレイピングのテスト"""
+    
+    def test_merge_in_page_order(self):
+        """ページ順にマージされる"""
+        salons, title = run_scrape(make_client(pages=6), max_pages=10)
+        
+        assert [s.name for s in salons] == [f"スタブサロン{i}" for i in range(1, 19)]
+        assert title.startswith("スタブエリア")
+    
+    def test_respects_max_pages(self):
+        """max_pagesを超えて取得しない"""
+        requested = []
+        salons, _ = run_scrape(make_client(pages=6, requested=requested), max_pages=2)
+        
+        assert len(salons) == 6
+        assert sorted(requested) == [1, 2]
+    
+    def test_stops_at_total_pages(self):
+        """総ページ数を超えるページは取得しない"""
+        requested = []
+        run_scrape(make_client(pages=3, requested=requested), max_pages=50)
+        
+        assert sorted(requested) == [1, 2, 3]
+    
+    def test_same_result_as_sequential(self):
+        """逐次取得と同じ結果になる"""
+        sequential, _ = run_scrape(make_client(pages=5), max_pages=10, concurrency=1)
+        concurrent, _ = run_scrape(make_client(pages=5), max_pages=10, concurrency=5)
+        
+        assert sequential == concurrent
+    
+    def test_truncate_at_error_page(self):
+        """エラーページ以降の結果は含めない"""
+        def handler(request: httpx.Request) -> httpx.Response:
+            match = re.search(r'/PN(\d+)/', request.url.path)
+            page = int(match.group(1)) if match else 1
+            if page == 3:
+                return httpx.Response(500)
+            return httpx.Response(200, text=render_page(page, 5, 2))
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        salons, _ = run_scrape(client, max_pages=10)
+        
+        assert len(salons) == 4
+    
+    def test_first_page_error(self):
+        """1ページ目が取得できない場合は空"""
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(503)))
+        salons, title = run_scrape(client, max_pages=10)
+        
+        assert salons == []
+        assert title == ""
+    
+    def test_overlapping_scrapes_share_pages(self):
+        """同時に実行した同じURLのスクレイピングは各ページを1回だけ取得する"""
+        requested = []
+        
+        async def handler(request: httpx.Request) -> httpx.Response:
+            match = re.search(r'/PN(\d+)/', request.url.path)
+            page = int(match.group(1)) if match else 1
+            requested.append(page)
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, text=render_page(page, 4, 3))
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        
+        async def scrape_twice():
+            return await asyncio.gather(*[
+                scrape_multiple_pages_async(
+                    "https://beauty.hotpepper.jp/genre/kgkw094/",
+                    10,
+                    client=client,
+                    cache_mode="bypass"
+                )
+                for _ in range(2)
+            ])
+        
+        first, second = asyncio.run(scrape_twice())
+        
+        assert first == second
+        assert len(first[0]) == 12
+        assert sorted(requested) == [1, 2, 3, 4]
+
+
+class TestSalonData:
+    """サロンレコードのテスト"""
+    
+    def test_slotted(self):
+        salon = parse_hpb_page(render_page(1, 1, 1)).salons[0]
+        
+        assert not hasattr(salon, "__dict__")
+        assert isinstance(salon.coupon_prices, tuple)
+    
+    def test_to_dict(self):
+        salon = SalonData("サロンA", "https://example.com/", 1, 2, (4000, 6000), 4000, 6000, 5000.0)
+        
+        assert salon.to_dict() == {
+            "name": "サロンA",
+            "url": "https://example.com/",
+            "blog_count": 1,
+            "review_count": 2,
+            "coupon_prices": [4000, 6000],
+            "min_price": 4000,
+            "max_price": 6000,
+            "average_price": 5000.0,
+        }
+        assert salons_to_dicts([salon]) == [salon.to_dict()]
+    
+    def test_json_default(self):
+        salon = SalonData("サロンA", "", 0, 0, (5000,), 5000, 5000, 5000.0)
+        
+        assert json.loads(json.dumps({"salons": [salon]}, default=json_default)) == {"salons": [salon.to_dict()]}
+        with pytest.raises(TypeError):
+            json.dumps(object(), default=json_default)
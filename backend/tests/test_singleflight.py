@@ -0,0 +1,163 @@
+"""
+リクエスト集約モジュールのテスト
+"""
+
+import asyncio
+import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
+
+import jobs
+from scraper import SalonData
+from singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    """SingleFlight のテスト"""
+    
+    def test_concurrent_calls_share_result(self):
+        calls = []
+        
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+        
+        async def main():
+            group = SingleFlight()
+            results = await asyncio.gather(*[group.do("key", work) for _ in range(5)])
+            return group, results
+        
+        group, results = asyncio.run(main())
+        
+        assert results == ["result"] * 5
+        assert len(calls) == 1
+        assert group.stats == {"started": 1, "shared": 4}
+        assert group.in_flight() == 0
+    
+    def test_sequential_calls_run_again(self):
+        calls = []
+        
+        async def work():
+            calls.append(1)
+            return len(calls)
+        
+        async def main():
+            group = SingleFlight()
+            return [await group.do("key", work), await group.do("key", work)]
+        
+        assert asyncio.run(main()) == [1, 2]
+    
+    def test_error_shared(self):
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+        
+        async def main():
+            group = SingleFlight()
+            return await asyncio.gather(*[group.do("key", work) for _ in range(2)], return_exceptions=True)
+        
+        results = asyncio.run(main())
+        
+        assert all(isinstance(r, ValueError) for r in results)
+    
+    def test_cancel_one_waiter_keeps_others(self):
+        async def work():
+            await asyncio.sleep(0.02)
+            return "result"
+        
+        async def main():
+            group = SingleFlight()
+            first = asyncio.create_task(group.do("key", work))
+            second = asyncio.create_task(group.do("key", work))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second, first.cancelled()
+        
+        assert asyncio.run(main()) == ("result", True)
+    
+    def test_cancel_all_waiters_cancels_work(self):
+        finished = []
+        
+        async def work():
+            await asyncio.sleep(0.05)
+            finished.append(1)
+        
+        async def main():
+            group = SingleFlight()
+            task = asyncio.create_task(group.do("key", work))
+            await asyncio.sleep(0)
+            task.cancel()
+            await asyncio.sleep(0.1)
+            return group.in_flight()
+        
+        assert asyncio.run(main()) == 0
+        assert finished == []
+
+
+class TestJobCoalescing:
+    """同じURLの分析ジョブの集約のテスト"""
+    
+    def test_jobs_share_scrape_and_save_separately(self):
+        async def fake_scrape(url, max_pages, on_page=None, **kwargs):
+            await asyncio.sleep(0.01)
+            on_page(1, None)
+            return [SalonData("サロンA", "", 0, 0, (), None, None, None)], "タイトル"
+        
+        first = jobs.create_job("user-1", "https://beauty.hotpepper.jp/genre/kgkw094/", 5)
+        second = jobs.create_job("user-2", "https://BEAUTY.hotpepper.jp/genre/kgkw094", 5)
+        
+        async def main():
+            await asyncio.gather(jobs.run_job(first.id), jobs.run_job(second.id))
+        
+        with patch("jobs.scrape_multiple_pages_async", new=AsyncMock(side_effect=fake_scrape)) as mock_scrape, \
+                patch("jobs.save_search_history", side_effect=[{"id": "h1"}, {"id": "h2"}]) as mock_save:
+            asyncio.run(main())
+        
+        assert mock_scrape.call_count == 1
+        assert mock_save.call_count == 2
+        assert {first.history_id, second.history_id} == {"h1", "h2"}
+        assert first.pages_done == second.pages_done == 1
+        assert first.status == second.status == "completed"
+        assert jobs._scrape_subscribers == {}
+    
+    def test_cache_modes_not_shared(self):
+        """cache_mode が異なるジョブはスクレイピングを共有しない"""
+        async def fake_scrape(url, max_pages, on_page=None, **kwargs):
+            await asyncio.sleep(0.01)
+            return [SalonData("サロンA", "", 0, 0, (), None, None, None)], kwargs["cache_mode"]
+        
+        first = jobs.create_job("user-1", "https://beauty.hotpepper.jp/genre/kgkw094/", 5)
+        second = jobs.create_job("user-2", "https://beauty.hotpepper.jp/genre/kgkw094/", 5, cache_mode="refresh")
+        
+        async def main():
+            await asyncio.gather(jobs.run_job(first.id), jobs.run_job(second.id))
+        
+        with patch("jobs.scrape_multiple_pages_async", new=AsyncMock(side_effect=fake_scrape)) as mock_scrape, \
+                patch("jobs.save_search_history", side_effect=lambda **kwargs: {"id": kwargs["title"]}):
+            asyncio.run(main())
+        
+        assert mock_scrape.call_count == 2
+        assert (first.history_id, second.history_id) == ("use", "refresh")
+    
+    def test_shared_recording_closed_once(self):
+        """共有した記録はスクレイピングを実行したジョブが1回だけ締め、各履歴のマニフェストを保存する"""
+        recording = MagicMock()
+        
+        async def fake_scrape(url, max_pages, on_page=None, **kwargs):
+            await asyncio.sleep(0.01)
+            return [SalonData("サロンA", "", 0, 0, (), None, None, None)], "タイトル"
+        
+        first = jobs.create_job("user-1", "https://beauty.hotpepper.jp/genre/kgkw094/", 5)
+        second = jobs.create_job("user-2", "https://beauty.hotpepper.jp/genre/kgkw094/", 5)
+        
+        async def main():
+            await asyncio.gather(jobs.run_job(first.id), jobs.run_job(second.id))
+        
+        with patch("jobs.scrape_multiple_pages_async", new=AsyncMock(side_effect=fake_scrape)), \
+                patch("jobs.start_recording", return_value=recording), \
+                patch("jobs.save_search_history", side_effect=[{"id": "h1"}, {"id": "h2"}]):
+            asyncio.run(main())
+        
+        recording.close.assert_called_once_with()
+        assert sorted(call.args[0] for call in recording.attach.call_args_list) == ["h1", "h2"]
+        recording.finish.assert_not_called()
@@ -0,0 +1,95 @@
+"""
+スタブサーバーと取得先の切り替えのテスト
+"""
+
+import asyncio
+import httpx
+import pytest
+
+import scraper
+from scraper import parse_hpb_page, scrape_multiple_pages_async, upstream_url
+from benchmarks.stub_server import StubServer, render_page
+
+
+HPB_URL = "https://beauty.hotpepper.jp/genre/kgkw094/"
+
+
+def scrape(url: str, max_pages: int, client: httpx.AsyncClient = None):
+    return asyncio.run(scrape_multiple_pages_async(url, max_pages, client=client, cache_mode="bypass"))
+
+
+class TestRenderPage:
+    """合成ページのテスト"""
+    
+    def test_duplicates_repeat_previous_page(self):
+        names = [s.name for s in parse_hpb_page(render_page(2, 3, 5, duplicates=2)).salons]
+        
+        assert names == ["スタブサロン4", "スタブサロン5", "スタブサロン6", "スタブサロン7", "スタブサロン8"]
+    
+    def test_no_duplicates_on_first_page(self):
+        assert parse_hpb_page(render_page(1, 3, 5, duplicates=2)).salons[0].name == "スタブサロン1"
+
+
+class TestUpstreamUrl:
+    """取得先URLの解決のテスト"""
+    
+    def test_unset(self):
+        assert upstream_url(HPB_URL) == HPB_URL
+    
+    def test_rewrite_hpb_host(self, monkeypatch):
+        monkeypatch.setattr(scraper, "UPSTREAM_URL", "http://127.0.0.1:8765")
+        
+        assert upstream_url(HPB_URL + "PN2/?q=1") == "http://127.0.0.1:8765/genre/kgkw094/PN2/?q=1"
+        assert upstream_url("https://example.com/a/") == "https://example.com/a/"
+
+
+class TestStubServer:
+    """スタブサーバーに対するスクレイピングのテスト"""
+    
+    def test_scrape_through_upstream(self, monkeypatch):
+        with StubServer(pages=3, salons_per_page=4) as stub:
+            monkeypatch.setattr(scraper, "UPSTREAM_URL", stub.origin)
+            salons, _ = scrape(HPB_URL, 10)
+        
+        assert len(salons) == 12
+        assert stub.responses == {200: 3}
+    
+    def test_duplicates_removed(self):
+        with StubServer(pages=3, salons_per_page=4, duplicates=1) as stub:
+            salons, _ = scrape(stub.base_url, 10)
+        
+        names = [s.name for s in salons]
+        assert len(names) == len(set(names)) == 11
+    
+    def test_injected_errors_are_retried(self):
+        with StubServer(pages=3, salons_per_page=2, faults={2: [429, 503]}, retry_after=0) as stub:
+            salons, _ = scrape(stub.base_url, 10)
+        
+        assert len(salons) == 6
+        assert stub.responses == {200: 3, 429: 1, 503: 1}
+    
+    def test_injected_timeout_is_retried(self):
+        client = httpx.AsyncClient(timeout=0.2)
+        with StubServer(pages=2, salons_per_page=2, faults={2: ["timeout"]}, hang_seconds=0.5) as stub:
+            salons, _ = scrape(stub.base_url, 10, client=client)
+        
+        assert len(salons) == 4
+        assert stub.responses["timeout"] == 1
+    
+    def test_random_errors_seeded(self):
+        def run():
+            with StubServer(pages=1, error_rate=0.5, error_faults=(503,), seed=1) as stub, httpx.Client() as client:
+                for _ in range(10):
+                    client.get(stub.base_url)
+            return stub.responses
+        
+        first = run()
+        
+        assert first == run()
+        assert first.get(503, 0) > 0
+    
+    def test_page_latency(self):
+        with StubServer(pages=2, page_latency={2: 0.2}) as stub, httpx.Client() as client:
+            elapsed = [client.get(url).elapsed.total_seconds() for url in (stub.base_url, stub.base_url + "PN2/")]
+        
+        assert elapsed[0] < 0.2 <= elapsed[1]
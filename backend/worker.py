@@ -0,0 +1,298 @@
+"""
+HPB Price Analyzer - 分析ジョブのワーカー
+永続ジョブキュー（DURABLE_JOBS_ENABLED=1）からジョブを占有して実行する。
+ページごとにチェックポイントを書き、再起動後は最後に完了したページの続きから再開する。
+
+APIプロセス内でも実行されるほか（JOB_WORKER_EMBEDDED=1）、別プロセスとして複数起動できる:
+    cd backend
+    DURABLE_JOBS_ENABLED=1 python -m worker --concurrency 2
+
+ホスト単位のレート制限（rate_limiter）はプロセスごとに持つため、ワーカーを複数プロセスで
+起動する場合は HPB_RATE_LIMIT / HPB_MAX_CONCURRENCY をプロセス数で割った値を設定する。
+同じURLのジョブの集約（jobs._scrape_shared）はジョブごとのチェックポイントと両立しないため行わない
+（同じプロセス内で同時に取得する同じページは fetch_page_html で共有される）。
+"""
+
+import os
+import time
+import uuid
+import socket
+import asyncio
+import argparse
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from scraper import scrape_multiple_pages_async, salons_to_dicts, PageResult
+from database import save_search_history
+from jobs import ScrapeJob, JOB_RETENTION_SECONDS, record_prewarm_lookup
+from archive import start_recording
+from job_store import JobStore, get_job_store
+from history_stream import HistoryStreamWriter, should_stream, stream_scrape
+from metrics import ANALYSES, SALONS_SCRAPED
+
+# 環境変数を読み込み
+load_dotenv()
+
+
+# APIプロセス内でワーカーを実行するか
+JOB_WORKER_EMBEDDED = os.getenv("JOB_WORKER_EMBEDDED", "1") == "1"
+# 1つのワーカーが同時に実行するジョブ数
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+# 実行できるジョブがないときに確認する間隔（秒）
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+
+
+class LeaseLost(Exception):
+    """ジョブの占有が他のワーカーに引き継がれた"""
+
+
+def make_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class CheckpointWriter:
+    """
+    ページのチェックポイントを1つのタスクで順に書き込む
+    
+    SQLiteへの書き込み（BEGIN IMMEDIATE で他のプロセスを待つことがある）はスレッドで実行し、
+    ページ取得のコールバックからはキューに積むだけにしてイベントループを止めない。
+    占有を失っていた場合、タスクは LeaseLost で終了する。
+    """
+    
+    def __init__(self, store: JobStore, job_id: str, worker_id: str):
+        self.store = store
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+    
+    def put(self, pages_done: int, total_pages: Optional[int], page: Optional[int], result: Optional[PageResult]) -> None:
+        self._queue.put_nowait((pages_done, total_pages, page, result))
+    
+    async def _run(self) -> None:
+        while True:
+            pages_done, total_pages, page, result = await self._queue.get()
+            saved = await asyncio.to_thread(
+                self.store.checkpoint, self.job_id, self.worker_id, pages_done, total_pages, page=page, result=result
+            )
+            self._queue.task_done()
+            if not saved:
+                raise LeaseLost(self.job_id)
+    
+    async def run_until_lost(self, coro):
+        """
+        coro を実行し、書き込み待ちのチェックポイントを書き終えてから結果を返す
+        
+        Raises:
+            LeaseLost: 実行中に占有を失った場合（coro はキャンセルする）
+        """
+        work = asyncio.ensure_future(coro)
+        await asyncio.wait({work, self.task}, return_when=asyncio.FIRST_COMPLETED)
+        if not work.done():
+            work.cancel()
+            await asyncio.gather(work, return_exceptions=True)
+            self.task.result()
+        result = work.result()
+        
+        drained = asyncio.ensure_future(self._queue.join())
+        await asyncio.wait({drained, self.task}, return_when=asyncio.FIRST_COMPLETED)
+        drained.cancel()
+        if self.task.done():
+            self.task.result()
+        return result
+    
+    def close(self) -> None:
+        self.task.cancel()
+
+
+async def run_durable_job(store: JobStore, job: ScrapeJob, worker_id: str) -> None:
+    """
+    占有したジョブを実行（スクレイピング → 保存）
+    
+    チェックポイント済みのページは取得せずに使い、新しく取得したページは
+    取得ごとにチェックポイントを書く（CheckpointWriter）。占有を失った場合は結果を保存せずに終了する。
+    ページ数の多いジョブはジョブIDを stream_id としてストリーミング保存にし、
+    再開時はチェックポイント済みのページから追記し直す（ページごとに上書きされる）。
+    アーカイブが有効な場合は最初から実行したジョブのページを記録する
+    （再開したジョブはチェックポイント済みのページのHTMLがないため記録しない）。
+    
+    Args:
+        store: ジョブキュー
+        job: 占有したジョブ
+        worker_id: このワーカーのID
+    """
+    done_pages = await asyncio.to_thread(store.load_pages, job.id)
+    if done_pages:
+        print(f"Resuming job {job.id} with {len(done_pages)} checkpointed pages")
+    job.pages_done = 0
+    record_prewarm_lookup(job)
+    checkpoints = CheckpointWriter(store, job.id, worker_id)
+    
+    def on_page(page: int, result: Optional[PageResult]) -> None:
+        job.pages_done += 1
+        if page == 1 and result is not None:
+            job.total_pages = result.total_pages
+        checkpointed = page in done_pages
+        checkpoints.put(
+            job.pages_done,
+            job.total_pages,
+            None if checkpointed else page,
+            None if checkpointed else result
+        )
+    
+    async def keep_lease() -> None:
+        # ページの取得が長引いても占有が切れないよう定期的に延長する
+        while True:
+            await asyncio.sleep(store.lease_seconds / 3)
+            await asyncio.to_thread(store.renew, job.id, worker_id)
+    
+    writer = HistoryStreamWriter(stream_id=job.id) if should_stream(job.max_pages) else None
+    recording = start_recording(job.target_url, job.max_pages) if not done_pages else None
+    heartbeat = asyncio.create_task(keep_lease())
+    try:
+        if writer is not None:
+            title = await checkpoints.run_until_lost(stream_scrape(
+                writer,
+                job.user_id,
+                job.target_url,
+                job.max_pages,
+                on_page=on_page,
+                cache_mode=job.cache_mode,
+                recording=recording,
+                done_pages=done_pages
+            ))
+            salon_count = writer.salon_count
+        else:
+            salons, title = await checkpoints.run_until_lost(scrape_multiple_pages_async(
+                job.target_url,
+                job.max_pages,
+                on_page=on_page,
+                cache_mode=job.cache_mode,
+                recording=recording,
+                done_pages=done_pages,
+                user_id=job.user_id
+            ))
+            salon_count = len(salons)
+        if not await asyncio.to_thread(store.renew, job.id, worker_id):
+            raise LeaseLost(job.id)
+        if not salon_count:
+            raise ValueError("サロンデータを取得できませんでした。URLを確認してください")
+        
+        if writer is not None:
+            saved = await writer.finish(job.user_id, job.target_url, title)
+        else:
+            saved = await asyncio.to_thread(
+                save_search_history,
+                user_id=job.user_id,
+                target_url=job.target_url,
+                raw_data=salons_to_dicts(salons),
+                title=title
+            )
+        
+        if recording is not None:
+            await asyncio.to_thread(recording.finish, saved["id"])
+        
+        job.salon_count = salon_count
+        job.history_id = saved["id"]
+        job.status = "completed"
+        SALONS_SCRAPED.inc(salon_count)
+    except LeaseLost:
+        # 追記分は引き継いだワーカーが使うため削除しない
+        print(f"Job {job.id} was taken over by another worker")
+        return
+    except Exception as e:
+        print(f"Job {job.id} failed: {e}")
+        if writer is not None:
+            await writer.discard()
+        job.error = str(e)
+        job.status = "failed"
+    finally:
+        heartbeat.cancel()
+        checkpoints.close()
+    
+    job.finished_at = time.time()
+    await asyncio.to_thread(store.finish, job.to_dict(), worker_id)
+    ANALYSES.inc(mode="durable", status=job.status)
+
+
+async def run_worker(
+    store: JobStore,
+    worker_id: Optional[str] = None,
+    concurrency: int = JOB_WORKER_CONCURRENCY,
+    poll_interval: float = JOB_POLL_INTERVAL,
+    stop: Optional[asyncio.Event] = None
+) -> None:
+    """
+    ジョブを占有して実行し続ける（stop が設定されるかキャンセルされるまで）
+    
+    Args:
+        store: ジョブキュー
+        worker_id: このワーカーのID（省略時はホスト名・PIDから生成）
+        concurrency: 同時に実行するジョブ数
+        poll_interval: 実行できるジョブがないときに確認する間隔（秒）
+        stop: 設定されたら新しいジョブを占有せず、実行中のジョブの終了を待って戻る
+    """
+    worker_id = worker_id or make_worker_id()
+    stop = stop or asyncio.Event()
+    running: set[asyncio.Task] = set()
+    print(f"Job worker {worker_id} started")
+    
+    try:
+        while not stop.is_set():
+            if len(running) >= max(1, concurrency):
+                await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            
+            row = await asyncio.to_thread(store.claim, worker_id)
+            if row is None:
+                await asyncio.to_thread(store.cleanup, JOB_RETENTION_SECONDS)
+                try:
+                    await asyncio.wait_for(stop.wait(), poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            task = asyncio.create_task(run_durable_job(store, ScrapeJob(**row), worker_id))
+            running.add(task)
+            task.add_done_callback(running.discard)
+        
+        if running:
+            await asyncio.wait(running)
+    finally:
+        # キャンセルされた場合、実行中のジョブは占有期限が切れた後に他のワーカーが再開する
+        for task in running:
+            task.cancel()
+
+
+def start_embedded_worker() -> Optional[asyncio.Task]:
+    """
+    APIプロセス内でワーカーを開始
+    
+    Returns:
+        ワーカーのタスク（永続ジョブキューまたは組み込みワーカーが無効な場合はNone）
+    """
+    store = get_job_store()
+    if store is None or not JOB_WORKER_EMBEDDED:
+        return None
+    return asyncio.create_task(run_worker(store))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="分析ジョブのワーカー")
+    parser.add_argument("--concurrency", type=int, default=JOB_WORKER_CONCURRENCY, help="同時に実行するジョブ数")
+    parser.add_argument("--poll-interval", type=float, default=JOB_POLL_INTERVAL, help="ジョブを確認する間隔（秒）")
+    args = parser.parse_args()
+    
+    store = get_job_store()
+    if store is None:
+        raise SystemExit("DURABLE_JOBS_ENABLED=1 を設定してください")
+    
+    try:
+        asyncio.run(run_worker(store, concurrency=args.concurrency, poll_interval=args.poll_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -18,20 +18,28 @@ describe('analyzeUrl', () => {
         mockFetch.mockReset()
     })
 
-    it('正常なレスポンスを返す', async () => {
-        const mockResponse = {
-            history_id: 'test-id',
-            salon_count: 5,
-            salons: []
-        }
-        mockFetch.mockResolvedValueOnce({
-            ok: true,
-            json: () => Promise.resolve(mockResponse)
-        })
+    it('ジョブ完了まで待って履歴IDを返す', async () => {
+        mockFetch
+            .mockResolvedValueOnce({
+                ok: true,
+                json: () => Promise.resolve({ job_id: 'job-1', status: 'pending' })
+            })
+            .mockResolvedValueOnce({
+                ok: true,
+                json: () => Promise.resolve({
+                    job_id: 'job-1',
+                    status: 'completed',
+                    pages_done: 2,
+                    total_pages: 2,
+                    salon_count: 5,
+                    history_id: 'test-id',
+                    error: null
+                })
+            })
 
         const result = await analyzeUrl('user-id', { url: 'https://beauty.hotpepper.jp/test' })
 
-        expect(result).toEqual(mockResponse)
+        expect(result).toEqual({ history_id: 'test-id', salon_count: 5 })
         expect(mockFetch).toHaveBeenCalledWith(
             expect.stringContaining('/api/analyze'),
             expect.objectContaining({
@@ -41,6 +49,26 @@ describe('analyzeUrl', () => {
                 })
             })
         )
+        expect(mockFetch).toHaveBeenCalledWith(
+            expect.stringContaining('/api/jobs/job-1'),
+            expect.anything()
+        )
+    })
+
+    it('ジョブ失敗でエラーをスロー', async () => {
+        mockFetch
+            .mockResolvedValueOnce({
+                ok: true,
+                json: () => Promise.resolve({ job_id: 'job-2', status: 'pending' })
+            })
+            .mockResolvedValueOnce({
+                ok: true,
+                json: () => Promise.resolve({ job_id: 'job-2', status: 'failed', error: '取得できませんでした' })
+            })
+
+        await expect(
+            analyzeUrl('user-id', { url: 'https://beauty.hotpepper.jp/test' })
+        ).rejects.toThrow('取得できませんでした')
     })
 
     it('エラーレスポンスでエラーをスロー', async () => {
@@ -83,22 +111,59 @@ describe('getHistoryDetail', () => {
         mockFetch.mockReset()
     })
 
-    it('履歴詳細を返す', async () => {
-        const mockDetail = {
-            id: 'history-1',
-            created_at: '2026-01-01',
-            target_url: 'url',
-            user_id: 'user-id',
-            raw_data: []
-        }
+    it('列形式で取得してサロンの配列に戻す', async () => {
         mockFetch.mockResolvedValueOnce({
             ok: true,
-            json: () => Promise.resolve(mockDetail)
+            json: () => Promise.resolve({
+                id: 'history-1',
+                created_at: '2026-01-01',
+                target_url: 'url',
+                user_id: 'user-id',
+                format: 'columnar',
+                salons: {
+                    count: 2,
+                    url_prefixes: ['https://beauty.hotpepper.jp/'],
+                    columns: {
+                        name: ['サロンA', 'サロンB'],
+                        url_prefix: [0, 0],
+                        url: ['slnH000000001/', 'slnH000000002/'],
+                        blog_count: [1, 2],
+                        review_count: [10, 20],
+                        coupon_prices: [[5000], []],
+                        min_price: [5000, null],
+                        max_price: [5000, null],
+                        average_price: [5000, null],
+                    }
+                }
+            })
         })
 
         const result = await getHistoryDetail('user-id', 'history-1')
 
-        expect(result).toEqual(mockDetail)
+        expect(mockFetch.mock.calls[0][0]).toContain('/api/history/history-1?format=columnar')
+        expect(result.id).toBe('history-1')
+        expect(result.raw_data).toEqual([
+            {
+                name: 'サロンA',
+                url: 'https://beauty.hotpepper.jp/slnH000000001/',
+                blog_count: 1,
+                review_count: 10,
+                coupon_prices: [5000],
+                min_price: 5000,
+                max_price: 5000,
+                average_price: 5000,
+            },
+            {
+                name: 'サロンB',
+                url: 'https://beauty.hotpepper.jp/slnH000000002/',
+                blog_count: 2,
+                review_count: 20,
+                coupon_prices: [],
+                min_price: null,
+                max_price: null,
+                average_price: null,
+            },
+        ])
     })
 })
 
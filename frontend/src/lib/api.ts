@@ -23,15 +23,31 @@ export interface SalonData {
 export interface AnalyzeResponse {
     history_id: string
     salon_count: number
-    salons: SalonData[]
 }
 
+export interface AnalyzeJob {
+    job_id: string
+    status: 'pending' | 'running' | 'completed' | 'failed'
+    pages_done: number
+    total_pages: number | null
+    salon_count: number
+    history_id: string | null
+    error: string | null
+}
+
+// ジョブ状態のポーリング間隔（ミリ秒）
+const JOB_POLL_INTERVAL_MS = 1500
+
 export interface HistoryItem {
     id: string
     created_at: string
     target_url: string
     title?: string
     salon_count: number
+    min_price?: number | null
+    median_price?: number | null
+    max_price?: number | null
+    total_reviews?: number | null
 }
 
 export interface HistoryDetail {
@@ -43,12 +59,58 @@ export interface HistoryDetail {
     raw_data: SalonData[]
 }
 
+/**
+ * 履歴詳細の列形式（format=columnar）
+ * サロンの項目ごとの配列と、URLの先頭部分の辞書（url_prefixes[url_prefix[i]] + url[i] が元のURL）
+ */
+export interface ColumnarHistoryDetail extends Omit<HistoryDetail, 'raw_data'> {
+    format: 'columnar'
+    salons: {
+        count: number
+        url_prefixes: string[]
+        columns: { [K in keyof SalonData]: SalonData[K][] } & { url_prefix: number[] }
+    }
+}
+
+export interface HistoryStats {
+    salon_count: number
+    priced_count: number
+    summary: {
+        mean: number
+        std: number
+        min: number
+        max: number
+        percentiles: Record<'p10' | 'p25' | 'p50' | 'p75' | 'p90', number>
+    } | null
+    histogram: {
+        min_price: number
+        max_price: number
+        count: number
+        salons: string[]
+    }[]
+    regression: {
+        slope: number
+        intercept: number
+        r: number
+        r_squared: number
+        n: number
+    } | null
+    scatter: {
+        name: string
+        url: string
+        review_count: number
+        average_price: number
+    }[]
+}
+
 /**
  * HPB URLを分析
+ * 分析ジョブを登録し、完了するまで状態をポーリングする
  */
 export async function analyzeUrl(
     userId: string,
-    request: AnalyzeRequest
+    request: AnalyzeRequest,
+    onProgress?: (job: AnalyzeJob) => void
 ): Promise<AnalyzeResponse> {
     const response = await fetch(`${API_BASE_URL}/api/analyze`, {
         method: 'POST',
@@ -64,6 +126,165 @@ export async function analyzeUrl(
         throw new Error(error.detail || `API Error: ${response.status}`)
     }
 
+    const { job_id } = await response.json()
+
+    for (;;) {
+        const job = await getJob(userId, job_id)
+        onProgress?.(job)
+
+        if (job.status === 'completed' && job.history_id) {
+            return { history_id: job.history_id, salon_count: job.salon_count }
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.error || '分析に失敗しました')
+        }
+
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS))
+    }
+}
+
+export type AnalyzeStreamEvent =
+    | { type: 'progress'; page: number; total_pages: number | null }
+    | { type: 'salons'; page: number; salons: SalonData[] }
+    | { type: 'done'; history_id: string; salon_count: number; title: string }
+    | { type: 'error'; detail: string }
+
+/**
+ * HPB URLを分析（ストリーミング）
+ * ページごとのサロンを受信するたびに onEvent を呼び出す
+ */
+export async function analyzeUrlStream(
+    userId: string,
+    request: AnalyzeRequest,
+    onEvent: (event: AnalyzeStreamEvent) => void
+): Promise<AnalyzeResponse> {
+    const response = await fetch(`${API_BASE_URL}/api/analyze/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-User-Id': userId,
+        },
+        body: JSON.stringify(request),
+    })
+
+    if (!response.ok || !response.body) {
+        const error = await response.json().catch(() => ({ detail: 'Unknown error' }))
+        throw new Error(error.detail || `API Error: ${response.status}`)
+    }
+
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+    let buffer = ''
+
+    for (;;) {
+        const { value, done } = await reader.read()
+        if (value) buffer += value
+
+        const lines = buffer.split('\n')
+        buffer = done ? '' : lines.pop() ?? ''
+
+        for (const line of lines) {
+            if (!line.trim()) continue
+            const event = JSON.parse(line) as AnalyzeStreamEvent
+            onEvent(event)
+
+            if (event.type === 'done') {
+                return { history_id: event.history_id, salon_count: event.salon_count }
+            }
+            if (event.type === 'error') {
+                throw new Error(event.detail)
+            }
+        }
+
+        if (done) throw new Error('分析結果の受信が途中で終了しました')
+    }
+}
+
+export interface BatchItem extends AnalyzeJob {
+    url: string
+}
+
+export interface BatchJob {
+    batch_id: string
+    status: 'pending' | 'running' | 'completed' | 'failed'
+    salon_count: number
+    rollup_history_id: string | null
+    error: string | null
+    items: BatchItem[]
+}
+
+/**
+ * 複数のHPB URLをまとめて分析
+ * URLごとの履歴と、重複を除いたまとめの履歴を保存する。完了するまで状態をポーリングする
+ */
+export async function analyzeBatch(
+    userId: string,
+    request: Omit<AnalyzeRequest, 'url'> & { urls: string[] },
+    onProgress?: (batch: BatchJob) => void
+): Promise<BatchJob> {
+    const response = await fetch(`${API_BASE_URL}/api/analyze/batch`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-User-Id': userId,
+        },
+        body: JSON.stringify(request),
+    })
+
+    if (!response.ok) {
+        const error = await response.json().catch(() => ({ detail: 'Unknown error' }))
+        throw new Error(error.detail || `API Error: ${response.status}`)
+    }
+
+    const { batch_id } = await response.json()
+
+    for (;;) {
+        const batch = await getBatch(userId, batch_id)
+        onProgress?.(batch)
+
+        if (batch.status === 'completed') {
+            return batch
+        }
+        if (batch.status === 'failed') {
+            throw new Error(batch.error || '一括分析に失敗しました')
+        }
+
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS))
+    }
+}
+
+/**
+ * 一括分析の状態を取得
+ */
+export async function getBatch(userId: string, batchId: string): Promise<BatchJob> {
+    const response = await fetch(`${API_BASE_URL}/api/batches/${batchId}`, {
+        headers: {
+            'X-User-Id': userId,
+        },
+    })
+
+    if (!response.ok) {
+        const error = await response.json().catch(() => ({ detail: 'Unknown error' }))
+        throw new Error(error.detail || `API Error: ${response.status}`)
+    }
+
+    return response.json()
+}
+
+/**
+ * 分析ジョブの状態を取得
+ */
+export async function getJob(userId: string, jobId: string): Promise<AnalyzeJob> {
+    const response = await fetch(`${API_BASE_URL}/api/jobs/${jobId}`, {
+        headers: {
+            'X-User-Id': userId,
+        },
+    })
+
+    if (!response.ok) {
+        const error = await response.json().catch(() => ({ detail: 'Unknown error' }))
+        throw new Error(error.detail || `API Error: ${response.status}`)
+    }
+
     return response.json()
 }
 
@@ -89,13 +310,43 @@ export async function getHistory(userId: string): Promise<HistoryItem[]> {
 }
 
 /**
- * 特定の履歴詳細を取得
+ * 列形式の履歴詳細をサロンの配列に戻す
+ */
+export function decodeColumnarHistory(columnar: ColumnarHistoryDetail): HistoryDetail {
+    const { columns, url_prefixes } = columnar.salons
+    const raw_data: SalonData[] = []
+
+    for (let i = 0; i < columnar.salons.count; i++) {
+        raw_data.push({
+            name: columns.name[i],
+            url: url_prefixes[columns.url_prefix[i]] + columns.url[i],
+            blog_count: columns.blog_count[i],
+            review_count: columns.review_count[i],
+            coupon_prices: columns.coupon_prices[i],
+            min_price: columns.min_price[i],
+            max_price: columns.max_price[i],
+            average_price: columns.average_price[i],
+        })
+    }
+
+    return {
+        id: columnar.id,
+        created_at: columnar.created_at,
+        target_url: columnar.target_url,
+        title: columnar.title,
+        user_id: columnar.user_id,
+        raw_data,
+    }
+}
+
+/**
+ * 特定の履歴詳細を取得（転送量の小さい列形式で取得してサロンの配列に戻す）
  */
 export async function getHistoryDetail(
     userId: string,
     historyId: string
 ): Promise<HistoryDetail> {
-    const response = await fetch(`${API_BASE_URL}/api/history/${historyId}`, {
+    const response = await fetch(`${API_BASE_URL}/api/history/${historyId}?format=columnar`, {
         headers: {
             'X-User-Id': userId,
         },
@@ -105,6 +356,36 @@ export async function getHistoryDetail(
         throw new Error('履歴の取得に失敗しました')
     }
 
+    return decodeColumnarHistory(await response.json())
+}
+
+/**
+ * 検索履歴の集計値（ヒストグラム・パーセンタイル・回帰・散布図）を取得
+ */
+export async function getHistoryStats(
+    userId: string,
+    historyId: string,
+    options: { binWidth?: number; bins?: number; maxPoints?: number } = {}
+): Promise<HistoryStats> {
+    const params = new URLSearchParams()
+    if (options.binWidth) params.set('bin_width', String(options.binWidth))
+    if (options.bins) params.set('bins', String(options.bins))
+    if (options.maxPoints) params.set('max_points', String(options.maxPoints))
+    const query = params.toString()
+
+    const response = await fetch(
+        `${API_BASE_URL}/api/history/${historyId}/stats${query ? `?${query}` : ''}`,
+        {
+            headers: {
+                'X-User-Id': userId,
+            },
+        }
+    )
+
+    if (!response.ok) {
+        throw new Error('集計の取得に失敗しました')
+    }
+
     return response.json()
 }
 
@@ -145,3 +426,25 @@ export async function deleteHistory(
 
     return true
 }
+
+/**
+ * アーカイブ済みのページから検索履歴を再パース（HPBにはアクセスしない）
+ */
+export async function reparseHistory(
+    userId: string,
+    historyId: string
+): Promise<{ history_id: string; salon_count: number; title: string }> {
+    const response = await fetch(`${API_BASE_URL}/api/history/${historyId}/reparse`, {
+        method: 'POST',
+        headers: {
+            'X-User-Id': userId,
+        },
+    })
+
+    if (!response.ok) {
+        const error = await response.json().catch(() => ({ detail: '再パースに失敗しました' }))
+        throw new Error(error.detail || `API Error: ${response.status}`)
+    }
+
+    return response.json()
+}
@@ -8,12 +8,202 @@ CREATE TABLE IF NOT EXISTS search_history (
   created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
   user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE,
   target_url TEXT NOT NULL,
-  raw_data JSONB NOT NULL
+  title TEXT,
+  raw_data JSONB NOT NULL,
+  -- 履歴一覧用の集計値（保存時に算出、一覧では raw_data を読まない）
+  salon_count INTEGER NOT NULL DEFAULT 0,
+  min_price INTEGER,
+  median_price NUMERIC,
+  max_price INTEGER,
+  total_reviews INTEGER
 );
 
+-- 既存テーブルへの列追加
+ALTER TABLE search_history ADD COLUMN IF NOT EXISTS title TEXT;
+ALTER TABLE search_history ADD COLUMN IF NOT EXISTS salon_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE search_history ADD COLUMN IF NOT EXISTS min_price INTEGER;
+ALTER TABLE search_history ADD COLUMN IF NOT EXISTS median_price NUMERIC;
+ALTER TABLE search_history ADD COLUMN IF NOT EXISTS max_price INTEGER;
+ALTER TABLE search_history ADD COLUMN IF NOT EXISTS total_reviews INTEGER;
+
+-- 既存の履歴の集計値を raw_data から補完（一度だけ実行）
+UPDATE search_history h
+SET
+  salon_count = jsonb_array_length(h.raw_data),
+  min_price = s.min_price,
+  median_price = s.median_price,
+  max_price = s.max_price,
+  total_reviews = s.total_reviews
+FROM (
+  SELECT
+    id,
+    MIN((salon->>'min_price')::INTEGER) AS min_price,
+    PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY (salon->>'average_price')::NUMERIC) AS median_price,
+    MAX((salon->>'max_price')::INTEGER) AS max_price,
+    COALESCE(SUM((salon->>'review_count')::INTEGER), 0) AS total_reviews
+  FROM search_history, jsonb_array_elements(raw_data) AS salon
+  GROUP BY id
+) s
+WHERE h.id = s.id AND h.total_reviews IS NULL;
+
 -- インデックス
 CREATE INDEX IF NOT EXISTS idx_search_history_user_id ON search_history(user_id);
 CREATE INDEX IF NOT EXISTS idx_search_history_created_at ON search_history(created_at DESC);
+-- 履歴一覧のキーセットページング用 (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_search_history_created_at_id ON search_history(created_at DESC, id DESC);
+
+-- ===========================================
+-- 正規化テーブル（分析をまたいだ価格推移の検索用）
+-- ===========================================
+
+-- サロン（HPBのサロンIDで一意）
+CREATE TABLE IF NOT EXISTS salons (
+  salon_id TEXT PRIMARY KEY,
+  url TEXT NOT NULL,
+  name TEXT NOT NULL,
+  first_seen_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+  last_seen_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
+-- 価格観測値（検索履歴ごとのサロンの値）
+CREATE TABLE IF NOT EXISTS price_observations (
+  id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+  history_id UUID NOT NULL REFERENCES search_history(id) ON DELETE CASCADE,
+  salon_id TEXT NOT NULL REFERENCES salons(salon_id),
+  observed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+  position INTEGER,
+  blog_count INTEGER,
+  review_count INTEGER,
+  coupon_prices INTEGER[] NOT NULL DEFAULT '{}',
+  min_price INTEGER,
+  max_price INTEGER,
+  average_price NUMERIC,
+  UNIQUE (history_id, salon_id)
+);
+
+-- サロンごとの価格推移（新しい順）
+CREATE INDEX IF NOT EXISTS idx_price_observations_salon_observed ON price_observations(salon_id, observed_at DESC);
+CREATE INDEX IF NOT EXISTS idx_price_observations_history_id ON price_observations(history_id);
+
+-- 既存の履歴から正規化テーブルを補完（一度だけ実行）
+INSERT INTO salons (salon_id, url, name, first_seen_at, last_seen_at)
+SELECT DISTINCT ON (salon_id) salon_id, url, name, first_seen_at, last_seen_at
+FROM (
+  SELECT
+    COALESCE(substring(salon->>'url' from '/(sln[A-Z][0-9]+)'), salon->>'url') AS salon_id,
+    salon->>'url' AS url,
+    salon->>'name' AS name,
+    MIN(h.created_at) OVER (PARTITION BY COALESCE(substring(salon->>'url' from '/(sln[A-Z][0-9]+)'), salon->>'url')) AS first_seen_at,
+    h.created_at AS last_seen_at
+  FROM search_history h, jsonb_array_elements(h.raw_data) AS salon
+) s
+ORDER BY salon_id, last_seen_at DESC
+ON CONFLICT (salon_id) DO NOTHING;
+
+INSERT INTO price_observations (
+  history_id, salon_id, observed_at, position, blog_count, review_count,
+  coupon_prices, min_price, max_price, average_price
+)
+SELECT
+  h.id,
+  COALESCE(substring(salon->>'url' from '/(sln[A-Z][0-9]+)'), salon->>'url'),
+  h.created_at,
+  t.position,
+  (salon->>'blog_count')::INTEGER,
+  (salon->>'review_count')::INTEGER,
+  ARRAY(SELECT jsonb_array_elements_text(salon->'coupon_prices')::INTEGER),
+  (salon->>'min_price')::INTEGER,
+  (salon->>'max_price')::INTEGER,
+  (salon->>'average_price')::NUMERIC
+FROM search_history h, jsonb_array_elements(h.raw_data) WITH ORDINALITY AS t(salon, position)
+ON CONFLICT (history_id, salon_id) DO NOTHING;
+
+-- ===========================================
+-- 大きな分析のストリーミング保存
+-- ===========================================
+
+-- スクレイピング中のサロンをページ単位で追記するテーブル（stream_id は保存処理ごとのID）
+-- 確定時に search_history の1行にまとめて削除する。同じページは上書きするため、再開時の再送は冪等
+-- created_at は最後の書き込み時刻。確定されなかった古い行はバックエンドが定期的に削除する（STREAM_CHUNK_TTL）
+CREATE TABLE IF NOT EXISTS search_history_chunks (
+  stream_id TEXT NOT NULL,
+  seq INTEGER NOT NULL,
+  salons JSONB NOT NULL,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+  PRIMARY KEY (stream_id, seq)
+);
+
+CREATE INDEX IF NOT EXISTS idx_search_history_chunks_created_at ON search_history_chunks(created_at);
+
+-- 追記したサロンをページ順に連結して履歴を保存し、集計値・正規化テーブルも作成する
+-- （raw_data 全体をバックエンドのメモリに載せない。戻り値は raw_data を含まない）
+CREATE OR REPLACE FUNCTION finalize_search_history_stream(
+  p_stream_id TEXT,
+  p_user_id UUID,
+  p_target_url TEXT,
+  p_title TEXT
+) RETURNS TABLE (id UUID, created_at TIMESTAMP WITH TIME ZONE, salon_count INTEGER)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+  saved search_history%ROWTYPE;
+BEGIN
+  INSERT INTO search_history (
+    user_id, target_url, title, raw_data, salon_count, min_price, median_price, max_price, total_reviews
+  )
+  SELECT
+    p_user_id,
+    p_target_url,
+    p_title,
+    COALESCE(jsonb_agg(t.salon ORDER BY c.seq, t.position), '[]'::jsonb),
+    COUNT(t.salon),
+    MIN((t.salon->>'min_price')::INTEGER),
+    PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY (t.salon->>'average_price')::NUMERIC),
+    MAX((t.salon->>'max_price')::INTEGER),
+    COALESCE(SUM((t.salon->>'review_count')::INTEGER), 0)
+  FROM search_history_chunks c, jsonb_array_elements(c.salons) WITH ORDINALITY AS t(salon, position)
+  WHERE c.stream_id = p_stream_id
+  RETURNING * INTO saved;
+
+  DELETE FROM search_history_chunks WHERE stream_id = p_stream_id;
+
+  INSERT INTO salons (salon_id, url, name, last_seen_at)
+  SELECT DISTINCT ON (salon_id) salon_id, url, name, saved.created_at
+  FROM (
+    SELECT
+      COALESCE(substring(salon->>'url' from '/(sln[A-Z][0-9]+)'), salon->>'url') AS salon_id,
+      salon->>'url' AS url,
+      salon->>'name' AS name,
+      t.position
+    FROM jsonb_array_elements(saved.raw_data) WITH ORDINALITY AS t(salon, position)
+    WHERE COALESCE(salon->>'url', '') <> ''
+  ) s
+  ORDER BY salon_id, position
+  ON CONFLICT (salon_id) DO UPDATE
+    SET url = EXCLUDED.url, name = EXCLUDED.name, last_seen_at = EXCLUDED.last_seen_at;
+
+  INSERT INTO price_observations (
+    history_id, salon_id, observed_at, position, blog_count, review_count,
+    coupon_prices, min_price, max_price, average_price
+  )
+  SELECT
+    saved.id,
+    COALESCE(substring(salon->>'url' from '/(sln[A-Z][0-9]+)'), salon->>'url'),
+    saved.created_at,
+    t.position,
+    (salon->>'blog_count')::INTEGER,
+    (salon->>'review_count')::INTEGER,
+    ARRAY(SELECT jsonb_array_elements_text(salon->'coupon_prices')::INTEGER),
+    (salon->>'min_price')::INTEGER,
+    (salon->>'max_price')::INTEGER,
+    (salon->>'average_price')::NUMERIC
+  FROM jsonb_array_elements(saved.raw_data) WITH ORDINALITY AS t(salon, position)
+  WHERE COALESCE(salon->>'url', '') <> ''
+  ON CONFLICT (history_id, salon_id) DO NOTHING;
+
+  RETURN QUERY SELECT saved.id, saved.created_at, saved.salon_count;
+END;
+$$;
 
 -- ===========================================
 -- Row Level Security (RLS) 設定
@@ -37,6 +227,29 @@ CREATE POLICY "Users can delete own history"
   ON search_history FOR DELETE
   USING (auth.uid() = user_id);
 
+-- 自分のデータのみ更新可能（アーカイブからの再パース）
+CREATE POLICY "Users can update own history"
+  ON search_history FOR UPDATE
+  USING (auth.uid() = user_id)
+  WITH CHECK (auth.uid() = user_id);
+
+-- 追記中のサロンはバックエンドのサービスロールのみが読み書きする（ポリシーなし）
+ALTER TABLE search_history_chunks ENABLE ROW LEVEL SECURITY;
+
+-- 正規化テーブルは認証済みユーザーが参照可能（書き込みはバックエンドのサービスロールのみ）
+ALTER TABLE salons ENABLE ROW LEVEL SECURITY;
+ALTER TABLE price_observations ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Authenticated users can view salons"
+  ON salons FOR SELECT
+  TO authenticated
+  USING (true);
+
+CREATE POLICY "Authenticated users can view price observations"
+  ON price_observations FOR SELECT
+  TO authenticated
+  USING (true);
+
 
 -- ===========================================
 -- 認証設定のメモ（Supabase Dashboardで設定）